@@ -0,0 +1,172 @@
+import copy
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import fields
+
+from django.conf import settings
+
+from api.agents.initial_response_and_planner_agent import get_planner_agent, get_pipelined_planner_agent, \
+    get_structured_planner_agent
+from api.agents.map_reduce_composer import get_chunk_summarizer_agent, get_report_outline_agent, \
+    get_report_writer_agent, get_section_writer_agent, get_summary_reducer_agent
+from api.agents.step_executor import STEP_MEMBER_AGENT_BUILDERS, get_step_executor_team, resolve_step_member_name
+from api.llm_registry import get_llm_instance
+
+logger = logging.getLogger(__name__)
+
+# Init arguments that identify a particular run or session. They are left out of a clone so agno
+# assigns fresh values when the clone runs.
+_RUN_STATE_FIELDS = frozenset({"session_id", "session_name", "team_session_id", "team_session_state"})
+
+
+def clone_for_run(template):
+    """
+    Returns a new Agent or Team configured like `template`, for a single run.
+
+    The clone is built through the class constructor, so run state (`run_response`, `run_id`,
+    session, the tools prepared for the model, ...) starts out empty. The model client and the
+    toolkits are shared with the template; list and dict settings are copied one level deep, and
+    Team members are cloned recursively. Unlike agno's `deep_copy()` this never copies the model.
+    """
+    init_kwargs = {}
+    for field in fields(template):
+        if field.name in _RUN_STATE_FIELDS:
+            continue
+        value = getattr(template, field.name)
+        if value is None:
+            continue
+        if field.name == "members":
+            value = [clone_for_run(member) for member in value]
+        elif field.name == "memory":
+            value = value.deep_copy()
+        elif isinstance(value, (list, dict, set)):
+            value = copy.copy(value)
+        init_kwargs[field.name] = value
+    return template.__class__(**init_kwargs)
+
+
+class ModelAgentGraph:
+    """
+    The agents used by an orchestration run, prebuilt once for one (provider, model_id).
+    The templates are never run themselves: every accessor returns a fresh clone, so concurrent runs
+    on the same model share the model client and tools but never any run state.
+    """
+
+    def __init__(self, provider: str, model_id: str, llm):
+        self.provider = provider
+        self.model_id = model_id
+        self.llm = llm
+        self._planner = get_planner_agent(llm)
+        self._pipelined_planner = get_pipelined_planner_agent(llm)
+        self._structured_planner = get_structured_planner_agent(llm)
+        self._step_executor_team = get_step_executor_team(llm)
+        self._step_members = {name: builder(llm) for name, builder in STEP_MEMBER_AGENT_BUILDERS.items()}
+        self._chunk_summarizer = get_chunk_summarizer_agent(llm)
+        self._summary_reducer = get_summary_reducer_agent(llm)
+        self._report_writer = get_report_writer_agent(llm)
+        self._report_outliner = get_report_outline_agent(llm)
+        self._section_writer = get_section_writer_agent(llm)
+
+    def planner_agent(self):
+        return clone_for_run(self._planner)
+
+    def pipelined_planner_agent(self):
+        return clone_for_run(self._pipelined_planner)
+
+    def structured_planner_agent(self):
+        return clone_for_run(self._structured_planner)
+
+    def step_executor_team(self):
+        return clone_for_run(self._step_executor_team)
+
+    def step_member_agent(self, agent_id: str | None):
+        """Returns the member agent named by a task's `agent_id`, or None if the id is missing or unknown."""
+        member_name = resolve_step_member_name(agent_id)
+        if not member_name:
+            return None
+        return clone_for_run(self._step_members[member_name])
+
+    def chunk_summarizer_agent(self):
+        return clone_for_run(self._chunk_summarizer)
+
+    def summary_reducer_agent(self):
+        return clone_for_run(self._summary_reducer)
+
+    def report_writer_agent(self):
+        return clone_for_run(self._report_writer)
+
+    def report_outline_agent(self):
+        return clone_for_run(self._report_outliner)
+
+    def section_writer_agent(self):
+        return clone_for_run(self._section_writer)
+
+
+class AgentPool:
+    """
+    Caches one ModelAgentGraph per (provider, model_id), keeping at most `max_models` graphs and
+    dropping the least recently used one when a new model is requested.
+    """
+
+    def __init__(self, max_models: int | None = None):
+        self.max_models = max(1, max_models if max_models is not None else getattr(settings, 'AGENT_POOL_MAX_MODELS', 4))
+        self._graphs: OrderedDict[tuple[str, str], ModelAgentGraph] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_graph(self, provider: str, model_id: str) -> ModelAgentGraph | None:
+        """Returns the graph for the model, building it on first use. Returns None if the model can't be created."""
+        key = (provider, model_id)
+        with self._lock:
+            graph = self._graphs.get(key)
+            if graph is not None:
+                self._graphs.move_to_end(key)
+                self.hits += 1
+                return graph
+            self.misses += 1
+            llm = get_llm_instance(model_id=model_id, provider=provider)
+            if not llm:
+                return None
+            graph = ModelAgentGraph(provider, model_id, llm)
+            self._graphs[key] = graph
+            while len(self._graphs) > self.max_models:
+                evicted_key, _ = self._graphs.popitem(last=False)
+                logger.info(f"AgentPool: Evicted agents for {evicted_key[0]} model '{evicted_key[1]}'.")
+            logger.info(f"AgentPool: Built agents for {provider} model '{model_id}' ({len(self._graphs)} cached).")
+            return graph
+
+    def add_graph(self, graph: ModelAgentGraph):
+        """Puts a prebuilt graph in the pool, e.g. one for an offline benchmark model that get_llm_instance can't create."""
+        with self._lock:
+            self._graphs[(graph.provider, graph.model_id)] = graph
+            self._graphs.move_to_end((graph.provider, graph.model_id))
+            while len(self._graphs) > self.max_models:
+                self._graphs.popitem(last=False)
+
+    def warm_up(self, models: list[tuple[str, str]]):
+        for provider, model_id in models:
+            try:
+                if self.get_graph(provider, model_id) is None:
+                    logger.warning(f"AgentPool: Could not warm up {provider} model '{model_id}'. Check API keys.")
+            except Exception as e:
+                logger.error(f"AgentPool: Error while warming up {provider} model '{model_id}': {e}", exc_info=True)
+
+
+def parse_warmup_models(value: str) -> list[tuple[str, str]]:
+    """Parses `Provider:model_id,Provider:model_id` into (provider, model_id) pairs."""
+    models = []
+    for entry in value.split(","):
+        provider, _, model_id = entry.strip().partition(":")
+        if provider and model_id:
+            models.append((provider.strip(), model_id.strip()))
+    return models
+
+
+AGENT_POOL = AgentPool()
+
+
+def warm_up_agent_pool():
+    """Prebuilds the agents for the models in AGENT_POOL_WARMUP_MODELS, so the first prompt doesn't pay for it."""
+    AGENT_POOL.warm_up(parse_warmup_models(getattr(settings, 'AGENT_POOL_WARMUP_MODELS', '')))
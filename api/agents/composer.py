@@ -1,9 +1,9 @@
 
 
 from agno.agent import Agent
-from agno.tools.googlesearch import GoogleSearchTools
 from agno.tools.spider import SpiderTools
 from api.config import default_llm, generic_file_tools  
+from api.tool_cache import CachedGoogleSearchTools
 import os
 
 
@@ -15,7 +15,7 @@ composeragent = Agent(
     role="An agent specialized in composing the results of a research into a coherent final report. I can save the content to a file if instructed.",
     model=default_llm,
     tools=[
-        GoogleSearchTools(),
+        CachedGoogleSearchTools(),
         generic_file_tools 
     ],
     instructions=[
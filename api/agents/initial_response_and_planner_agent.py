@@ -5,6 +5,9 @@ from api.config import default_llm, AGENT_OUTPUT_DIR
 import json
 import uuid 
 import os
+from typing import List
+
+from pydantic import BaseModel, Field
 
 
 os.makedirs(AGENT_OUTPUT_DIR, exist_ok=True)
@@ -63,4 +66,84 @@ def get_planner_agent(llm_instance):
       expected_output=EXPECTED_PLANNER_OUTPUT_JSON_STRUCTURE,
       show_tool_calls=True, debug_mode=True,reasoning=False,reasoning_max_steps=0, success_criteria="Produced and SAVED a concise, logically ordered plan (in both Markdown and JSON)"
   )
-  return initial_response_and_planner_agent
\ No newline at end of file
+  return initial_response_and_planner_agent
+
+def get_pipelined_planner_agent(llm_instance):
+  """
+  Planner variant that streams the plan as JSON in its response instead of saving files with tools.
+  The orchestrator starts executing each task as soon as its object is complete in the stream,
+  and writes master_plan.md / master_plan.json itself.
+  """
+  pipelined_planner_agent = Agent(
+      name="InitialResponseAndPlannerAgent",
+      role="An AI assistant that provides an initial acknowledgment and then streams a detailed execution plan as a single JSON object.",
+      model=llm_instance,
+      tools=[],
+      instructions=[
+    "Input: `user_prompt`.",
+    "1. **Acknowledge User:** Generate a brief acknowledgment message.",
+    "2. **Create Execution Plan:**\n"
+    "   - Divide the research request into a few detailed phases. Each phase should represent significant work, and the final phase must be the summary/report. File outputs should be MD files if text based.\n"
+    "   - Assign each phase to exactly one of: `ResearchAgent`, `ComposerAgent`, or (only if needed) `e2-bcode-execution-agent`.\n"
+    "   - Every phase must list the files it reads in `inputs` and the files it writes in `outputs`, so independent phases can run at the same time.",
+    "3. **Output:** Respond with exactly one JSON object and nothing else, with the keys in this order:\n"
+    "     {\n"
+    "       \"acknowledgment_message\": string,\n"
+    "       \"tasks\": [\n"
+    "         {\n"
+    "           \"id\": unique string,\n"
+    "           \"description\": string (include all relevant context from `user_prompt`),\n"
+    "           \"call_name\": short verb phrase,\n"
+    "           \"inputs\": array of filenames or [\"NONE\"],\n"
+    "           \"agent_id\": one of \"ResearchAgent\", \"ComposerAgent\", \"e2-bcode-execution-agent\",\n"
+    "           \"outputs\": array of filenames,\n"
+    "           \"status\": \"pending\"\n"
+    "         }\n"
+    "       ]\n"
+    "     }\n"
+    "   - Write the tasks in execution order. Do not call any tools and do not wrap the JSON in prose.",
+    "Goal: Generate a concise yet thorough plan as a single streamed JSON object. /no_think"
+  ],
+      show_tool_calls=True, debug_mode=True, reasoning=False, reasoning_max_steps=0,
+  )
+  return pipelined_planner_agent
+
+
+class PlannedTask(BaseModel):
+  id: str = Field(..., description="Unique id of the phase.")
+  description: str = Field(..., description="What the phase does, including all relevant context from the user prompt.")
+  call_name: str = Field(..., description="Short verb phrase naming the action.")
+  inputs: List[str] = Field(..., description="Files the phase reads, or [\"NONE\"].")
+  agent_id: str = Field(..., description="One of ResearchAgent, ComposerAgent, e2-bcode-execution-agent.")
+  outputs: List[str] = Field(..., description="Files the phase writes.")
+
+
+class PlannerResult(BaseModel):
+  acknowledgment_message: str = Field(..., description="A brief, polite acknowledgment for the user.")
+  tasks: List[PlannedTask] = Field(..., min_length=1, description="The phases of the plan, in execution order.")
+
+
+def get_structured_planner_agent(llm_instance):
+  """
+  Planner variant that returns the plan as a PlannerResult through the provider's structured output
+  (or JSON mode, for models without it), in a single model turn and without tool calls.
+  The orchestrator writes master_plan.md / master_plan.json itself.
+  """
+  structured_planner_agent = Agent(
+      name="InitialResponseAndPlannerAgent",
+      role="An AI assistant that provides an initial acknowledgment and a detailed execution plan as structured output.",
+      model=llm_instance,
+      tools=[],
+      response_model=PlannerResult,
+      instructions=[
+    "Input: `user_prompt`.",
+    "1. **Acknowledge User:** Write a brief acknowledgment message.",
+    "2. **Create Execution Plan:**\n"
+    "   - Divide the research request into a few detailed phases. Each phase should represent significant work, and the final phase must be the summary/report. File outputs should be MD files if text based.\n"
+    "   - Assign each phase to exactly one of: `ResearchAgent`, `ComposerAgent`, or (only if needed) `e2-bcode-execution-agent`.\n"
+    "   - Every phase must list the files it reads in `inputs` and the files it writes in `outputs`, so independent phases can run at the same time.",
+    "Goal: Return the acknowledgment and a concise yet thorough plan, in execution order. /no_think"
+  ],
+      show_tool_calls=True, debug_mode=True, reasoning=False, reasoning_max_steps=0,
+  )
+  return structured_planner_agent
@@ -0,0 +1,103 @@
+from typing import List
+
+from agno.agent import Agent
+from pydantic import BaseModel, Field
+
+
+def get_chunk_summarizer_agent(llm_instance):
+    return Agent(
+        name="ComposerChunkSummarizer",
+        role="Condenses one chunk of research material into notes for a report writer.",
+        model=llm_instance,
+        instructions=[
+            "You receive one chunk of research material: notes, extracted page text or a JSON list of sources.",
+            "Write a dense Markdown summary of it for a report writer who will never see the original.",
+            "- Keep every fact, figure, date, name and claim that could matter in a report, with its source title or URL.",
+            "- Drop boilerplate, navigation text, repetition and anything unrelated to the material's subject.",
+            "- Use short bullet points grouped under a few headings. Do not add facts that are not in the chunk.",
+            "Respond with the summary only: no preamble, no tool calls.",
+        ],
+        markdown=True,
+    )
+
+
+def get_summary_reducer_agent(llm_instance):
+    return Agent(
+        name="ComposerSummaryReducer",
+        role="Merges several summaries of research material into one.",
+        model=llm_instance,
+        instructions=[
+            "You receive several Markdown summaries of research material, separated by `---`.",
+            "Merge them into one Markdown summary for a report writer who will never see the originals.",
+            "- Keep every distinct fact, figure, date and claim with its source; state each duplicate only once.",
+            "- Where summaries disagree, keep both claims and say which source makes each.",
+            "- Group related points under headings. Do not add facts that are not in the summaries.",
+            "Respond with the merged summary only: no preamble, no tool calls.",
+        ],
+        markdown=True,
+    )
+
+
+def get_report_writer_agent(llm_instance):
+    return Agent(
+        name="ComposerReportWriter",
+        role="Writes the final report of a research from condensed research notes.",
+        model=llm_instance,
+        instructions=[
+            "Input: JSON with `description` (what the report must cover), `output_filename` and `notes`, "
+            "the condensed research material.",
+            "Write the complete final report in Markdown: a title, a short executive summary, well-structured "
+            "sections that directly address the `description`, and a Sources section listing the sources cited in the notes.",
+            "Use only the facts in `notes`. Where they are thin or contradictory, say so instead of guessing.",
+            "Respond with the report only: no preamble, no status lines, no tool calls. It is saved to `output_filename` as-is.",
+        ],
+        markdown=True,
+    )
+
+
+class OutlineSection(BaseModel):
+    heading: str = Field(..., description="The section's heading, without leading '#'.")
+    brief: str = Field(..., description="What the section must cover, in one or two sentences.")
+    source_ids: List[int] = Field(..., description="Ids of the sources the section draws on.")
+
+
+class ReportOutline(BaseModel):
+    title: str = Field(..., description="The report's title, without leading '#'.")
+    sections: List[OutlineSection] = Field(..., min_length=1, description="The report's sections, in reading order.")
+
+
+def get_report_outline_agent(llm_instance):
+    return Agent(
+        name="ComposerReportOutliner",
+        role="Plans the sections of a research report and the sources each one draws on.",
+        model=llm_instance,
+        tools=[],
+        response_model=ReportOutline,
+        instructions=[
+            "Input: JSON with `description` (what the report must cover), `max_sections` and `sources`, "
+            "a list of `id`, `source` and `digest` (a summary of one input file).",
+            "Plan the report: a title and at most `max_sections` sections in reading order, starting with an "
+            "executive summary and ending with conclusions. Do not plan a separate Sources section.",
+            "- Each section gets a heading, a brief of what it must cover and the ids of the sources it needs. "
+            "Give a section only the sources relevant to it; the executive summary and conclusions may use all of them.",
+            "- Sections must not overlap: each fact belongs in one section.",
+        ],
+    )
+
+
+def get_section_writer_agent(llm_instance):
+    return Agent(
+        name="ComposerSectionWriter",
+        role="Writes one section of a research report from condensed research notes.",
+        model=llm_instance,
+        instructions=[
+            "Input: JSON with `report_title`, `description` (what the whole report covers), `section` "
+            "(`heading` and `brief`), `other_sections` (headings written by others) and `notes`.",
+            "Write the body of `section` only, in Markdown, covering its `brief` from the facts in `notes`. "
+            "Leave the topics of `other_sections` to them.",
+            "- Cite sources inline by title or URL. Use `###` or lower for sub-headings; do not repeat the section heading.",
+            "- Where the notes are thin or contradictory, say so instead of guessing.",
+            "Respond with the section body only: no preamble, no status lines, no tool calls.",
+        ],
+        markdown=True,
+    )
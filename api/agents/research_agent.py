@@ -1,9 +1,9 @@
 from agno.agent import Agent
-from agno.tools.googlesearch import GoogleSearchTools
 from agno.tools.spider import SpiderTools
 from agno.tools.yfinance import YFinanceTools
 
 from api.config import default_llm, generic_file_tools  
+from api.tool_cache import CachedGoogleSearchTools
 import os
 
 
@@ -16,7 +16,7 @@ researchagent = Agent(
     model=default_llm,
     tools=[
         YFinanceTools,
-        GoogleSearchTools(),
+        CachedGoogleSearchTools(),
         generic_file_tools
     ],
     instructions=[
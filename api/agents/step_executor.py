@@ -1,21 +1,25 @@
+import json
+import re
 
 from agno.agent import Agent
 from agno.team import Team
-from agno.tools.googlesearch import GoogleSearchTools
 from agno.tools.yfinance import YFinanceTools
 from api.config import default_llm, AGENT_OUTPUT_DIR, generic_file_tools
+from api.search_tools import BatchSearchTools
+from api.tool_cache import CachedGoogleSearchTools
 from .web_scraping_agent import web_scraping_agent
 from .e2b_code_execution_agent import e2b_code_execution_agent 
 
 
-def get_step_executor_team(llm_instance):
-    researchagent = Agent(
+def _build_research_agent(llm_instance):
+    return Agent(
         name="ResearchAgent",
         role="An agent specialized in deep research. I can save the content to a file if instructed. Limit to 5 queries in one run.",
         model=llm_instance,
         tools=[
             YFinanceTools,
-            GoogleSearchTools(),
+            BatchSearchTools(),
+            CachedGoogleSearchTools(),
             generic_file_tools
         ],
         instructions=[
@@ -27,12 +31,10 @@ def get_step_executor_team(llm_instance):
             "     • Use your file tool to read its contents into `prepared_input`.",
             "2. **Search & Fetch Sources:**",
             "   a. Identify keywords from `prepared_input` or `description`.",
-            "   b. IF NEEDED Academic Searches:",
-            "      • Form 3-4 queries (e.g., Google Scholar).",
-            "      • Use your search tool for each. Collect title, abstract, URL.",
-            "   c. Web/News Searches:",
-            "      • Form 3-4 queries (news sites, reports).",
-            "      • Use your search tool. Collect title, snippet, URL.",
+            "   b. IF NEEDED Academic Searches: form 3-4 queries (e.g., Google Scholar).",
+            "   c. Web/News Searches: form 3-4 queries (news sites, reports).",
+            "      • Run ALL the queries from b. and c. with ONE `batch_search` call. Collect title, snippet/abstract, URL.",
+            "      • Use `google_search` only for a single follow-up query.",
             "   d. Save your sources for raw_sources,json",
             "3. **Build `raw_sources.json`:**",
             "   - Create JSON array with fields: `type`, `title`, `URL`, `abstract_or_snippet`, `local_text_path`.",
@@ -51,12 +53,15 @@ def get_step_executor_team(llm_instance):
         ],
         markdown=True, stream=True, stream_intermediate_steps=True,
     )
-    composeragent = Agent(
+
+
+def _build_composer_agent(llm_instance):
+    return Agent(
         name="ComposerAgent",
         role="An agent specialized in composing the results of a research into a coherent final report. I can save the content to a file if instructed.",
         model=llm_instance,
         tools=[
-            GoogleSearchTools(),
+            CachedGoogleSearchTools(),
             generic_file_tools  
         ],
         instructions=[
@@ -74,13 +79,51 @@ def get_step_executor_team(llm_instance):
         ],
         markdown=True,
     )
+
+
+def _build_e2b_code_execution_agent(llm_instance):
+    # The E2B agent is a module-level singleton; each step gets its own copy so concurrent steps don't share run state.
+    return e2b_code_execution_agent.deep_copy()
+
+
+STEP_MEMBER_AGENT_BUILDERS = {
+    "ResearchAgent": _build_research_agent,
+    "ComposerAgent": _build_composer_agent,
+    "E2BCodeExecutionAgent": _build_e2b_code_execution_agent,
+}
+_NORMALIZED_MEMBER_NAMES = {re.sub(r"[^a-z0-9]", "", name.lower()): name for name in STEP_MEMBER_AGENT_BUILDERS}
+_NORMALIZED_MEMBER_NAMES["e2bcodeexecution"] = "E2BCodeExecutionAgent"
+
+
+def resolve_step_member_name(agent_id: str | None) -> str | None:
+    """
+    Maps a plan task's `agent_id` to a member agent name. The planner is not consistent about
+    spelling (e.g. `e2-bcode-execution-agent`), so case and punctuation are ignored.
+    """
+    if not agent_id or not isinstance(agent_id, str):
+        return None
+    return _NORMALIZED_MEMBER_NAMES.get(re.sub(r"[^a-z0-9]", "", agent_id.lower()))
+
+
+def build_member_task_payload(task_details_dict: dict) -> str:
+    """
+    The task object sent to a member agent when it is dispatched directly, without the team leader.
+    The E2B agent expects `code_to_execute`, which the leader used to fill in from the description.
+    """
+    payload = dict(task_details_dict)
+    if resolve_step_member_name(payload.get("agent_id")) == "E2BCodeExecutionAgent":
+        payload.setdefault("code_to_execute", payload.get("description", ""))
+    return json.dumps(payload)
+
+
+def get_step_executor_team(llm_instance):
     step_executor_team = Team(
         name="StepExecutorTeam",
         model=llm_instance,
         tools=[], 
         members=[
-            e2b_code_execution_agent,
-            composeragent,researchagent 
+            _build_e2b_code_execution_agent(llm_instance),
+            _build_composer_agent(llm_instance), _build_research_agent(llm_instance)
         ],
         instructions=[
       "/no_think. You receive one task object (JSON) with keys: `id`, `description`, `agent_id`, `call_name`, `inputs`, `outputs`.",
@@ -1,7 +1,7 @@
 
 
 from agno.agent import Agent
-from agno.tools.spider import SpiderTools
+from api.tool_cache import CachedSpiderTools
 from api.config import default_llm, generic_file_tools  
 import os
 
@@ -14,7 +14,7 @@ web_scraping_agent = Agent(
     role="An agent specialized in scraping web content from specific URLs using SpiderTools. I can save the scraped content to a file if instructed.",
     model=default_llm,
     tools=[
-        SpiderTools(max_results=5),
+        CachedSpiderTools(max_results=5),
         generic_file_tools  
     ],
     instructions=[
@@ -1,16 +1,16 @@
 
 from agno.agent import Agent
 from agno.tools.duckduckgo import DuckDuckGoTools
-from agno.tools.googlesearch import GoogleSearchTools
 
 from api.config import default_llm,default_llm3, generic_file_tools 
+from api.tool_cache import CachedGoogleSearchTools
 
 web_search_agent = Agent(
     name="WebSearchAgent",
     role="An expert web researcher using DuckDuckGo. I can save my findings to a file if instructed.",
     model=default_llm,
     tools=[
-        GoogleSearchTools(),
+        CachedGoogleSearchTools(),
         generic_file_tools 
     ],
     instructions=[
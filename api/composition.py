@@ -0,0 +1,516 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+from django.conf import settings
+
+from api.agents.map_reduce_composer import ReportOutline
+from api.config import AGENT_OUTPUT_DIR
+from api.plan_scheduler import get_task_files
+from api.tracing import record_agent_run, start_span
+
+logger = logging.getLogger(__name__)
+
+# Chunks are budgeted without a tokenizer, at roughly this many characters per token.
+CHARS_PER_TOKEN = 4
+# Part of every summary's cache key. Bump it when the summarizer or reducer instructions change.
+SUMMARY_PROMPT_VERSION = 1
+SUMMARY_SEPARATOR = "\n\n---\n\n"
+DEFAULT_REPORT_FILENAME = "final_report.md"
+_BINARY_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp", ".svg", ".ico", ".pdf", ".zip", ".gz", ".db")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_MARKDOWN_HEADING = re.compile(r"^(#{1,6})\s+(.*?)[\s#]*$")
+_CODE_FENCE = re.compile(r"^\s*(```|~~~)")
+
+
+class ComposerInputError(RuntimeError):
+    """Raised when none of a composer task's inputs could be read."""
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _split_oversized(paragraph: str, max_chars: int) -> list[str]:
+    """Cuts a paragraph longer than `max_chars` at the last line break (or space) before each limit."""
+    parts = []
+    start = 0
+    while start < len(paragraph):
+        end = start + max_chars
+        if end < len(paragraph):
+            cut = paragraph.rfind("\n", start, end)
+            if cut <= start:
+                cut = paragraph.rfind(" ", start, end)
+            if cut > start:
+                end = cut
+        parts.append(paragraph[start:end].strip())
+        start = end
+    return [part for part in parts if part]
+
+
+def split_text(text: str, chunk_tokens: int) -> list[str]:
+    """Splits `text` into chunks of about `chunk_tokens` tokens at most, keeping paragraphs whole where they fit."""
+    max_chars = max(1, chunk_tokens) * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return [text.strip()] if text.strip() else []
+    chunks = []
+    current = []
+    current_chars = 0
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        for part in _split_oversized(paragraph.strip(), max_chars):
+            if current and current_chars + len(part) > max_chars:
+                chunks.append("\n\n".join(current))
+                current, current_chars = [], 0
+            current.append(part)
+            current_chars += len(part) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def read_composer_inputs(input_names: list[str], base_dir=None) -> tuple[list[tuple[str, str]], list[str]]:
+    """
+    Reads a composer task's inputs from the workspace. Directories (e.g. `extracted_contents/`) are
+    expanded to the text files in them. Returns (relative path, text) pairs and the inputs that
+    don't exist or point outside the workspace.
+    """
+    base = os.path.realpath(str(base_dir or AGENT_OUTPUT_DIR))
+    sources = []
+    missing = []
+    seen = set()
+    for name in input_names:
+        path = os.path.realpath(os.path.join(base, name))
+        if os.path.commonpath([base, path]) != base or not os.path.exists(path):
+            missing.append(name)
+            continue
+        if os.path.isdir(path):
+            file_paths = sorted(os.path.join(root, f) for root, _, files in os.walk(path) for f in files)
+        else:
+            file_paths = [path]
+        for file_path in file_paths:
+            if file_path in seen or file_path.lower().endswith(_BINARY_EXTENSIONS):
+                continue
+            seen.add(file_path)
+            try:
+                with open(file_path, encoding="utf-8", errors="replace") as f:
+                    text = f.read()
+            except OSError as e:
+                logger.warning(f"Composer: Could not read input {file_path}: {e}")
+                continue
+            if text.strip():
+                sources.append((os.path.relpath(file_path, base), text))
+    return sources, missing
+
+
+def group_for_reduce(summaries: list[str], budget_tokens: int) -> list[list[str]]:
+    """
+    Packs consecutive summaries into groups of about `budget_tokens`. Every group has at least two
+    summaries, so each reduce level strictly shrinks the list.
+    """
+    groups = []
+    current = []
+    current_tokens = 0
+    for summary in summaries:
+        summary_tokens = estimate_tokens(summary)
+        if len(current) >= 2 and current_tokens + summary_tokens > budget_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(summary)
+        current_tokens += summary_tokens
+    if len(current) == 1 and groups:
+        groups[-1].extend(current)
+    elif current:
+        groups.append(current)
+    return groups
+
+
+def clean_heading(heading: str) -> str:
+    return heading.strip().lstrip("#").strip() or "Untitled"
+
+
+def normalize_section_body(body: str, heading: str, level: int = 2) -> str:
+    """
+    Drops a leading heading that repeats the section's own and shifts the headings left in `body` so the
+    highest of them sits one level below `level`. Headings inside code fences are left alone.
+    """
+    lines = body.strip().splitlines()
+    first = _MARKDOWN_HEADING.match(lines[0]) if lines else None
+    if first and clean_heading(first.group(2)).rstrip(":").lower() == clean_heading(heading).lower():
+        lines = lines[1:]
+    heading_rows = []
+    in_fence = False
+    for row, line in enumerate(lines):
+        if _CODE_FENCE.match(line):
+            in_fence = not in_fence
+        elif not in_fence and (match := _MARKDOWN_HEADING.match(line)):
+            heading_rows.append((row, len(match.group(1)), match.group(2)))
+    if heading_rows:
+        shift = level + 1 - min(depth for _, depth, _ in heading_rows)
+        for row, depth, text in heading_rows:
+            lines[row] = f"{'#' * min(6, max(level + 1, depth + shift))} {text}"
+    return "\n".join(lines).strip()
+
+
+def stitch_report(title: str, sections: list[tuple[str, str]]) -> str:
+    """Joins (heading, body) sections under one `#` title, each section a `##` heading."""
+    parts = [f"# {clean_heading(title)}"]
+    for heading, body in sections:
+        parts.append(f"## {clean_heading(heading)}\n\n{normalize_section_body(body, heading)}")
+    return "\n\n".join(parts) + "\n"
+
+
+async def gather_or_cancel(coroutines) -> list:
+    """Like asyncio.gather, but cancels the coroutines still running as soon as one of them raises."""
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        # Let the cancelled ones unwind (finish their spans, report themselves) before re-raising.
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class SummaryCache:
+    """
+    Chunk and merge summaries on local disk, one JSON file per key. The key hashes the stage, the model
+    and the exact text summarized, so a rerun only pays for the chunks whose content changed.
+    The directory can be deleted at any time.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = str(cache_dir or getattr(settings, 'COMPOSER_SUMMARY_CACHE_DIR',
+                                                  settings.BASE_DIR / ".composer_cache"))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(stage: str, model, text: str) -> str:
+        key_material = {"stage": stage, "version": SUMMARY_PROMPT_VERSION,
+                        "provider": getattr(model, "provider", None), "model_id": getattr(model, "id", None),
+                        "text": text}
+        return hashlib.sha256(json.dumps(key_material, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> str | None:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                summary = json.load(f)["summary"]
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return summary
+
+    def put(self, key: str, summary: str):
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"summary": summary}, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Composer: Could not cache summary {key}: {e}")
+
+
+_SUMMARY_CACHE = None
+_SUMMARY_CACHE_LOCK = threading.Lock()
+
+
+def get_summary_cache() -> SummaryCache:
+    global _SUMMARY_CACHE
+    with _SUMMARY_CACHE_LOCK:
+        if _SUMMARY_CACHE is None:
+            _SUMMARY_CACHE = SummaryCache()
+        return _SUMMARY_CACHE
+
+
+class MapReduceComposer:
+    """
+    Composes the report of a ComposerAgent task without loading every input into one context:
+      - map: the inputs are split into chunks of `chunk_tokens` and summarized, `concurrency` at a time;
+      - reduce: while the summaries don't fit one chunk budget, groups of them are merged, level by level;
+      - write: the report is written from the remaining summaries in one streamed call and saved to the
+        task's first output file by the orchestrator, not through a tool call.
+    Summaries are cached by content hash. `on_progress` receives an activity dict after every stage
+    and chunk; `on_token` receives the report as it streams.
+    """
+
+    def __init__(self, agent_graph, chunk_tokens: int | None = None, concurrency: int | None = None,
+                 cache: SummaryCache | None = None, on_progress=None, on_token=None, output_dir=None):
+        self.agent_graph = agent_graph
+        self.chunk_tokens = max(256, chunk_tokens if chunk_tokens is not None
+                                else getattr(settings, 'COMPOSER_CHUNK_TOKENS', 6000))
+        self.concurrency = max(1, concurrency if concurrency is not None
+                               else getattr(settings, 'COMPOSER_MAP_CONCURRENCY', 4))
+        self.cache = cache or get_summary_cache()
+        self.on_progress = on_progress
+        self.on_token = on_token
+        self.output_dir = str(output_dir or AGENT_OUTPUT_DIR)
+        self.llm_call_details = []
+        self.cached_summaries = 0
+
+    async def _progress(self, stage: str, **data):
+        if self.on_progress is not None:
+            await self.on_progress({"event": "ComposerProgress", "data": {"stage": stage, **data}})
+
+    def _record_run(self, agent, parent_span):
+        record_agent_run(agent, parent=parent_span)
+        if agent.run_response and agent.run_response.metrics:
+            raw_metrics = agent.run_response.metrics
+            self.llm_call_details.append({
+                "agent_name": agent.name,
+                "model_id": agent.model.id,
+                "input_tokens": sum(raw_metrics.get('input_tokens', [0])),
+                "output_tokens": sum(raw_metrics.get('output_tokens', [0])),
+                "time": sum(raw_metrics.get('time', [0.0])),
+            })
+
+    async def _run_agent(self, agent, prompt: str, parent_span, stream_tokens: bool = False) -> str:
+        if stream_tokens and self.on_token is not None:
+            parts = []
+            async for chunk in await agent.arun(prompt, stream=True):
+                if getattr(chunk, 'event', None) == 'RunResponse' and chunk.content:
+                    parts.append(chunk.content)
+                    await self.on_token(chunk.content)
+            content = "".join(parts)
+        else:
+            content = (await agent.arun(prompt)).content
+        self._record_run(agent, parent_span)
+        return str(content or "").strip()
+
+    async def _summarize(self, stage: str, text: str, semaphore: asyncio.Semaphore, parent_span) -> str:
+        key = SummaryCache.make_key(stage, self.agent_graph.llm, text)
+        summary = self.cache.get(key)
+        if summary is not None:
+            self.cached_summaries += 1
+            return summary
+        async with semaphore:
+            agent = (self.agent_graph.chunk_summarizer_agent() if stage == "map"
+                     else self.agent_graph.summary_reducer_agent())
+            summary = await self._run_agent(agent, text, parent_span)
+        if summary:
+            self.cache.put(key, summary)
+        return summary
+
+    async def _read_chunks(self, task_details_dict: dict) -> tuple[list, list[tuple[str, int, int, str]], list[str]]:
+        """Reads and splits a task's inputs into (source, part index, part count, text) chunks."""
+        sources, missing = read_composer_inputs(get_task_files(task_details_dict, "inputs"), self.output_dir)
+        if missing:
+            logger.warning(f"Composer: Inputs not found in the workspace: {missing}")
+        if not sources:
+            raise ComposerInputError(f"None of the task's inputs could be read (missing: {missing or 'none declared'}).")
+        chunks = []
+        for source, text in sources:
+            pieces = split_text(text, self.chunk_tokens)
+            chunks.extend((source, index, len(pieces), piece) for index, piece in enumerate(pieces))
+        await self._progress("chunked", files=len(sources), chunks=len(chunks), missing_inputs=missing)
+        return sources, chunks, missing
+
+    async def _map(self, chunks: list, semaphore: asyncio.Semaphore, parent_span) -> list[str]:
+        """Summarizes every chunk and returns the labelled summaries, in chunk order."""
+        map_span = start_span("compose map", "step", parent=parent_span, chunks=len(chunks))
+        completed = 0
+
+        async def summarize_chunk(source: str, index: int, total: int, text: str) -> str:
+            nonlocal completed
+            summary = await self._summarize("map", text, semaphore, map_span)
+            completed += 1
+            await self._progress("map", completed=completed, total=len(chunks), cached=self.cached_summaries)
+            label = source if total == 1 else f"{source} (part {index + 1} of {total})"
+            return f"### Source: {label}\n\n{summary}"
+
+        try:
+            return await gather_or_cancel(summarize_chunk(*chunk) for chunk in chunks)
+        finally:
+            map_span.finish(cached=self.cached_summaries)
+
+    async def _reduce(self, summaries: list[str], semaphore: asyncio.Semaphore, parent_span,
+                      span_prefix: str = "compose", **progress_data) -> tuple[list[str], int]:
+        """Merges `summaries` level by level until they fit one chunk budget. Returns them and the level count."""
+        reduce_levels = 0
+        while len(summaries) > 1 and sum(estimate_tokens(s) for s in summaries) > self.chunk_tokens:
+            reduce_levels += 1
+            groups = group_for_reduce(summaries, self.chunk_tokens)
+            await self._progress("reduce", level=reduce_levels, inputs=len(summaries), outputs=len(groups),
+                                 **progress_data)
+            reduce_span = start_span(f"{span_prefix} reduce {reduce_levels}", "step", parent=parent_span,
+                                     groups=len(groups))
+            try:
+                summaries = await gather_or_cancel(
+                    self._summarize("reduce", SUMMARY_SEPARATOR.join(group), semaphore, reduce_span) for group in groups)
+            finally:
+                reduce_span.finish()
+        return summaries, reduce_levels
+
+    @staticmethod
+    def _output_filename(task_details_dict: dict) -> str:
+        outputs = get_task_files(task_details_dict, "outputs")
+        return outputs[0] if outputs else DEFAULT_REPORT_FILENAME
+
+    async def compose(self, task_details_dict: dict, parent_span=None) -> dict:
+        """Runs map, reduce and write for one task and returns what was done. Raises ComposerInputError."""
+        sources, chunks, missing = await self._read_chunks(task_details_dict)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        summaries = await self._map(chunks, semaphore, parent_span)
+        return await self._reduce_and_write(task_details_dict, sources, chunks, missing, summaries, semaphore,
+                                            parent_span)
+
+    async def _reduce_and_write(self, task_details_dict: dict, sources: list, chunks: list, missing: list[str],
+                                summaries: list[str], semaphore: asyncio.Semaphore, parent_span) -> dict:
+        summaries, reduce_levels = await self._reduce(summaries, semaphore, parent_span)
+        output_filename = self._output_filename(task_details_dict)
+        await self._progress("write", output_filename=output_filename)
+        write_span = start_span("compose write", "step", parent=parent_span, output_filename=output_filename)
+        try:
+            report = await self._run_agent(self.agent_graph.report_writer_agent(), json.dumps({
+                "description": task_details_dict.get("description", ""), "output_filename": output_filename,
+                "notes": SUMMARY_SEPARATOR.join(summaries)}), write_span, stream_tokens=True)
+        finally:
+            write_span.finish()
+        if not report:
+            raise RuntimeError("The report writer returned an empty report.")
+        self._save(output_filename, report)
+        await self._progress("saved", output_filename=output_filename, characters=len(report))
+        return {"output_filename": output_filename, "files": len(sources), "chunks": len(chunks),
+                "cached_summaries": self.cached_summaries, "reduce_levels": reduce_levels, "missing_inputs": missing}
+
+    def _save(self, output_filename: str, report: str):
+        base = os.path.realpath(self.output_dir)
+        path = os.path.realpath(os.path.join(base, output_filename))
+        if os.path.commonpath([base, path]) != base:
+            raise ValueError(f"Output file '{output_filename}' is outside the workspace.")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(report if report.endswith("\n") else report + "\n")
+        os.replace(temp_path, path)
+
+
+class SectionComposer(MapReduceComposer):
+    """
+    Composes the report of a ComposerAgent task section by section instead of in one long generation:
+      - map: the inputs are chunked and summarized as in MapReduceComposer, sharing its cache;
+      - outline: one structured-output call plans the title, the sections and the input files each draws on;
+      - sections: every section is written concurrently from the summaries of its own files only,
+        merged first if they don't fit one chunk budget;
+      - stitch: the sections are joined under `##` headings in outline order, their own headings nested
+        below, and saved to the task's first output file.
+    If the outline is unusable (invalid or without sections), the report is written from the same
+    summaries in one call, as MapReduceComposer does. Besides ComposerProgress, `on_progress` receives a
+    ComposerSection activity whenever a section starts, completes (with its text), fails or is cancelled
+    because another one failed; the sections' text is only sent that way, not to `on_token`.
+    """
+
+    def __init__(self, *args, max_sections: int | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_sections = max(1, max_sections if max_sections is not None
+                                else getattr(settings, 'COMPOSER_MAX_SECTIONS', 8))
+
+    async def _section_progress(self, index: int, heading: str, status: str, **data):
+        if self.on_progress is not None:
+            await self.on_progress({"event": "ComposerSection",
+                                    "data": {"index": index, "heading": heading, "status": status, **data}})
+
+    async def _outline(self, task_details_dict: dict, source_summaries: dict[str, list[str]],
+                       parent_span) -> ReportOutline | None:
+        # The outline only needs to know what each file is about, so every file gets an equal share of one chunk budget.
+        share = self.chunk_tokens * CHARS_PER_TOKEN // len(source_summaries)
+        digests = [{"id": source_id, "source": source, "digest": SUMMARY_SEPARATOR.join(summaries)[:share]}
+                   for source_id, (source, summaries) in enumerate(source_summaries.items(), start=1)]
+        agent = self.agent_graph.report_outline_agent()
+        outline_span = start_span("compose outline", "step", parent=parent_span, sources=len(digests))
+        try:
+            run_response = await agent.arun(json.dumps({
+                "task": "outline_report", "description": task_details_dict.get("description", ""),
+                "max_sections": self.max_sections, "sources": digests}))
+            self._record_run(agent, outline_span)
+        finally:
+            outline_span.finish()
+        outline = run_response.content
+        if not isinstance(outline, ReportOutline):
+            # agno leaves the raw text in place when it can't parse it into the response model.
+            try:
+                outline = ReportOutline.model_validate_json(str(outline or ""))
+            except ValueError as e:
+                logger.warning(f"Composer: The report outline did not match its schema: {e}")
+                return None
+        outline.sections = outline.sections[:self.max_sections]
+        return outline if outline.sections else None
+
+    async def compose(self, task_details_dict: dict, parent_span=None) -> dict:
+        """Runs map, outline, sections and stitch for one task and returns what was done. Raises ComposerInputError."""
+        sources, chunks, missing = await self._read_chunks(task_details_dict)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        summaries = await self._map(chunks, semaphore, parent_span)
+        source_summaries = {}
+        for (source, *_), summary in zip(chunks, summaries):
+            source_summaries.setdefault(source, []).append(summary)
+        source_names = list(source_summaries)
+
+        outline = await self._outline(task_details_dict, source_summaries, parent_span)
+        if outline is None:
+            await self._progress("outline", sections=[], fallback="single_report")
+            return await self._reduce_and_write(task_details_dict, sources, chunks, missing, summaries, semaphore,
+                                                parent_span)
+        headings = [clean_heading(section.heading) for section in outline.sections]
+        await self._progress("outline", title=clean_heading(outline.title), sections=headings)
+        reduce_levels = 0
+
+        async def write_section(index: int, section) -> str:
+            nonlocal reduce_levels
+            heading = headings[index]
+            # Unknown ids are dropped; a section left without sources is written from all of them.
+            section_sources = [source_names[source_id - 1] for source_id in dict.fromkeys(section.source_ids)
+                               if 1 <= source_id <= len(source_names)] or source_names
+            await self._section_progress(index + 1, heading, "started", sources=section_sources)
+            section_span = start_span(f"compose section {index + 1}", "step", parent=parent_span,
+                                      heading=heading, sources=len(section_sources))
+            try:
+                notes, levels = await self._reduce(
+                    [summary for source in section_sources for summary in source_summaries[source]],
+                    semaphore, section_span, span_prefix=f"section {index + 1}", section=index + 1)
+                reduce_levels = max(reduce_levels, levels)
+                async with semaphore:
+                    body = await self._run_agent(self.agent_graph.section_writer_agent(), json.dumps({
+                        "report_title": outline.title, "description": task_details_dict.get("description", ""),
+                        "section": {"heading": heading, "brief": section.brief},
+                        "other_sections": [other for other in headings if other != heading],
+                        "notes": SUMMARY_SEPARATOR.join(notes)}), section_span)
+                if not body:
+                    raise RuntimeError(f"The section writer returned an empty section '{heading}'.")
+            except asyncio.CancelledError:
+                section_span.finish(status="cancelled")
+                await self._section_progress(index + 1, heading, "cancelled")
+                raise
+            except Exception as e:
+                section_span.finish(status="error")
+                await self._section_progress(index + 1, heading, "failed", error=str(e))
+                raise
+            section_span.finish(characters=len(body))
+            await self._section_progress(index + 1, heading, "completed", characters=len(body), content=body)
+            return body
+
+        bodies = await gather_or_cancel(write_section(index, section) for index, section in enumerate(outline.sections))
+        report = stitch_report(outline.title, list(zip(headings, bodies)))
+        output_filename = self._output_filename(task_details_dict)
+        self._save(output_filename, report)
+        await self._progress("saved", output_filename=output_filename, characters=len(report), sections=len(headings))
+        return {"output_filename": output_filename, "files": len(sources), "chunks": len(chunks),
+                "cached_summaries": self.cached_summaries, "reduce_levels": reduce_levels, "sections": len(headings),
+                "missing_inputs": missing}
+
+
+# COMPOSER_MODE values that compose ComposerAgent tasks in the orchestrator, and the composer for each.
+COMPOSER_CLASSES = {"map_reduce": MapReduceComposer, "sections": SectionComposer}
@@ -8,7 +8,7 @@ import logging
 import os 
 from agno.tools.file import FileTools
 import os
-AGENT_OUTPUT_DIR = settings.BASE_DIR / "agent_outputs"
+AGENT_OUTPUT_DIR = getattr(settings, 'AGENT_OUTPUT_DIR', settings.BASE_DIR / "agent_outputs")
 from agno.models.google import Gemini
 from agno.models.ollama import Ollama
 generic_file_tools = FileTools(base_dir=AGENT_OUTPUT_DIR, save_files=True, read_files=True, list_files=True)
@@ -0,0 +1,81 @@
+import asyncio
+import codecs
+import os
+import re
+
+from django.conf import settings
+
+_BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class UnsatisfiableRange(ValueError):
+    """The requested byte range lies entirely past the end of the file."""
+
+
+def file_etag(stat: os.stat_result) -> str:
+    """Strong ETag of a file version, from its mtime (in ns) and size."""
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """True if an If-None-Match / If-Range style header names `etag` (or is `*`)."""
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def parse_byte_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parses a single-range `Range` header into an inclusive (start, end) pair clipped to the file size.
+    Returns None for headers this server ignores (malformed, other units, several ranges), in which
+    case the whole file is served. Raises UnsatisfiableRange if the range starts past the end.
+    """
+    match = _BYTE_RANGE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes.
+        suffix_length = int(last)
+        if suffix_length == 0:
+            raise UnsatisfiableRange(header)
+        return max(0, size - suffix_length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise UnsatisfiableRange(header)
+    return start, end
+
+
+def read_text_head(path: str, max_bytes: int) -> str:
+    """Reads at most `max_bytes` of a UTF-8 file, dropping a multi-byte character cut off at the end."""
+    with open(path, "rb") as f:
+        head = f.read(max_bytes)
+    return codecs.getincrementaldecoder("utf-8")(errors="replace").decode(head, final=False)
+
+
+async def aiter_file(path: str, start: int = 0, length: int | None = None, chunk_size: int | None = None):
+    """
+    Yields `length` bytes of the file from offset `start` (to the end if None), one chunk at a time.
+    The reads run in a worker thread. This is an async iterator on purpose: under ASGI, Django
+    collects a response's sync iterator into a list before sending it, so a FileResponse would load
+    the whole file into memory.
+    """
+    chunk_size = chunk_size or getattr(settings, 'FILE_STREAM_CHUNK_BYTES', 256 * 1024)
+    f = await asyncio.to_thread(open, path, "rb")
+    try:
+        if start:
+            await asyncio.to_thread(f.seek, start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            chunk = await asyncio.to_thread(f.read, chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(f.close)
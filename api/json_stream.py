@@ -0,0 +1,193 @@
+import bisect
+import json
+import re
+
+# Only these characters can change the scanner's state, so everything in between is skipped with a regex search.
+_STRUCTURAL_CHARS = re.compile(r'[{}\[\]"]')
+_STRING_SPECIAL_CHARS = re.compile(r'["\\]')
+_OBJECT_START = re.compile(r'\{\s*["}]')
+
+
+class IncrementalJSONScanner:
+    """
+    Scans a streamed LLM response chunk by chunk and extracts JSON objects as soon as they are complete.
+
+    The scanner keeps track of bracket depth and string/escape state, so the response is scanned
+    exactly once, jumping from one structural character to the next. Text outside of JSON (prose, markdown fences) is skipped. It reports:
+      - every object that is a direct item of the `items_key` array of a top-level object (e.g. the
+        tasks of a plan in `{"tasks": [...]}`), returned from `feed()`. Arrays anywhere else, such as
+        a stray `[` in prose, are never treated as task lists;
+      - the string fields of the top-level object as soon as each one is complete, in `top_level_strings`
+        (e.g. the planner's acknowledgment, long before the plan is finished);
+      - the last complete top-level object, available as `last_object` (see also `final_object()`).
+
+    With `expected_keys`, `satisfied` becomes True as soon as a top-level object containing all of
+    those keys is complete, so the caller can stop reading the stream early.
+    """
+
+    def __init__(self, expected_keys=None, items_key: str = "tasks"):
+        self.expected_keys = frozenset(expected_keys or ())
+        self.items_key = items_key
+        self._chunks: list[str] = []
+        self._chunk_offsets: list[int] = []
+        self._length = 0
+        # Each open bracket is [opener, start offset, (start, end) of its last complete child object,
+        # whether it is the `items_key` array].
+        self._stack: list[list] = []
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        # (start, end) of the last string directly inside the top-level object that was not a value.
+        self._last_key_span = None
+        self.top_level_strings: dict[str, str] = {}
+        self.last_object = None
+        self.array_items_found = 0
+        self.satisfied = False
+
+    @property
+    def length(self) -> int:
+        return self._length
+
+    def _slice(self, start: int, end: int) -> str:
+        first = bisect.bisect_right(self._chunk_offsets, start) - 1
+        parts = []
+        for i in range(first, len(self._chunks)):
+            chunk_start = self._chunk_offsets[i]
+            if chunk_start >= end:
+                break
+            parts.append(self._chunks[i][max(0, start - chunk_start):end - chunk_start])
+        return "".join(parts)
+
+    def _is_items_array_item(self) -> bool:
+        return len(self._stack) == 2 and self._stack[-1][3]
+
+    def _in_top_level_object(self) -> bool:
+        return len(self._stack) == 1 and self._stack[0][0] == "{"
+
+    def _last_key(self) -> str | None:
+        """The last key of the top-level object, if it is immediately followed by a colon."""
+        if self._last_key_span is None:
+            return None
+        try:
+            return json.loads(self._slice(*self._last_key_span))
+        except json.JSONDecodeError:
+            return None
+
+    def _string_closed(self, end: int):
+        """Records keys and string values of the top-level object."""
+        if not self._in_top_level_object():
+            return
+        span = (self._string_start, end)
+        if self._last_key_span is not None and self._slice(self._last_key_span[1], span[0]).strip() == ":":
+            key = self._last_key()
+            try:
+                value = json.loads(self._slice(*span))
+            except json.JSONDecodeError:
+                value = None
+            if isinstance(key, str) and isinstance(value, str):
+                self.top_level_strings[key] = value
+            self._last_key_span = None
+        else:
+            self._last_key_span = span
+
+    def feed(self, chunk: str) -> list[dict]:
+        """Consumes the next piece of the response and returns the array items completed by it."""
+        if not chunk:
+            return []
+        completed_items = []
+        chunk_start = self._length
+        self._chunks.append(chunk)
+        self._chunk_offsets.append(chunk_start)
+        self._length += len(chunk)
+
+        pos = 0
+        if self._escaped:
+            # The previous chunk ended with a backslash inside a string; this chunk's first char is escaped.
+            self._escaped = False
+            pos = 1
+        while True:
+            if self._in_string:
+                match = _STRING_SPECIAL_CHARS.search(chunk, pos)
+                if match is None:
+                    break
+                i = match.start()
+                if chunk[i] == "\\":
+                    if i + 1 >= len(chunk):
+                        self._escaped = True
+                        break
+                    pos = i + 2
+                    continue
+                self._in_string = False
+                pos = i + 1
+                self._string_closed(chunk_start + pos)
+                continue
+
+            match = _STRUCTURAL_CHARS.search(chunk, pos)
+            if match is None:
+                break
+            i = match.start()
+            char = chunk[i]
+            pos = i + 1
+            if char == '"':
+                if self._stack:
+                    self._in_string = True
+                    self._string_start = chunk_start + i
+            elif char in "{[":
+                is_items_array = (char == "[" and self._in_top_level_object() and self._last_key_span is not None
+                                  and self._slice(self._last_key_span[1], chunk_start + i).strip() == ":"
+                                  and self._last_key() == self.items_key)
+                if not self._stack or self._in_top_level_object():
+                    self._last_key_span = None
+                self._stack.append([char, chunk_start + i, None, is_items_array])
+            elif char in "}]":
+                if not self._stack:
+                    continue
+                opener, start, _, _ = self._stack.pop()
+                if opener != "{" or char != "}":
+                    continue
+                if self._stack:
+                    self._stack[-1][2] = (start, chunk_start + i + 1)
+                is_top_level = not self._stack
+                is_array_item = self._is_items_array_item()
+                if not (is_top_level or is_array_item):
+                    continue
+                candidate = self._slice(start, chunk_start + i + 1)
+                if not _OBJECT_START.match(candidate):
+                    # Braces in prose such as `{step}` can never be a JSON object; skip the failing parse.
+                    continue
+                try:
+                    value = json.loads(candidate)
+                except json.JSONDecodeError:
+                    continue
+                if is_top_level:
+                    self.last_object = value
+                    if self.expected_keys and isinstance(value, dict) and self.expected_keys <= value.keys():
+                        self.satisfied = True
+                elif isinstance(value, dict):
+                    self.array_items_found += 1
+                    completed_items.append(value)
+
+        if not self._stack:
+            # Nothing is open, so no future object can reach back into the text seen so far.
+            self._chunks.clear()
+            self._chunk_offsets.clear()
+        return completed_items
+
+    def final_object(self):
+        """
+        Returns the last complete top-level object once the stream has ended.
+
+        If the response left a brace unbalanced (e.g. a stray `{` in prose before the real JSON), the
+        objects after it were never top-level. In that case this falls back to the last complete object
+        directly inside each still-open bracket, innermost first, parsing at most one candidate per level.
+        """
+        if self.last_object is not None or not self._stack:
+            return self.last_object
+        for _, _, child_span, _ in reversed(self._stack):
+            if child_span is None:
+                continue
+            try:
+                return json.loads(self._slice(*child_span))
+            except json.JSONDecodeError:
+                continue
+        return None
@@ -0,0 +1,317 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_MODES = ("off", "record", "replay")
+
+# Model settings that don't change what the model answers (credentials, endpoints, HTTP clients).
+_NON_KEY_MODEL_FIELD_PARTS = ("key", "secret", "auth", "client", "header", "host", "url", "timeout", "retries",
+                              "organization", "project", "location")
+
+
+class LLMCacheMiss(RuntimeError):
+    """Raised in replay mode when a model call was never recorded."""
+
+
+def _json_default(value):
+    if isinstance(value, type):
+        model_json_schema = getattr(value, "model_json_schema", None)
+        return {"type": value.__name__, "schema": model_json_schema() if model_json_schema else None}
+    return repr(value)
+
+
+def _model_params(model) -> dict:
+    params = {}
+    for name, value in vars(model).items():
+        if name.startswith(("_", "llm_cache")) or name in ("id", "name", "provider", "response_format"):
+            continue
+        if any(part in name.lower() for part in _NON_KEY_MODEL_FIELD_PARTS):
+            continue
+        if value is None or isinstance(value, (str, int, float, bool, list, dict)):
+            params[name] = value
+    return params
+
+
+def _message_for_key(message) -> dict:
+    message_dict = message.to_dict()
+    message_dict.pop("metrics", None)
+    message_dict.pop("created_at", None)
+    return message_dict
+
+
+def make_cache_key(model, messages, tools=None, response_format=None, tool_choice=None, stream: bool = True) -> str:
+    """
+    Hashes everything that determines a model response: provider, model id, messages, tools and params.
+    Streamed and non-streamed calls are recorded differently, so they get different keys.
+    """
+    key_material = {
+        "provider": model.provider or model.__class__.__name__,
+        "model_id": model.id,
+        "messages": [_message_for_key(m) for m in messages],
+        "tools": tools,
+        "tool_choice": tool_choice,
+        "response_format": response_format,
+        "params": _model_params(model),
+    }
+    if not stream:
+        key_material["stream"] = False
+    encoded = json.dumps(key_material, sort_keys=True, default=_json_default).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Content-addressed store of recorded model responses on local disk, one file per cache key.
+
+    Each file holds the parsed response deltas of one streamed model call, in order, or the single
+    parsed response of a non-streamed one. When the total size goes
+    over `max_bytes`, the least recently used files are deleted (reads refresh a file's mtime).
+    The files are pickles written by this process, so the cache directory must be trusted.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes: int | None = None):
+        self.cache_dir = str(cache_dir or getattr(settings, 'LLM_CACHE_DIR', settings.BASE_DIR / ".llm_cache"))
+        self.max_bytes = max_bytes if max_bytes is not None else getattr(settings, 'LLM_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._size_bytes = None
+        self.hits = 0
+        self.misses = 0
+
+    def __deepcopy__(self, memo):
+        # agno deep-copies models when it copies agents; all copies keep using the same store.
+        return self
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".pkl")
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for root, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if filename.endswith(".pkl"):
+                    path = os.path.join(root, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def load(self, key: str) -> list[bytes] | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                recorded_deltas = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning(f"LLM cache: Could not read {path}: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return recorded_deltas
+
+    def store(self, key: str, recorded_deltas: list[bytes]):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(recorded_deltas, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+        with self._lock:
+            if self._size_bytes is None:
+                self._size_bytes = sum(size for _, size, _ in self._entries())
+            else:
+                self._size_bytes += os.path.getsize(path)
+            if self._size_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._size_bytes = total
+        logger.info(f"LLM cache: Evicted least recently used entries, {total} bytes left.")
+
+
+class _RecordedResponse:
+    """A parsed provider response handed from `invoke` to `parse_provider_response`, which returns it as is."""
+
+    __slots__ = ("model_response",)
+
+    def __init__(self, model_response):
+        self.model_response = model_response
+
+
+class CachedModelMixin:
+    """
+    Mixed into a model's class by `enable_response_cache()`. Model calls, streamed or not, are looked up
+    in the cache first. In 'record' mode a miss goes to the provider and the response is recorded once it
+    completed; in 'replay' mode a miss raises LLMCacheMiss, and every direct provider call is refused.
+    Tool calls in a replayed response are still executed by agno as usual.
+    """
+
+    llm_cache_mode = "record"
+    llm_cache: LLMResponseCache = None
+
+    def _refuse_network_in_replay(self):
+        if self.llm_cache_mode == "replay":
+            raise LLMCacheMiss(f"LLM cache is in replay mode; refusing to call {self.provider or self.id} "
+                               f"without a recorded response.")
+
+    def invoke(self, messages, response_format=None, tools=None, tool_choice=None, **kwargs):
+        key, recording = self._lookup_recording(messages, tools, response_format, tool_choice, stream=False)
+        if recording is not None:
+            return _RecordedResponse(pickle.loads(recording[0]))
+        provider_response = self.parse_provider_response(
+            super().invoke(messages=messages, response_format=response_format, tools=tools, tool_choice=tool_choice,
+                           **kwargs), response_format=response_format)
+        self._store_recording(key, self._record_delta([], provider_response))
+        return _RecordedResponse(provider_response)
+
+    async def ainvoke(self, messages, response_format=None, tools=None, tool_choice=None, **kwargs):
+        key, recording = self._lookup_recording(messages, tools, response_format, tool_choice, stream=False)
+        if recording is not None:
+            return _RecordedResponse(pickle.loads(recording[0]))
+        provider_response = self.parse_provider_response(
+            await super().ainvoke(messages=messages, response_format=response_format, tools=tools,
+                                  tool_choice=tool_choice, **kwargs), response_format=response_format)
+        self._store_recording(key, self._record_delta([], provider_response))
+        return _RecordedResponse(provider_response)
+
+    def parse_provider_response(self, response, **kwargs):
+        # `invoke` already parsed (or replayed) the response.
+        if isinstance(response, _RecordedResponse):
+            return response.model_response
+        return super().parse_provider_response(response, **kwargs)
+
+    def invoke_stream(self, *args, **kwargs):
+        self._refuse_network_in_replay()
+        return super().invoke_stream(*args, **kwargs)
+
+    def ainvoke_stream(self, *args, **kwargs):
+        self._refuse_network_in_replay()
+        return super().ainvoke_stream(*args, **kwargs)
+
+    def _lookup_recording(self, messages, tools, response_format, tool_choice,
+                          stream: bool = True) -> tuple[str, list[bytes] | None]:
+        key = make_cache_key(self, messages, tools=tools, response_format=response_format, tool_choice=tool_choice,
+                             stream=stream)
+        recorded_deltas = self.llm_cache.load(key)
+        if recorded_deltas is None and self.llm_cache_mode == "replay":
+            raise LLMCacheMiss(f"No recorded response for {self.provider or self.id} (key {key[:12]}).")
+        return key, recorded_deltas
+
+    def _store_recording(self, key: str, recorded_deltas: list[bytes] | None):
+        if recorded_deltas is None:
+            return
+        try:
+            self.llm_cache.store(key, recorded_deltas)
+        except OSError as e:
+            logger.warning(f"LLM cache: Could not store recording {key[:12]}: {e}")
+
+    @staticmethod
+    def _record_delta(recorded_deltas: list[bytes] | None, model_response_delta) -> list[bytes] | None:
+        if recorded_deltas is None:
+            return None
+        try:
+            recorded_deltas.append(pickle.dumps(model_response_delta, protocol=pickle.HIGHEST_PROTOCOL))
+            return recorded_deltas
+        except Exception as e:
+            logger.warning(f"LLM cache: Response can't be recorded, skipping this call: {e}")
+            return None
+
+    def process_response_stream(self, messages, assistant_message, stream_data, response_format=None, tools=None,
+                                tool_choice=None):
+        tool_choice = tool_choice or self._tool_choice
+        key, recorded_deltas = self._lookup_recording(messages, tools, response_format, tool_choice)
+        if recorded_deltas is not None:
+            for recorded_delta in recorded_deltas:
+                yield from self._populate_stream_data_and_assistant_message(
+                    stream_data=stream_data, assistant_message=assistant_message,
+                    model_response_delta=pickle.loads(recorded_delta))
+            return
+        new_recording = []
+        for response_delta in self.invoke_stream(messages=messages, response_format=response_format, tools=tools,
+                                                 tool_choice=tool_choice):
+            model_response_delta = self.parse_provider_response_delta(response_delta)
+            new_recording = self._record_delta(new_recording, model_response_delta)
+            yield from self._populate_stream_data_and_assistant_message(
+                stream_data=stream_data, assistant_message=assistant_message, model_response_delta=model_response_delta)
+        self._store_recording(key, new_recording)
+
+    async def aprocess_response_stream(self, messages, assistant_message, stream_data, response_format=None,
+                                       tools=None, tool_choice=None):
+        tool_choice = tool_choice or self._tool_choice
+        key, recorded_deltas = self._lookup_recording(messages, tools, response_format, tool_choice)
+        if recorded_deltas is not None:
+            for recorded_delta in recorded_deltas:
+                for model_response in self._populate_stream_data_and_assistant_message(
+                        stream_data=stream_data, assistant_message=assistant_message,
+                        model_response_delta=pickle.loads(recorded_delta)):
+                    yield model_response
+            return
+        new_recording = []
+        async for response_delta in self.ainvoke_stream(messages=messages, response_format=response_format,
+                                                        tools=tools, tool_choice=tool_choice):
+            model_response_delta = self.parse_provider_response_delta(response_delta)
+            new_recording = self._record_delta(new_recording, model_response_delta)
+            for model_response in self._populate_stream_data_and_assistant_message(
+                    stream_data=stream_data, assistant_message=assistant_message,
+                    model_response_delta=model_response_delta):
+                yield model_response
+        self._store_recording(key, new_recording)
+
+
+_CACHED_MODEL_CLASSES = {}
+_LLM_CACHE = None
+
+
+def get_llm_cache() -> LLMResponseCache:
+    global _LLM_CACHE
+    if _LLM_CACHE is None:
+        _LLM_CACHE = LLMResponseCache()
+    return _LLM_CACHE
+
+
+def enable_response_cache(model, mode: str | None = None, cache: LLMResponseCache | None = None):
+    """
+    Returns the agno model with the response cache turned on, according to LLM_CACHE_MODE unless `mode`
+    is given. The result is a copy of `model` whose class also derives from CachedModelMixin; with
+    mode 'off' the model is returned unchanged.
+    """
+    mode = mode or getattr(settings, 'LLM_CACHE_MODE', 'off')
+    if mode not in LLM_CACHE_MODES:
+        logger.warning(f"Unknown LLM_CACHE_MODE '{mode}'. The LLM response cache stays off.")
+        return model
+    if mode == "off" or model is None:
+        return model
+    model_class = model.__class__
+    if not issubclass(model_class, CachedModelMixin):
+        cached_class = _CACHED_MODEL_CLASSES.get(model_class)
+        if cached_class is None:
+            cached_class = type(f"Cached{model_class.__name__}", (CachedModelMixin, model_class), {"__module__": __name__})
+            _CACHED_MODEL_CLASSES[model_class] = cached_class
+        cached_model = cached_class.__new__(cached_class)
+        cached_model.__dict__.update(model.__dict__)
+        model = cached_model
+    model.llm_cache_mode = mode
+    model.llm_cache = cache or get_llm_cache()
+    logger.info(f"LLM response cache is in '{mode}' mode for model '{model.id}'.")
+    return model
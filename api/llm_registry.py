@@ -1,6 +1,10 @@
+import hashlib
 import json
 import os
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 import requests
 
@@ -15,6 +19,7 @@ import google.generativeai as genai
 import anthropic
 
 from core import settings
+from api.llm_cache import enable_response_cache
 
 logger = logging.getLogger(__name__)
 OPENAI_MODEL_WHITELIST = {
@@ -96,9 +101,8 @@ def discover_deepseek_models():
         logger.error(f"Could not discover DeepSeek models: {e}")
         return []
 
-@lru_cache(maxsize=1)
 def discover_ollama_models():
-    
+    """Not cached: the model catalog calls this on every refresh so newly pulled models show up."""
     default_ollama_host = "http://localhost:11434"
     host = os.getenv("OLLAMA_HOST", default_ollama_host)
     if not host: return []
@@ -126,18 +130,22 @@ def discover_ollama_models():
         logger.error(f"An unexpected error occurred during Ollama model discovery: {e}")
         return []
 
+MODEL_DISCOVERY_FUNCTIONS = (
+    discover_openai_models,
+    discover_google_models,
+    discover_anthropic_models,
+    discover_deepseek_models,
+    discover_ollama_models,
+)
+
 def get_available_models():
     """
-    Calls all discovery functions and returns a single aggregated list.
-    (No change to this function's logic)
+    Calls all discovery functions concurrently (each one is a blocking HTTP call to a different provider)
+    and returns a single aggregated list, in provider order.
     """
-    all_models = []
-    all_models.extend(discover_openai_models())
-    all_models.extend(discover_google_models())
-    all_models.extend(discover_anthropic_models())
-    all_models.extend(discover_deepseek_models()) 
-    all_models.extend(discover_ollama_models())
-    return [m.to_dict() for m in all_models]
+    with ThreadPoolExecutor(max_workers=len(MODEL_DISCOVERY_FUNCTIONS)) as executor:
+        results = list(executor.map(lambda discover: discover(), MODEL_DISCOVERY_FUNCTIONS))
+    return [m.to_dict() for provider_models in results for m in provider_models]
 
 @lru_cache(maxsize=1)
 def load_static_cloud_models():
@@ -150,26 +158,117 @@ def load_static_cloud_models():
         logger.error(f"Could not load static models from {file_path}. Error: {e}. Please run 'python manage.py generate_models_json'.")
         return {}
 
-def get_available_models_grouped():
+class ModelCatalog:
     """
-    This is the single source of truth for the model list.
-    It loads static cloud models and merges them with live Ollama models.
+    The grouped model list served to the frontend: the static cloud models merged with the live
+    Ollama models. The first lookup (normally the warm-up in core/asgi.py) builds the snapshot
+    synchronously, live models included; once it is older than `ttl_seconds`, the next lookup starts a
+    refresh in a background thread and keeps serving the current snapshot until the new one is swapped in.
+    A model id missing from the snapshot triggers one synchronous refresh before `get_provider` gives up,
+    at most once every `miss_refresh_interval_seconds`, so a model pulled into Ollama a moment ago is found.
     """
-    
-    grouped_models = load_static_cloud_models()
 
-    try:
-        
-        live_ollama_models = discover_ollama_models()
-        if live_ollama_models:
-            grouped_models["Ollama"] = [m.to_dict() for m in live_ollama_models]
-            print(f"Dynamically discovered {len(live_ollama_models)} Ollama models.")
-    except Exception as e:
-        print(f"Could not dynamically fetch Ollama models. They will not be available. Error: {e}")
+    miss_refresh_interval_seconds = 5
+
+    def __init__(self, ttl_seconds: float | None = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else getattr(settings, 'MODEL_CATALOG_TTL_SECONDS', 60)
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+
+    @staticmethod
+    def _build_snapshot(grouped_models: dict) -> dict:
+        provider_by_model_id = {}
+        for provider, models in grouped_models.items():
+            for model in models:
+                provider_by_model_id.setdefault(model.get('id'), provider)
+        body = json.dumps(grouped_models, sort_keys=True).encode('utf-8')
+        return {
+            "grouped": grouped_models,
+            "provider_by_model_id": provider_by_model_id,
+            "etag": '"' + hashlib.sha1(body).hexdigest() + '"',
+            "refreshed_at": time.monotonic(),
+        }
+
+    def refresh(self):
+        """Rebuilds the snapshot, including a live Ollama discovery. Blocking; normally run in the background."""
+        with self._refresh_lock:
+            self._refresh()
+
+    def _refresh(self):
+        grouped_models = dict(load_static_cloud_models())
+        try:
+            live_ollama_models = discover_ollama_models()
+            if live_ollama_models:
+                grouped_models["Ollama"] = [m.to_dict() for m in live_ollama_models]
+                logger.info(f"Dynamically discovered {len(live_ollama_models)} Ollama models.")
+        except Exception as e:
+            logger.error(f"Could not dynamically fetch Ollama models. They will not be available. Error: {e}")
+        self._snapshot = self._build_snapshot(grouped_models)
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        finally:
+            self._refresh_thread = None
+
+    def _current(self) -> dict:
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._refresh_lock:
+                if self._snapshot is None:
+                    # A static-only snapshot would hide every Ollama model until the background refresh landed.
+                    self._refresh()
+            snapshot = self._snapshot
+        if time.monotonic() - snapshot["refreshed_at"] > self.ttl_seconds:
+            with self._lock:
+                if self._refresh_thread is None:
+                    self._refresh_thread = threading.Thread(target=self._refresh_in_background,
+                                                            name="model-catalog-refresh", daemon=True)
+                    self._refresh_thread.start()
+        return snapshot
 
-    return grouped_models
+    def use_models(self, grouped_models: dict):
+        """Serves exactly `grouped_models` from now on and stops refreshing. For offline benchmarks."""
+        with self._lock:
+            self.ttl_seconds = float("inf")
+            self._snapshot = self._build_snapshot(grouped_models)
+
+    def grouped(self) -> dict:
+        return self._current()["grouped"]
+
+    def grouped_with_etag(self) -> tuple[dict, str]:
+        snapshot = self._current()
+        return snapshot["grouped"], snapshot["etag"]
+
+    def get_provider(self, model_id: str) -> str | None:
+        snapshot = self._current()
+        provider = snapshot["provider_by_model_id"].get(model_id)
+        if (provider is None and self.ttl_seconds != float("inf")
+                and time.monotonic() - snapshot["refreshed_at"] > self.miss_refresh_interval_seconds):
+            self.refresh()
+            provider = self._snapshot["provider_by_model_id"].get(model_id)
+        return provider
+
+
+MODEL_CATALOG = ModelCatalog()
+
+def get_available_models_grouped():
+    """
+    This is the single source of truth for the model list.
+    It returns the catalog's current snapshot of the static cloud models merged with live Ollama models.
+    """
+    return MODEL_CATALOG.grouped()
 
 def get_llm_instance(model_id: str, provider: str):
+    """
+    Creates the model for a provider, with the LLM response cache enabled when LLM_CACHE_MODE is
+    'record' or 'replay'.
+    """
+    return enable_response_cache(_create_llm_instance(model_id, provider))
+
+def _create_llm_instance(model_id: str, provider: str):
     """
     UPDATED: This factory is now simpler. It receives the provider and
     instantiates the correct class. It no longer does any discovery.
@@ -0,0 +1,163 @@
+# api/management/commands/bench_orchestrator.py
+import asyncio
+import contextlib
+import json
+import logging
+import sys
+import time
+import uuid
+
+from django.conf import settings as django_settings
+from django.core.management.base import BaseCommand
+from django.test import AsyncRequestFactory
+
+from benchmarks.report import environment, peak_rss_bytes, percentile
+from benchmarks.workspace import use_scratch_workspace
+from core import settings as app_settings
+
+BENCH_PROMPT = "Research three topics and compose a short report from the notes."
+
+
+async def _run_session(view, session_id: str, model_id: str) -> dict:
+    """Posts one prompt through PromptAPIViewAsync and consumes its SSE stream like a browser would."""
+    request = AsyncRequestFactory().post('/api/prompt/', data=json.dumps(
+        {"prompt": BENCH_PROMPT, "model_id": model_id, "session_id": session_id}), content_type='application/json')
+    started = time.perf_counter()
+    response = await view(request)
+    first_frame_at = None
+    frames = 0
+    frame_bytes = 0
+    errors = 0
+    async for frame in response.streaming_content:
+        if first_frame_at is None:
+            first_frame_at = time.perf_counter()
+        frames += 1
+        frame_bytes += len(frame)
+        # Only error frames are decoded, so the client side stays out of the per-frame cost.
+        if b'error' in frame and json.loads(frame[len(b"data: "):]).get("type") in ("error", "step_error"):
+            errors += 1
+    finished = time.perf_counter()
+    return {"frames": frames, "bytes": frame_bytes, "errors": errors,
+            "first_frame_seconds": (first_frame_at or finished) - started, "total_seconds": finished - started}
+
+
+async def _run_round(view, sessions: int, model_id: str) -> tuple[list[dict], float, float]:
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    results = await asyncio.gather(*(_run_session(view, f"bench-{uuid.uuid4().hex[:12]}", model_id)
+                                     for _ in range(sessions)))
+    return list(results), time.perf_counter() - wall_started, time.process_time() - cpu_started
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks the orchestrator end to end, offline: N concurrent sessions through PromptAPIViewAsync '
+            'with a scripted model provider. Prints a JSON report (events/sec, CPU per frame, latency '
+            'percentiles, peak RSS) for tracking regressions between versions.')
+    # The URL checks import the agent modules before handle() could redirect their setup warnings.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=10, help='Concurrent sessions per round.')
+        parser.add_argument('--rounds', type=int, default=3, help='Rounds to run; each starts when the previous one finished.')
+        parser.add_argument('--warmup-rounds', type=int, default=1, help='Rounds run first and left out of the report.')
+        parser.add_argument('--plan-steps', type=int, default=3, help='Tasks in the scripted plan.')
+        parser.add_argument('--step-tokens', type=int, default=200, help='Tokens in each scripted step answer.')
+        parser.add_argument('--tokens-per-second', type=float, default=100.0,
+                            help='Scripted token rate per model call; 0 streams as fast as possible.')
+        parser.add_argument('--tokens-per-chunk', type=int, default=3, help='Tokens per streamed chunk.')
+        parser.add_argument('--first-token-latency-ms', type=float, default=300.0,
+                            help='Scripted delay before the first chunk of every model call.')
+        parser.add_argument('--planner-mode', choices=('pipelined', 'structured'), default='pipelined',
+                            help="PLANNER_MODE to benchmark ('tools' needs real file-saving tool calls).")
+        parser.add_argument('--dispatch-mode', choices=('team', 'direct'), default=app_settings.STEP_DISPATCH_MODE,
+                            help='STEP_DISPATCH_MODE to benchmark.')
+        parser.add_argument('--composer-mode', choices=('agent', 'map_reduce', 'sections'),
+                            default=app_settings.COMPOSER_MODE, help='COMPOSER_MODE to benchmark.')
+        parser.add_argument('--notes-tokens', type=int, default=20000,
+                            help="Size of each research notes file written to the workspace for 'map_reduce' and 'sections' to compose.")
+        parser.add_argument('--max-parallel-steps', type=int, default=app_settings.PLAN_MAX_PARALLEL_STEPS)
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+        parser.add_argument('--keep-agno-logs', action='store_true',
+                            help="Keep agno's debug console logging on (it is measured, but floods the terminal).")
+
+    def handle(self, *args, **options):
+        # The runs' notes, plans and reports, and agno's databases, go to a temporary workspace.
+        scratch = use_scratch_workspace()
+        try:
+            self._run_benchmark(options)
+        finally:
+            scratch.cleanup()
+
+    def _run_benchmark(self, options):
+        # The agent modules print setup warnings on import; keep stdout for the JSON report.
+        with contextlib.redirect_stdout(sys.stderr):
+            from api.runs import RUN_MANAGER
+            from api.views import PromptAPIViewAsync
+            from benchmarks.scripted_provider import ScriptedModel, install_scripted_model, write_plan_notes
+
+        # After the imports: agno installs its own logger class when it is first imported.
+        if not options['keep_agno_logs']:
+            for logger_name in ("agno", "agno-team"):
+                logging.getLogger(logger_name).disabled = True
+        logging.getLogger("api").setLevel(logging.ERROR)
+
+        app_settings.PLANNER_MODE = options['planner_mode']
+        app_settings.STEP_DISPATCH_MODE = options['dispatch_mode']
+        app_settings.PLAN_MAX_PARALLEL_STEPS = options['max_parallel_steps']
+        app_settings.COMPOSER_MODE = options['composer_mode']
+        # Every session comes from the same client, so lift the admission limits to run them all at once.
+        RUN_MANAGER.max_concurrent_runs = RUN_MANAGER.max_runs_per_user = max(options['sessions'], 1)
+
+        model = ScriptedModel(first_token_latency_seconds=options['first_token_latency_ms'] / 1000,
+                              tokens_per_second=options['tokens_per_second'],
+                              tokens_per_chunk=options['tokens_per_chunk'], plan_steps=options['plan_steps'],
+                              step_tokens=options['step_tokens'])
+        install_scripted_model(model)
+        if options['composer_mode'] != 'agent':
+            # The scripted research steps don't save files, so the composer's inputs are written up front.
+            write_plan_notes(options['plan_steps'], options['notes_tokens'])
+
+        report = asyncio.run(self._benchmark(PromptAPIViewAsync.as_view(), options, model.id))
+        report["config"] = {key: options[key] for key in (
+            'sessions', 'rounds', 'warmup_rounds', 'plan_steps', 'step_tokens', 'tokens_per_second',
+            'tokens_per_chunk', 'first_token_latency_ms', 'planner_mode', 'dispatch_mode', 'composer_mode',
+            'notes_tokens', 'max_parallel_steps')}
+        report["environment"] = environment(django_settings.BASE_DIR)
+
+        report_json = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(report_json + "\n")
+        self.stdout.write(report_json)
+
+    async def _benchmark(self, view, options: dict, model_id: str) -> dict:
+        rss_before = peak_rss_bytes()
+        for _ in range(options['warmup_rounds']):
+            await _run_round(view, options['sessions'], model_id)
+
+        sessions = []
+        wall_seconds = 0.0
+        cpu_seconds = 0.0
+        for _ in range(options['rounds']):
+            round_sessions, round_wall, round_cpu = await _run_round(view, options['sessions'], model_id)
+            sessions.extend(round_sessions)
+            wall_seconds += round_wall
+            cpu_seconds += round_cpu
+
+        frames = sum(s["frames"] for s in sessions)
+        totals = sorted(s["total_seconds"] for s in sessions)
+        first_frames = sorted(s["first_frame_seconds"] for s in sessions)
+        return {
+            "sessions_completed": len(sessions),
+            "sessions_with_errors": sum(1 for s in sessions if s["errors"]),
+            "frames": frames,
+            "bytes": sum(s["bytes"] for s in sessions),
+            "wall_seconds": round(wall_seconds, 4),
+            "events_per_second": round(frames / wall_seconds, 2) if wall_seconds else None,
+            "cpu_seconds": round(cpu_seconds, 4),
+            "cpu_microseconds_per_frame": round(cpu_seconds / frames * 1e6, 2) if frames else None,
+            "latency_seconds": {"p50": percentile(totals, 0.5), "p99": percentile(totals, 0.99), "max": totals[-1] if totals else None},
+            "first_frame_seconds": {"p50": percentile(first_frames, 0.5), "p99": percentile(first_frames, 0.99)},
+            "peak_rss_bytes": peak_rss_bytes(),
+            "peak_rss_bytes_before_sessions": rss_before,
+        }
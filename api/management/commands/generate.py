@@ -3,7 +3,7 @@ import json
 import os
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from api.llm_registry import get_available_models  # We will temporarily use the old function
+from api.llm_registry import get_available_models
 
 class Command(BaseCommand):
     help = 'Discovers all available LLM models from configured providers and saves them to a static JSON file.'
@@ -12,7 +12,7 @@ class Command(BaseCommand):
         self.stdout.write("Starting model discovery from all providers...")
         self.stdout.write("NOTE: This requires all relevant API keys (OPENAI_API_KEY, GEMINI_API_KEY, etc.) to be set in your environment.")
 
-        # This function still makes the live API calls
+        # Makes the live API calls, one thread per provider
         all_models_list = get_available_models()
 
         # Group the flat list into the desired {provider: [models]} structure
@@ -0,0 +1,335 @@
+# api/management/commands/loadtest_sse.py
+import asyncio
+import contextlib
+import json
+import logging
+import socket
+import sys
+import threading
+import time
+import uuid
+
+import httpx
+import uvicorn
+from django.conf import settings as django_settings
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.report import current_rss_bytes, environment, percentile
+from benchmarks.workspace import use_scratch_workspace
+from core import settings as app_settings
+
+LOAD_PROMPT = "Research three topics and compose a short report from the notes."
+# Frame types that mean the client missed events or the run failed.
+_ERROR_MARKERS = ('"type":"error"', '"type":"step_error"', '"type": "error"', '"type": "step_error"')
+_REPLAY_GAP_MARKERS = ('"type":"replay_gap"', '"type": "replay_gap"')
+_DONE_MARKERS = ('"type":"session_done"', '"type": "session_done"')
+
+
+class _ServerThread(threading.Thread):
+    """
+    Runs the ASGI application under uvicorn on its own event loop, like a single worker process would,
+    so the load generator's client work doesn't show up as lag on the server's loop.
+    """
+
+    def __init__(self, application, sock: socket.socket):
+        super().__init__(name="loadtest-uvicorn", daemon=True)
+        self.sock = sock
+        # log_config=None: uvicorn's dictConfig would re-enable the loggers the command silenced.
+        self.server = uvicorn.Server(uvicorn.Config(application, lifespan="off", log_config=None,
+                                                    log_level="warning", access_log=False, timeout_keep_alive=30))
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.lag_samples: list[float] = []
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.server.serve(sockets=[self.sock]))
+
+    def wait_started(self, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if not self.is_alive() or time.monotonic() > deadline:
+                raise CommandError("The uvicorn server did not start.")
+            time.sleep(0.05)
+
+    def start_lag_sampler(self, interval_seconds: float):
+        """Records how late the server's loop wakes up from `interval_seconds` sleeps into lag_samples."""
+        async def sample():
+            while True:
+                started = self.loop.time()
+                await asyncio.sleep(interval_seconds)
+                self.lag_samples.append(max(0.0, self.loop.time() - started - interval_seconds))
+        return asyncio.run_coroutine_threadsafe(sample(), self.loop)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.join(timeout=10)
+
+
+class _StageState:
+    """What the clients of one concurrency stage share: how many streams are open and the memory samples."""
+
+    def __init__(self):
+        self.open_streams = 0
+        self.peak_open_streams = 0
+        self.peak_rss = 0
+        self.rss_at_peak_open = 0
+
+    def stream_opened(self):
+        self.open_streams += 1
+        if self.open_streams >= self.peak_open_streams:
+            self.peak_open_streams = self.open_streams
+            self.rss_at_peak_open = current_rss_bytes()
+
+    def stream_closed(self):
+        self.open_streams -= 1
+
+
+async def _consume_stream(client: httpx.AsyncClient, url: str, model_id: str, state: _StageState,
+                          read_delay: float, timeout: float) -> dict:
+    """Opens one /api/prompt/ stream and reads it to the end, timing the gaps between events."""
+    result = {"frames": 0, "gaps": [], "first_frame_seconds": None, "completed": False, "errors": 0,
+              "replay_gaps": 0, "failure": None, "slow_consumer": read_delay > 0}
+    body = {"prompt": LOAD_PROMPT, "model_id": model_id, "session_id": f"load-{uuid.uuid4().hex[:12]}"}
+    started = time.perf_counter()
+    last_frame_at = None
+    opened = False
+    try:
+        async with asyncio.timeout(timeout):
+            async with client.stream("POST", url, json=body) as response:
+                if response.status_code != 200:
+                    result["failure"] = f"HTTP {response.status_code}"
+                    return result
+                state.stream_opened()
+                opened = True
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    now = time.perf_counter()
+                    if last_frame_at is None:
+                        result["first_frame_seconds"] = now - started
+                    else:
+                        result["gaps"].append(now - last_frame_at)
+                    last_frame_at = now
+                    result["frames"] += 1
+                    # Substring checks keep the client's per-frame cost off the measured server.
+                    if any(marker in line for marker in _DONE_MARKERS):
+                        result["completed"] = True
+                    elif any(marker in line for marker in _ERROR_MARKERS):
+                        result["errors"] += 1
+                    elif any(marker in line for marker in _REPLAY_GAP_MARKERS):
+                        result["replay_gaps"] += 1
+                    if read_delay:
+                        await asyncio.sleep(read_delay)
+    except TimeoutError:
+        result["failure"] = "timeout"
+    except httpx.HTTPError as e:
+        result["failure"] = type(e).__name__
+    finally:
+        if opened:
+            state.stream_closed()
+        result["total_seconds"] = time.perf_counter() - started
+    if not result["completed"] and result["failure"] is None:
+        result["failure"] = "closed before session_done"
+    return result
+
+
+async def _sample_rss(state: _StageState, interval_seconds: float):
+    while True:
+        state.peak_rss = max(state.peak_rss, current_rss_bytes())
+        await asyncio.sleep(interval_seconds)
+
+
+def _seconds(value: float | None) -> float | None:
+    return round(value, 4) if value is not None else None
+
+
+class Command(BaseCommand):
+    help = ('Load-tests one in-process uvicorn worker serving core.asgi:application: ramps up concurrent '
+            '/api/prompt/ SSE streams against the scripted stand-in model and reports inter-event latency, '
+            'dropped and slow streams, memory per open stream and event-loop lag for each concurrency stage.')
+    # The URL checks import the agent modules before handle() could redirect their setup warnings.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stages', default='10,25,50,100',
+                            help='Comma-separated concurrency levels, run one after the other.')
+        parser.add_argument('--ramp-seconds', type=float, default=1.0,
+                            help='Spread the stream starts of each stage over this many seconds.')
+        parser.add_argument('--slow-consumer-fraction', type=float, default=0.0,
+                            help='Fraction of streams whose client waits --slow-consumer-delay-ms after every event.')
+        parser.add_argument('--slow-consumer-delay-ms', type=float, default=200.0)
+        parser.add_argument('--stall-threshold-ms', type=float, default=2000.0,
+                            help='A stream with a gap between events longer than this counts as stalled.')
+        parser.add_argument('--max-p99-gap-ratio', type=float, default=1.5,
+                            help='The highest stage whose p99 inter-event gap stays within this multiple of the '
+                                 "first stage's, with no dropped or failed streams, is reported as "
+                                 'max_healthy_concurrency.')
+        parser.add_argument('--stream-timeout', type=float, default=300.0, help='Seconds before a stream is dropped.')
+        parser.add_argument('--lag-interval-ms', type=float, default=50.0, help='Event-loop lag sampling interval.')
+        parser.add_argument('--plan-steps', type=int, default=3, help='Tasks in the scripted plan.')
+        parser.add_argument('--step-tokens', type=int, default=300, help='Tokens in each scripted step answer.')
+        parser.add_argument('--tokens-per-second', type=float, default=50.0, help='Scripted token rate per model call.')
+        parser.add_argument('--tokens-per-chunk', type=int, default=3, help='Tokens per streamed chunk.')
+        parser.add_argument('--first-token-latency-ms', type=float, default=300.0,
+                            help='Scripted delay before the first chunk of every model call.')
+        parser.add_argument('--planner-mode', choices=('pipelined', 'structured'), default='pipelined',
+                            help="PLANNER_MODE to load ('tools' needs real file-saving tool calls).")
+        parser.add_argument('--dispatch-mode', choices=('team', 'direct'), default=app_settings.STEP_DISPATCH_MODE)
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+        parser.add_argument('--keep-agno-logs', action='store_true',
+                            help="Keep agno's debug console logging on (it is measured, but floods the terminal).")
+
+    def handle(self, *args, **options):
+        try:
+            stages = [int(level) for level in options['stages'].split(',') if level.strip()]
+        except ValueError:
+            raise CommandError("--stages must be comma-separated integers, e.g. 10,25,50")
+        if not stages or min(stages) < 1:
+            raise CommandError("--stages needs at least one concurrency level of 1 or more.")
+
+        # The runs' plans and reports, and agno's databases, go to a temporary workspace.
+        scratch = use_scratch_workspace()
+        try:
+            self._run_load_test(stages, options)
+        finally:
+            scratch.cleanup()
+
+    def _run_load_test(self, stages: list[int], options):
+        # The agent modules print setup warnings on import; keep stdout for the JSON report.
+        with contextlib.redirect_stdout(sys.stderr):
+            from api.runs import RUN_MANAGER
+            from benchmarks.scripted_provider import ScriptedModel, install_scripted_model
+            from core.asgi import application
+
+        # After the imports: agno installs its own logger class when it is first imported.
+        if not options['keep_agno_logs']:
+            for logger_name in ("agno", "agno-team"):
+                logging.getLogger(logger_name).disabled = True
+        logging.getLogger("api").setLevel(logging.ERROR)
+
+        app_settings.PLANNER_MODE = options['planner_mode']
+        app_settings.STEP_DISPATCH_MODE = options['dispatch_mode']
+        # Every stream comes from the same client address, so lift the admission limits to the largest stage.
+        RUN_MANAGER.max_concurrent_runs = RUN_MANAGER.max_runs_per_user = max(stages)
+
+        model = ScriptedModel(first_token_latency_seconds=options['first_token_latency_ms'] / 1000,
+                              tokens_per_second=options['tokens_per_second'],
+                              tokens_per_chunk=options['tokens_per_chunk'], plan_steps=options['plan_steps'],
+                              step_tokens=options['step_tokens'])
+        install_scripted_model(model)
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("127.0.0.1", 0))
+        server = _ServerThread(application, sock)
+        server.start()
+        server.wait_started()
+        lag_sampler = server.start_lag_sampler(options['lag_interval_ms'] / 1000)
+        url = f"http://127.0.0.1:{sock.getsockname()[1]}/api/prompt/"
+        try:
+            stage_reports = asyncio.run(self._run_stages(stages, url, model.id, server, options))
+        finally:
+            lag_sampler.cancel()
+            server.stop()
+
+        # The first stage is the baseline: gaps at plan and step boundaries are long even when idle.
+        baseline_gap = stage_reports[0]["inter_event_seconds"]["p99"]
+        for stage in stage_reports:
+            p99_gap = stage["inter_event_seconds"]["p99"]
+            stage["healthy"] = (stage["streams_dropped"] == 0 and stage["streams_with_errors"] == 0
+                                and p99_gap is not None and baseline_gap is not None
+                                and p99_gap <= baseline_gap * options['max_p99_gap_ratio'])
+        healthy = [stage["concurrency"] for stage in stage_reports if stage["healthy"]]
+        report = {
+            "max_healthy_concurrency": max(healthy) if healthy else 0,
+            "stages": stage_reports,
+            "config": {key: options[key] for key in (
+                'stages', 'ramp_seconds', 'slow_consumer_fraction', 'slow_consumer_delay_ms', 'stall_threshold_ms',
+                'max_p99_gap_ratio', 'stream_timeout', 'plan_steps', 'step_tokens', 'tokens_per_second',
+                'tokens_per_chunk', 'first_token_latency_ms', 'planner_mode', 'dispatch_mode')},
+            "environment": environment(django_settings.BASE_DIR),
+        }
+        report_json = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(report_json + "\n")
+        self.stdout.write(report_json)
+
+    async def _run_stages(self, stages: list[int], url: str, model_id: str, server: _ServerThread,
+                          options: dict) -> list[dict]:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        timeout = httpx.Timeout(options['stream_timeout'], connect=30.0)
+        reports = []
+        async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+            for concurrency in stages:
+                report = await self._run_stage(client, concurrency, url, model_id, server, options)
+                reports.append(report)
+                self.stderr.write(
+                    f"concurrency={concurrency} completed={report['streams_completed']} "
+                    f"dropped={report['streams_dropped']} p99_gap={report['inter_event_seconds']['p99']}s "
+                    f"loop_lag_p99={report['event_loop_lag_seconds']['p99']}s "
+                    f"rss_per_stream={report['rss_bytes_per_open_stream']}")
+        return reports
+
+    async def _run_stage(self, client: httpx.AsyncClient, concurrency: int, url: str, model_id: str,
+                         server: _ServerThread, options: dict) -> dict:
+        state = _StageState()
+        rss_before = state.peak_rss = current_rss_bytes()
+        lag_start = len(server.lag_samples)
+        slow_streams = round(concurrency * options['slow_consumer_fraction'])
+        slow_delay = options['slow_consumer_delay_ms'] / 1000
+        start_spacing = options['ramp_seconds'] / concurrency
+
+        async def start_stream(index: int):
+            await asyncio.sleep(index * start_spacing)
+            return await _consume_stream(client, url, model_id, state, slow_delay if index < slow_streams else 0.0,
+                                         options['stream_timeout'])
+
+        rss_sampler = asyncio.create_task(_sample_rss(state, 0.25))
+        wall_started = time.perf_counter()
+        try:
+            results = await asyncio.gather(*(start_stream(i) for i in range(concurrency)))
+        finally:
+            rss_sampler.cancel()
+        wall_seconds = time.perf_counter() - wall_started
+
+        stall_threshold = options['stall_threshold_ms'] / 1000
+        # Slow consumers are reported separately: their gaps are their own reading delay.
+        gaps = sorted(gap for r in results if not r["slow_consumer"] for gap in r["gaps"])
+        first_frames = sorted(r["first_frame_seconds"] for r in results if r["first_frame_seconds"] is not None)
+        lags = sorted(server.lag_samples[lag_start:])
+        failures = {}
+        for r in results:
+            if r["failure"]:
+                failures[r["failure"]] = failures.get(r["failure"], 0) + 1
+        frames = sum(r["frames"] for r in results)
+        return {
+            "concurrency": concurrency,
+            "streams_completed": sum(1 for r in results if r["completed"]),
+            "streams_dropped": sum(1 for r in results if not r["completed"]),
+            "drop_reasons": failures,
+            "streams_with_errors": sum(1 for r in results if r["errors"]),
+            "streams_with_replay_gaps": sum(1 for r in results if r["replay_gaps"]),
+            "streams_stalled": sum(1 for r in results if r["gaps"] and max(r["gaps"]) > stall_threshold
+                                   and not r["slow_consumer"]),
+            "slow_consumers": slow_streams,
+            "slow_consumers_completed": sum(1 for r in results if r["slow_consumer"] and r["completed"]),
+            "frames": frames,
+            "wall_seconds": _seconds(wall_seconds),
+            "events_per_second": round(frames / wall_seconds, 2) if wall_seconds else None,
+            "inter_event_seconds": {"p50": _seconds(percentile(gaps, 0.5)), "p95": _seconds(percentile(gaps, 0.95)),
+                                    "p99": _seconds(percentile(gaps, 0.99)), "max": _seconds(gaps[-1] if gaps else None)},
+            "first_frame_seconds": {"p50": _seconds(percentile(first_frames, 0.5)),
+                                    "p99": _seconds(percentile(first_frames, 0.99))},
+            "stream_seconds": {"p50": _seconds(percentile(sorted(r["total_seconds"] for r in results), 0.5)),
+                               "max": _seconds(max(r["total_seconds"] for r in results))},
+            "event_loop_lag_seconds": {"p50": _seconds(percentile(lags, 0.5)), "p99": _seconds(percentile(lags, 0.99)),
+                                       "max": _seconds(lags[-1] if lags else None)},
+            "peak_open_streams": state.peak_open_streams,
+            "rss_bytes_before": rss_before,
+            "rss_bytes_peak": state.peak_rss,
+            # Server and clients share the process, so this includes each stream's client-side buffers.
+            "rss_bytes_per_open_stream": (round((state.rss_at_peak_open - rss_before) / state.peak_open_streams)
+                                          if state.peak_open_streams else None),
+        }
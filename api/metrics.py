@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+
+from api.pricing import estimate_cost
+
+logger = logging.getLogger(__name__)
+
+# Content type of the Prometheus text exposition format.
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: tuple, labelvalues: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing value per label combination."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labelvalues, value in values:
+            yield self.name, _format_labels(self.labelnames, labelvalues), value
+
+
+class Gauge(Counter):
+    """A value that can go up and down, set directly."""
+
+    type_name = "gauge"
+
+    def set(self, *labelvalues, value: float):
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class CollectedCounter(Gauge):
+    """A counter whose total is kept by its owner and copied in at scrape time."""
+
+    type_name = "counter"
+
+
+class Histogram:
+    """
+    Observations counted into fixed buckets per label combination. An observation is one bisect and a few
+    additions on preallocated lists, so it is cheap enough for every model and tool call.
+    """
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: tuple, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # Per label combination: [count per bucket..., count above the last bucket], sum, count.
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series_copy = [(labelvalues, list(series[0]), series[1], series[2])
+                           for labelvalues, series in self._series.items()]
+        for labelvalues, bucket_counts, total, count in series_copy:
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                yield (f"{self.name}_bucket",
+                       _format_labels(self.labelnames, labelvalues, f'le="{_format_value(upper_bound)}"'), cumulative)
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class MetricsRegistry:
+    """
+    The process's metrics, rendered in the Prometheus text format. `collectors` are called at scrape time
+    to refresh values that are cheaper to read from their owner (run queue, SSE totals, caches) than to
+    keep updating.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"Metrics: Collector {collector.__name__} failed: {e}")
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for sample_name, labels, value in metric.samples():
+                lines.append(f"{sample_name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+RUNS_ACTIVE = REGISTRY.register(Gauge("cerno_runs_active", "Orchestration runs currently executing."))
+RUNS_QUEUED = REGISTRY.register(Gauge("cerno_runs_queued", "Orchestration runs waiting for an execution slot."))
+RUNS_FINISHED = REGISTRY.register(Counter("cerno_runs_finished_total", "Orchestration runs finished, by outcome.",
+                                          ("status",)))
+SSE_FRAMES = REGISTRY.register(CollectedCounter("cerno_sse_frames_total", "SSE frames sent to clients."))
+SSE_BYTES = REGISTRY.register(CollectedCounter("cerno_sse_bytes_total", "SSE bytes sent to clients."))
+SSE_TOKENS = REGISTRY.register(CollectedCounter("cerno_sse_tokens_total", "LLM tokens streamed to clients in token frames."))
+MODEL_CALL_SECONDS = REGISTRY.register(Histogram(
+    "cerno_model_call_duration_seconds", "Duration of model calls.",
+    (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120), ("provider", "model")))
+MODEL_TTFT_SECONDS = REGISTRY.register(Histogram(
+    "cerno_model_time_to_first_token_seconds", "Time to the first streamed token of model calls.",
+    (0.1, 0.25, 0.5, 1, 2, 5, 10, 30), ("provider", "model")))
+MODEL_TOKENS = REGISTRY.register(Counter("cerno_model_tokens_total", "Tokens used by model calls.",
+                                         ("model", "direction")))
+MODEL_COST_USD = REGISTRY.register(Counter("cerno_model_cost_usd_total",
+                                           "Estimated cost of model calls in USD (priced models only).", ("model",)))
+TOOL_CALL_SECONDS = REGISTRY.register(Histogram(
+    "cerno_tool_call_duration_seconds", "Duration of tool calls.",
+    (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60), ("tool",)))
+TOOL_CALL_ERRORS = REGISTRY.register(Counter("cerno_tool_call_errors_total", "Tool calls that failed.", ("tool",)))
+TOOL_CACHE_REQUESTS = REGISTRY.register(CollectedCounter(
+    "cerno_tool_cache_requests_total", "Search/scrape cache lookups by result (hit, miss, in_flight_join).",
+    ("result",)))
+LLM_CACHE_REQUESTS = REGISTRY.register(CollectedCounter(
+    "cerno_llm_cache_requests_total", "LLM response cache lookups by result (hit, miss).", ("result",)))
+EVENT_LOOP_LAG_SECONDS = REGISTRY.register(Histogram(
+    "cerno_event_loop_lag_seconds", "How late the event loop woke up a sleeping task.",
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)))
+
+
+def observe_model_call(provider: str | None, model: str | None, duration_seconds: float | None,
+                       time_to_first_token_seconds: float | None, input_tokens: int, output_tokens: int):
+    provider = provider or "unknown"
+    model = model or "unknown"
+    if duration_seconds is not None:
+        MODEL_CALL_SECONDS.observe(duration_seconds, provider, model)
+    if time_to_first_token_seconds is not None:
+        MODEL_TTFT_SECONDS.observe(time_to_first_token_seconds, provider, model)
+    MODEL_TOKENS.inc(model, "input", amount=input_tokens)
+    MODEL_TOKENS.inc(model, "output", amount=output_tokens)
+    cost = estimate_cost(model, input_tokens, output_tokens)
+    if cost is not None:
+        MODEL_COST_USD.inc(model, amount=cost)
+
+
+def observe_tool_call(tool_name: str | None, duration_seconds: float, failed: bool = False):
+    tool_name = tool_name or "unknown"
+    TOOL_CALL_SECONDS.observe(duration_seconds, tool_name)
+    if failed:
+        TOOL_CALL_ERRORS.inc(tool_name)
+
+
+def _collect_runs():
+    from api.runs import RUN_MANAGER
+    RUNS_ACTIVE.set(value=len(RUN_MANAGER.active))
+    RUNS_QUEUED.set(value=len(RUN_MANAGER.waiting))
+
+
+def _collect_sse():
+    from api.sse import SSE_TOTALS
+    SSE_FRAMES.set(value=SSE_TOTALS.frames)
+    SSE_BYTES.set(value=SSE_TOTALS.bytes)
+    SSE_TOKENS.set(value=SSE_TOTALS.tokens)
+
+
+def _collect_caches():
+    from api import llm_cache
+    from api.tool_cache import TOOL_RESULT_CACHE
+    for result, value in (("hit", TOOL_RESULT_CACHE.totals.hits), ("miss", TOOL_RESULT_CACHE.totals.misses),
+                          ("in_flight_join", TOOL_RESULT_CACHE.totals.in_flight_joins)):
+        TOOL_CACHE_REQUESTS.set(result, value=value)
+    # The LLM cache only exists once a model was built with it turned on.
+    if llm_cache._LLM_CACHE is not None:
+        LLM_CACHE_REQUESTS.set("hit", value=llm_cache._LLM_CACHE.hits)
+        LLM_CACHE_REQUESTS.set("miss", value=llm_cache._LLM_CACHE.misses)
+
+
+REGISTRY.collectors.extend([_collect_runs, _collect_sse, _collect_caches])
+
+
+class EventLoopLagMonitor:
+    """
+    Sleeps for `interval_seconds` in a loop on the server's event loop and records how much later than
+    asked it was woken up. Lag means something blocked the loop (sync I/O, CPU-heavy parsing), which
+    delays every SSE stream in the process.
+    """
+
+    def __init__(self, interval_seconds: float | None = None):
+        self.interval_seconds = (interval_seconds if interval_seconds is not None
+                                 else getattr(settings, 'METRICS_LOOP_LAG_INTERVAL_SECONDS', 0.5))
+        self._task: asyncio.Task | None = None
+
+    def ensure_started(self):
+        """Starts sampling on the running event loop, unless it already does."""
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._task.get_loop() is loop:
+            return
+        self._task = loop.create_task(self._sample(loop))
+
+    async def _sample(self, loop: asyncio.AbstractEventLoop):
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval_seconds)
+            EVENT_LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - started - self.interval_seconds))
+
+
+EVENT_LOOP_LAG = EventLoopLagMonitor()
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+_STEP_FINISHED = object()
+_PLAN_CHANGED = object()
+
+# Files an agent writes whatever its task declares, keyed by the `agent_id` with case and punctuation
+# removed. The ResearchAgent's instructions always save these, so every research task writes them.
+IMPLICIT_AGENT_OUTPUTS = {
+    "researchagent": ("raw_sources.json", "facts_list.md", "fact_check_log.md", "data_summary.md",
+                      "extracted_contents/"),
+}
+
+
+def get_task_files(task_details_dict: dict, key: str) -> list[str]:
+    """
+    Returns the filenames a plan task declares under `key` ('inputs' or 'outputs').
+    The planner is not consistent about `input` vs `inputs`, and uses `NONE` for "no files".
+    """
+    files = task_details_dict.get(key)
+    if files is None and key == "inputs":
+        files = task_details_dict.get("input")
+    if not files:
+        return []
+    if isinstance(files, str):
+        files = [files]
+    return [f.strip() for f in files if isinstance(f, str) and f.strip() and f.strip().upper() != "NONE"]
+
+
+def get_task_writes(task_details_dict: dict) -> list[str]:
+    """The files a task writes: its declared `outputs` plus the ones its agent always writes."""
+    agent_key = re.sub(r"[^a-z0-9]", "", str(task_details_dict.get("agent_id") or "").lower())
+    return get_task_files(task_details_dict, "outputs") + list(IMPLICIT_AGENT_OUTPUTS.get(agent_key, ()))
+
+
+def _files_overlap(file_a: str, file_b: str) -> bool:
+    """Two declared paths overlap if they are equal or one is a directory containing the other."""
+    a = file_a.strip("/")
+    b = file_b.strip("/")
+    return a == b or a.startswith(b + "/") or b.startswith(a + "/")
+
+
+def _any_overlap(files_a: list[str], files_b: list[str]) -> bool:
+    return any(_files_overlap(a, b) for a in files_a for b in files_b)
+
+
+def get_task_dependencies(plan_tasks_list: list[dict], index: int) -> set[int]:
+    """
+    Returns the indexes of the earlier tasks that task `index` has to wait for.
+
+    A task depends on an earlier task when it reads a file the earlier one writes, writes a file
+    the earlier one reads, or when both write the same file. Only earlier tasks are considered,
+    so the plan order always breaks ties and the graph can never contain a cycle.
+    """
+    task = plan_tasks_list[index]
+    reads = get_task_files(task, "inputs")
+    writes = get_task_writes(task)
+    task_deps = set()
+    for earlier_index in range(index):
+        earlier_task = plan_tasks_list[earlier_index]
+        if (_any_overlap(get_task_writes(earlier_task), reads + writes)
+                or _any_overlap(get_task_files(earlier_task, "inputs"), writes)):
+            task_deps.add(earlier_index)
+    return task_deps
+
+
+def build_dependency_graph(plan_tasks_list: list[dict]) -> dict[int, set[int]]:
+    """Maps each task index to the set of earlier task indexes it has to wait for."""
+    return {index: get_task_dependencies(plan_tasks_list, index) for index in range(len(plan_tasks_list))}
+
+
+class PlanScheduler:
+    """
+    Runs the steps of a plan as a dependency graph, starting every step whose
+    dependencies have finished, with at most `max_parallel` steps in flight.
+
+    `run_step(task_index, task_details_dict, emit)` is a coroutine that executes one step,
+    passes each SSE frame it produces to `await emit(frame)` and returns True on success.
+    Frames from concurrently running steps are yielded by `run()` in the order they are emitted.
+    Once a step fails no new steps are started; the steps already running are allowed to finish.
+
+    With `expect_more_tasks=True` the plan may still be growing while it runs: tasks are appended
+    with `add_task()` (e.g. as the planner streams them) and `close()` marks the plan as complete.
+    Other producers can interleave their own frames into the stream with `emit()`.
+    """
+
+    def __init__(self, plan_tasks_list: list[dict] | None = None, max_parallel: int = 1,
+                 expect_more_tasks: bool = False):
+        self.plan_tasks_list = list(plan_tasks_list or [])
+        self.max_parallel = max(1, int(max_parallel))
+        self.dependencies = build_dependency_graph(self.plan_tasks_list)
+        self.results: dict[int, bool] = {}
+        self.failed_task_index: int | None = None
+        self.accepting_tasks = expect_more_tasks
+        self._queue = asyncio.Queue()
+
+    @property
+    def all_steps_succeeded(self) -> bool:
+        return len(self.results) == len(self.plan_tasks_list) and all(self.results.values())
+
+    def add_task(self, task_details_dict: dict) -> int:
+        if not self.accepting_tasks:
+            raise RuntimeError("PlanScheduler is closed; no more tasks can be added.")
+        self.plan_tasks_list.append(task_details_dict)
+        task_index = len(self.plan_tasks_list) - 1
+        self.dependencies[task_index] = get_task_dependencies(self.plan_tasks_list, task_index)
+        self._queue.put_nowait(_PLAN_CHANGED)
+        return task_index
+
+    def close(self):
+        self.accepting_tasks = False
+        self._queue.put_nowait(_PLAN_CHANGED)
+
+    async def emit(self, frame):
+        await self._queue.put(frame)
+
+    def _ready_steps(self, pending: set[int]) -> list[int]:
+        return [i for i in sorted(pending) if all(self.results.get(dep) for dep in self.dependencies[i])]
+
+    async def run(self, run_step):
+        queue = self._queue
+        pending = set(range(len(self.plan_tasks_list)))
+        running: dict[int, asyncio.Task] = {}
+
+        async def step_runner(task_index: int):
+            success = False
+            try:
+                success = bool(await run_step(task_index, self.plan_tasks_list[task_index], queue.put))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"PlanScheduler: Unhandled error in step {task_index}.")
+            finally:
+                queue.put_nowait((_STEP_FINISHED, task_index, success))
+
+        try:
+            while True:
+                if self.failed_task_index is None:
+                    for task_index in self._ready_steps(pending):
+                        if len(running) >= self.max_parallel:
+                            break
+                        pending.discard(task_index)
+                        logger.info(f"PlanScheduler: Starting step {task_index} "
+                                    f"(depends on {sorted(self.dependencies[task_index]) or 'nothing'}).")
+                        running[task_index] = asyncio.create_task(step_runner(task_index))
+                if not running and not self.accepting_tasks and queue.empty():
+                    break
+
+                item = await queue.get()
+                if item is _PLAN_CHANGED:
+                    pending.update(i for i in range(len(self.plan_tasks_list))
+                                   if i not in self.results and i not in running)
+                    continue
+                if isinstance(item, tuple) and item and item[0] is _STEP_FINISHED:
+                    _, task_index, success = item
+                    running.pop(task_index, None)
+                    self.results[task_index] = success
+                    if not success and self.failed_task_index is None:
+                        self.failed_task_index = task_index
+                    continue
+                yield item
+
+            if pending and self.failed_task_index is None:
+                logger.error(f"PlanScheduler: Steps {sorted(pending)} could never be scheduled.")
+        finally:
+            for task in running.values():
+                task.cancel()
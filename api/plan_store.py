@@ -0,0 +1,162 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+from api.config import AGENT_OUTPUT_DIR
+from api.utils import render_markdown_plan
+
+logger = logging.getLogger(__name__)
+
+PLAN_TASK_STATUSES = ("pending", "running", "completed", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    plan_id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    markdown_filename TEXT NOT NULL,
+    json_filename TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS plans_by_session ON plans (session_id, created_at);
+CREATE TABLE IF NOT EXISTS plan_tasks (
+    plan_id TEXT NOT NULL REFERENCES plans (plan_id) ON DELETE CASCADE,
+    task_id INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    agent_id TEXT,
+    call_name TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    started_at REAL,
+    finished_at REAL,
+    duration_seconds REAL,
+    PRIMARY KEY (plan_id, task_id)
+);
+"""
+
+
+class PlanStore:
+    """
+    Execution state of every plan, in SQLite. Tasks are keyed by (plan_id, task_id), where task_id is
+    the task's position in the plan, so status changes are single-row updates that can't hit the
+    wrong task however similar two descriptions are. `master_plan.md` is rendered from this state
+    whenever it changes, instead of being patched in place. Every method blocks on SQLite or the
+    workspace, so the orchestrator calls them with `asyncio.to_thread`.
+    """
+
+    def __init__(self, db_path=None, output_dir=None):
+        self.db_path = str(db_path or getattr(settings, 'PLAN_STORE_DB_PATH', settings.BASE_DIR / "plan_state.db"))
+        self.output_dir = str(output_dir or AGENT_OUTPUT_DIR)
+        self._local = threading.local()
+        # Renders run in worker threads; without this an older render could replace a newer one.
+        self._markdown_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread: the orchestrator calls this from the event loop, views from worker threads.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def create_plan(self, session_id: str, plan_tasks_list: list | None = None,
+                    markdown_filename: str = "master_plan.md", json_filename: str = "master_plan.json") -> str:
+        plan_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute("INSERT INTO plans (plan_id, session_id, markdown_filename, json_filename, created_at) "
+                         "VALUES (?, ?, ?, ?, ?)", (plan_id, session_id, markdown_filename, json_filename, time.time()))
+            for task_id, task_details_dict in enumerate(plan_tasks_list or []):
+                self._insert_task(conn, plan_id, task_id, task_details_dict)
+        return plan_id
+
+    @staticmethod
+    def _insert_task(conn: sqlite3.Connection, plan_id: str, task_id: int, task_details_dict: dict):
+        conn.execute("INSERT OR REPLACE INTO plan_tasks (plan_id, task_id, description, agent_id, call_name) "
+                     "VALUES (?, ?, ?, ?, ?)",
+                     (plan_id, task_id, task_details_dict.get("description", "Unnamed Task"),
+                      task_details_dict.get("agent_id"), task_details_dict.get("call_name")))
+
+    def add_task(self, plan_id: str, task_id: int, task_details_dict: dict):
+        with self._connect() as conn:
+            self._insert_task(conn, plan_id, task_id, task_details_dict)
+
+    def mark_started(self, plan_id: str, task_id: int) -> bool:
+        with self._connect() as conn:
+            cursor = conn.execute("UPDATE plan_tasks SET status = 'running', started_at = ? "
+                                  "WHERE plan_id = ? AND task_id = ? AND status = 'pending'",
+                                  (time.time(), plan_id, task_id))
+        return cursor.rowcount == 1
+
+    def mark_finished(self, plan_id: str, task_id: int, success: bool) -> bool:
+        """Moves a pending or running task to completed/failed, recording when it finished and how long it ran."""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute("UPDATE plan_tasks SET status = ?, finished_at = ?, "
+                                  "duration_seconds = CASE WHEN started_at IS NULL THEN NULL ELSE ? - started_at END "
+                                  "WHERE plan_id = ? AND task_id = ? AND status IN ('pending', 'running')",
+                                  ("completed" if success else "failed", now, now, plan_id, task_id))
+        if cursor.rowcount != 1:
+            logger.warning(f"PlanStore: Task {task_id} of plan {plan_id} was not pending or running; status unchanged.")
+            return False
+        return True
+
+    def get_plan(self, plan_id: str) -> dict | None:
+        conn = self._connect()
+        plan_row = conn.execute("SELECT * FROM plans WHERE plan_id = ?", (plan_id,)).fetchone()
+        if plan_row is None:
+            return None
+        tasks = [dict(row) for row in conn.execute(
+            "SELECT task_id, description, agent_id, call_name, status, started_at, finished_at, duration_seconds "
+            "FROM plan_tasks WHERE plan_id = ? ORDER BY task_id", (plan_id,))]
+        counts = {status: 0 for status in PLAN_TASK_STATUSES}
+        for task in tasks:
+            counts[task["status"]] = counts.get(task["status"], 0) + 1
+        return {**dict(plan_row), "task_count": len(tasks), "status_counts": counts, "tasks": tasks}
+
+    def latest_plan_id(self, session_id: str) -> str | None:
+        row = self._connect().execute("SELECT plan_id FROM plans WHERE session_id = ? ORDER BY created_at DESC LIMIT 1",
+                                      (session_id,)).fetchone()
+        return row["plan_id"] if row else None
+
+    def render_markdown(self, plan_id: str) -> str | None:
+        plan = self.get_plan(plan_id)
+        return render_markdown_plan(plan["tasks"]) if plan else None
+
+    def write_markdown(self, plan_id: str) -> bool:
+        """Re-renders the plan's markdown checklist into the workspace, replacing the file atomically."""
+        with self._markdown_lock:
+            plan = self.get_plan(plan_id)
+            if plan is None:
+                return False
+            path = os.path.join(self.output_dir, plan["markdown_filename"])
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    f.write(render_markdown_plan(plan["tasks"]))
+                os.replace(temp_path, path)
+                return True
+            except OSError as e:
+                logger.error(f"PlanStore: Could not write {path}: {e}")
+                return False
+
+
+_PLAN_STORE = None
+_PLAN_STORE_LOCK = threading.Lock()
+
+
+def get_plan_store() -> PlanStore:
+    global _PLAN_STORE
+    with _PLAN_STORE_LOCK:
+        if _PLAN_STORE is None:
+            _PLAN_STORE = PlanStore()
+        return _PLAN_STORE
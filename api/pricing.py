@@ -0,0 +1,31 @@
+"""
+Token prices used for cost estimates, shared by the orchestrator's per-run cost summary and the
+`costs.py` log analyzer. This module has no Django dependency so the analyzer can import it standalone.
+"""
+
+# USD per million tokens.
+MODEL_PRICING_PER_MILLION = {
+    "gpt-4o": {"input": 5.00, "output": 15.00},
+    "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+    "gpt-4-turbo-preview": {"input": 10.00, "output": 30.00},
+    "gpt-3.5-turbo-0125": {"input": 0.50, "output": 1.50},
+    "gpt-4.1-mini": {"input": 0.15, "output": 1.60},
+    "gemini-2.0-flash-001": {"input": 0.125, "output": 0.125},
+    "gemini-2.5-flash-preview-05-20": {"input": 0.40, "output": 0.60},
+}
+
+
+def get_model_pricing(model_id: str | None) -> dict | None:
+    """Returns {"input": ..., "output": ...} in USD per token for `model_id`, or None if it has no known price."""
+    prices = MODEL_PRICING_PER_MILLION.get(model_id or "")
+    if prices is None:
+        return None
+    return {"input": prices["input"] / 1_000_000, "output": prices["output"] / 1_000_000}
+
+
+def estimate_cost(model_id: str | None, input_tokens: int, output_tokens: int) -> float | None:
+    """Estimated USD cost of one model call, or None if the model has no known price."""
+    pricing = get_model_pricing(model_id)
+    if pricing is None:
+        return None
+    return input_tokens * pricing["input"] + output_tokens * pricing["output"]
@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from django.conf import settings
+
+from api.sse import format_sse
+
+logger = logging.getLogger(__name__)
+
+
+class RunEventBuffer:
+    """
+    Bounded ring buffer of numbered SSE frames for one run. Event ids start at 1 and keep increasing;
+    the oldest frames are dropped once either the event count or the total size limit is exceeded.
+    """
+
+    def __init__(self, max_events: int, max_bytes: int):
+        self.max_events = max(1, max_events)
+        self.max_bytes = max(1, max_bytes)
+        self._events: deque[tuple[int, bytes]] = deque()
+        self.size_bytes = 0
+        self.last_event_id = 0
+
+    def append(self, frame: bytes) -> int:
+        self.last_event_id += 1
+        numbered_frame = f"id: {self.last_event_id}\n".encode('utf-8') + frame
+        self._events.append((self.last_event_id, numbered_frame))
+        self.size_bytes += len(numbered_frame)
+        while len(self._events) > 1 and (len(self._events) > self.max_events or self.size_bytes > self.max_bytes):
+            _, dropped = self._events.popleft()
+            self.size_bytes -= len(dropped)
+        return self.last_event_id
+
+    @property
+    def first_event_id(self) -> int:
+        return self._events[0][0] if self._events else self.last_event_id + 1
+
+    def events_after(self, event_id: int) -> list[tuple[int, bytes]]:
+        if not self._events or event_id >= self.last_event_id:
+            return []
+        start = max(0, event_id + 1 - self.first_event_id)
+        return [self._events[i] for i in range(start, len(self._events))]
+
+
+class SessionRun:
+    """
+    One orchestration run for a session. The run is driven by its own asyncio.Task and records every
+    frame in a RunEventBuffer, so it does not depend on the HTTP response that started it:
+    any number of clients can `subscribe()` and resume from a `Last-Event-ID`.
+    When the last client goes away the run keeps going for `detached_grace_seconds`,
+    and is cancelled if nobody reconnects within that time.
+    """
+
+    def __init__(self, session_id: str, user_key: str = "anonymous", manager=None, max_events: int | None = None,
+                 max_bytes: int | None = None, detached_grace_seconds: float | None = None):
+        self.session_id = session_id
+        self.user_key = user_key
+        self.manager = manager
+        self.buffer = RunEventBuffer(
+            max_events if max_events is not None else getattr(settings, 'RUN_EVENT_BUFFER_MAX_EVENTS', 5000),
+            max_bytes if max_bytes is not None else getattr(settings, 'RUN_EVENT_BUFFER_MAX_BYTES', 2 * 1024 * 1024),
+        )
+        self.detached_grace_seconds = (detached_grace_seconds if detached_grace_seconds is not None
+                                       else getattr(settings, 'RUN_DETACHED_GRACE_SECONDS', 300))
+        self.created_at = time.monotonic()
+        self.admitted_at: float | None = None
+        self.finished_at: float | None = None
+        self.queue_position: int | None = None
+        self.task: asyncio.Task | None = None
+        self.subscriber_count = 0
+        self._new_event = asyncio.Event()
+        self._detach_timer: asyncio.TimerHandle | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def start(self, frames):
+        """Starts consuming the async iterator `frames` in a background task."""
+        self.task = asyncio.create_task(self._produce(frames))
+        return self.task
+
+    @property
+    def state(self) -> str:
+        if self.finished:
+            return "finished"
+        return "running" if self.admitted_at is not None else "queued"
+
+    def describe(self, now: float | None = None) -> dict:
+        now = now if now is not None else time.monotonic()
+        return {
+            "session_id": self.session_id,
+            "user": self.user_key,
+            "state": self.state,
+            "queue_position": self.queue_position,
+            "age_seconds": round(now - self.created_at, 1),
+            "running_seconds": round((self.finished_at or now) - self.admitted_at, 1) if self.admitted_at else None,
+            "subscribers": self.subscriber_count,
+            "buffered_events": self.buffer.last_event_id - self.buffer.first_event_id + 1,
+            "buffered_bytes": self.buffer.size_bytes,
+        }
+
+    def publish(self, frame: bytes):
+        self.buffer.append(frame)
+        self._new_event.set()
+        self._new_event = asyncio.Event()
+
+    async def _produce(self, frames):
+        try:
+            if self.manager is not None:
+                await self.manager.acquire(self)
+            async for frame in frames:
+                self.publish(frame)
+        except asyncio.CancelledError:
+            logger.info(f"Task for session {self.session_id} was cancelled by request.")
+            self.publish(format_sse({"type": "error", "message": "Task was cancelled by user."}))
+        except Exception as e:
+            logger.error(f"Error during SSE generation for session {self.session_id}: {e}", exc_info=True)
+            self.publish(format_sse({"type": "error", "message": f"An unexpected error occurred: {e}"}))
+        finally:
+            self.finished_at = time.monotonic()
+            if self.manager is not None:
+                self.manager.release(self)
+            self._cancel_detach_timer()
+            self._new_event.set()
+
+    def cancel(self) -> bool:
+        if self.task and not self.task.done():
+            self.task.cancel()
+            return True
+        return False
+
+    def _cancel_detach_timer(self):
+        if self._detach_timer is not None:
+            self._detach_timer.cancel()
+            self._detach_timer = None
+
+    def _cancel_if_still_detached(self):
+        self._detach_timer = None
+        if self.subscriber_count == 0 and not self.finished:
+            logger.info(f"No client reconnected to session {self.session_id} within "
+                        f"{self.detached_grace_seconds}s. Cancelling the detached run.")
+            self.cancel()
+
+    async def subscribe(self, last_event_id: int = 0):
+        """Yields the buffered frames after `last_event_id`, then live frames until the run finishes."""
+        self.subscriber_count += 1
+        self._cancel_detach_timer()
+        cursor = last_event_id
+        try:
+            if cursor and cursor + 1 < self.buffer.first_event_id:
+                logger.warning(f"Session {self.session_id}: client resumed from event {cursor}, but events up to "
+                               f"{self.buffer.first_event_id - 1} were already evicted from the replay buffer.")
+                yield format_sse({"type": "replay_gap", "missed_from": cursor + 1,
+                                  "missed_to": self.buffer.first_event_id - 1})
+            while True:
+                for event_id, frame in self.buffer.events_after(cursor):
+                    cursor = event_id
+                    yield frame
+                if self.finished and cursor >= self.buffer.last_event_id:
+                    break
+                await self._new_event.wait()
+        finally:
+            self.subscriber_count -= 1
+            if self.subscriber_count == 0 and not self.finished:
+                logger.info(f"All clients detached from session {self.session_id}. "
+                            f"Run continues for up to {self.detached_grace_seconds}s.")
+                loop = asyncio.get_running_loop()
+                self._detach_timer = loop.call_later(self.detached_grace_seconds, self._cancel_if_still_detached)
+
+
+class RunManager:
+    """
+    Registry of all runs in this process, with admission control.
+
+    At most `max_concurrent_runs` runs execute at once, and at most `max_runs_per_user` for one user.
+    Runs over either limit wait in a FIFO queue and are told their position with `queued` events;
+    a waiting run is admitted as soon as both its global and its per-user slot are free.
+    Finished runs stay resumable for `finished_ttl_seconds` and are evicted after that.
+    """
+
+    def __init__(self, max_concurrent_runs: int | None = None, max_runs_per_user: int | None = None,
+                 finished_ttl_seconds: float | None = None):
+        self.max_concurrent_runs = max(1, max_concurrent_runs if max_concurrent_runs is not None
+                                       else getattr(settings, 'MAX_CONCURRENT_RUNS', 4))
+        self.max_runs_per_user = max(1, max_runs_per_user if max_runs_per_user is not None
+                                     else getattr(settings, 'MAX_CONCURRENT_RUNS_PER_USER', 2))
+        self.finished_ttl_seconds = (finished_ttl_seconds if finished_ttl_seconds is not None
+                                     else getattr(settings, 'RUN_FINISHED_TTL_SECONDS', 300))
+        self.runs: dict[str, SessionRun] = {}
+        self.active: set[SessionRun] = set()
+        self.waiting: list[tuple[SessionRun, asyncio.Future]] = []
+
+    def _active_count_for_user(self, user_key: str) -> int:
+        return sum(1 for run in self.active if run.user_key == user_key)
+
+    def _can_admit(self, run: SessionRun) -> bool:
+        return (len(self.active) < self.max_concurrent_runs
+                and self._active_count_for_user(run.user_key) < self.max_runs_per_user)
+
+    def _admit_waiting(self):
+        admitted_any = False
+        for run, admission in list(self.waiting):
+            if len(self.active) >= self.max_concurrent_runs:
+                break
+            if admission.done():
+                continue
+            if self._can_admit(run):
+                self.waiting.remove((run, admission))
+                self.active.add(run)
+                run.admitted_at = time.monotonic()
+                admission.set_result(True)
+                admitted_any = True
+        if admitted_any:
+            self._announce_queue_positions()
+
+    def _announce_queue_positions(self):
+        for position, (run, _) in enumerate(self.waiting, start=1):
+            if run.queue_position != position:
+                run.queue_position = position
+                run.publish(format_sse({"type": "queued", "position": position,
+                                        "message": f"Waiting for a free slot. Position {position} in queue."}))
+
+    async def acquire(self, run: SessionRun):
+        """Waits until `run` may execute. Called by the run itself before it produces any frames."""
+        # Every waiting run was over a limit at the last admission pass, so a run that fits now jumps no one.
+        if self._can_admit(run):
+            self.active.add(run)
+            run.admitted_at = time.monotonic()
+            return
+        admission = asyncio.get_running_loop().create_future()
+        self.waiting.append((run, admission))
+        logger.info(f"Run for session {run.session_id} queued at position {len(self.waiting)} "
+                    f"({len(self.active)} active runs).")
+        self._announce_queue_positions()
+        try:
+            await admission
+        except asyncio.CancelledError:
+            if (run, admission) in self.waiting:
+                self.waiting.remove((run, admission))
+                self._announce_queue_positions()
+            raise
+        run.queue_position = None
+
+    def release(self, run: SessionRun):
+        self.active.discard(run)
+        self._admit_waiting()
+
+    def evict_expired(self):
+        """Forgets finished runs whose TTL has passed."""
+        now = time.monotonic()
+        for session_id, run in list(self.runs.items()):
+            if run.finished and now - run.finished_at > self.finished_ttl_seconds:
+                del self.runs[session_id]
+
+    def get(self, session_id: str) -> SessionRun | None:
+        self.evict_expired()
+        return self.runs.get(session_id)
+
+    def start_run(self, session_id: str, user_key: str, frames) -> SessionRun:
+        """Registers and starts a new run for `session_id`, cancelling the session's previous run if it is still going."""
+        self.evict_expired()
+        previous_run = self.runs.get(session_id)
+        if previous_run and previous_run.cancel():
+            logger.warning(f"A task for session {session_id} is already running. Cancelling it before starting a new one.")
+        run = SessionRun(session_id, user_key=user_key, manager=self)
+        self.runs[session_id] = run
+        run.start(frames)
+        return run
+
+    def cancel(self, session_id: str) -> bool:
+        run = self.runs.get(session_id)
+        return bool(run and run.cancel())
+
+    def snapshot(self) -> dict:
+        self.evict_expired()
+        now = time.monotonic()
+        runs = [run.describe(now) for run in self.runs.values()]
+        return {
+            "max_concurrent_runs": self.max_concurrent_runs,
+            "max_runs_per_user": self.max_runs_per_user,
+            "active": [r for r in runs if r["state"] == "running"],
+            "queued": sorted((r for r in runs if r["state"] == "queued"), key=lambda r: r["queue_position"]),
+            "finished": [r for r in runs if r["state"] == "finished"],
+        }
+
+
+RUN_MANAGER = RunManager()
@@ -0,0 +1,142 @@
+import contextvars
+import json
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from agno.tools import Toolkit
+from django.conf import settings
+
+from api.tool_cache import TOOL_RESULT_CACHE, canonicalize_url, normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+class GoogleSearchBackend:
+    """Searches Google through googlesearch-python, like agno's GoogleSearchTools."""
+
+    name = "google"
+
+    def search(self, query: str, max_results: int, language: str) -> list[dict]:
+        from googlesearch import search
+
+        return [{"title": result.title, "url": result.url, "description": result.description}
+                for result in search(query, num_results=max_results, lang=language, advanced=True)]
+
+
+class FakeSearchBackend:
+    """
+    Offline search backend for tests and benchmarks. Every call sleeps for `latency_seconds` and returns
+    deterministic results; queries sharing their first word also share an overview URL, so the
+    deduplication of merged results can be exercised.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_seconds: float | None = None):
+        self.latency_seconds = (latency_seconds if latency_seconds is not None
+                                else getattr(settings, 'FAKE_SEARCH_LATENCY_SECONDS', 0.5))
+        self.calls = 0
+
+    def search(self, query: str, max_results: int, language: str) -> list[dict]:
+        self.calls += 1
+        time.sleep(self.latency_seconds)
+        slug = re.sub(r"[^a-z0-9]+", "-", query.lower()).strip("-") or "query"
+        topic = slug.split("-")[0]
+        results = [{"title": f"{topic.title()} overview", "url": f"https://example.com/{topic}/overview",
+                    "description": f"Overview page for {topic}."}]
+        for i in range(1, max_results):
+            results.append({"title": f"Result {i} for {query}", "url": f"https://example.com/{slug}/{i}",
+                            "description": f"Fake result {i} for the query '{query}' ({language})."})
+        return results[:max_results]
+
+
+SEARCH_BACKENDS = {
+    "google": GoogleSearchBackend,
+    "fake": FakeSearchBackend,
+}
+
+
+def get_search_backend():
+    backend_name = getattr(settings, 'SEARCH_BACKEND', 'google')
+    backend_class = SEARCH_BACKENDS.get(backend_name)
+    if backend_class is None:
+        logger.warning(f"Unknown SEARCH_BACKEND '{backend_name}'. Using Google.")
+        backend_class = GoogleSearchBackend
+    return backend_class()
+
+
+# Bounds the number of searches in flight across all agents in the process.
+_SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, getattr(settings, 'SEARCH_BATCH_MAX_WORKERS', 8)),
+                                      thread_name_prefix="batch-search")
+
+
+def merge_search_results(results_by_query: dict[str, list[dict]]) -> list[dict]:
+    """
+    Merges the results of several queries, in query order, keeping the first occurrence of each page
+    (compared by canonical URL) and listing every query that found it under `queries`.
+    """
+    merged = {}
+    for query, results in results_by_query.items():
+        for result in results:
+            url_key = canonicalize_url(result.get("url", "")) if result.get("url") else json.dumps(result, sort_keys=True)
+            if url_key in merged:
+                merged[url_key]["queries"].append(query)
+            else:
+                merged[url_key] = {**result, "queries": [query]}
+    return list(merged.values())
+
+
+def _is_search_result(results) -> bool:
+    # A rate-limited or blocked search comes back empty; that's worth retrying rather than remembering.
+    return isinstance(results, list) and len(results) > 0
+
+
+class BatchSearchTools(Toolkit):
+    """
+    A search tool that takes a list of queries and runs them concurrently, so a research step waits
+    for roughly one search round trip instead of one per query. Each query goes through the shared
+    TOOL_RESULT_CACHE.
+    """
+
+    def __init__(self, backend=None, **kwargs):
+        self.backend = backend or get_search_backend()
+        super().__init__(name="batch_search_tools", tools=[self.batch_search], **kwargs)
+
+    def _search_one(self, query: str, max_results: int, language: str) -> list[dict]:
+        key = ("batch_search", self.backend.name, normalize_query(query), max_results, language)
+        return TOOL_RESULT_CACHE.get_or_fetch(key, lambda: self.backend.search(query, max_results, language),
+                                              is_cacheable=_is_search_result)
+
+    def batch_search(self, queries: List[str], max_results_per_query: int = 5, language: str = "en") -> str:
+        """
+        Use this function to run several web searches at once. Pass ALL the queries you need in one call
+        instead of searching one query at a time.
+
+        Args:
+            queries (List[str]): The search queries to run.
+            max_results_per_query (int, optional): The maximum number of results per query. Default is 5.
+            language (str, optional): The two-letter language code of the results. Default is "en".
+
+        Returns:
+            str: A JSON object with `results` (deduplicated across queries; `queries` lists which queries
+            found each page) and `errors` (queries that failed, with the reason).
+        """
+        unique_queries = list(dict.fromkeys(q.strip() for q in queries if isinstance(q, str) and q.strip()))
+        futures = {
+            # Each search gets a copy of this thread's context, so the run's cache counters still apply.
+            query: _SEARCH_EXECUTOR.submit(contextvars.copy_context().run, self._search_one, query,
+                                           max_results_per_query, language)
+            for query in unique_queries
+        }
+        results_by_query = {}
+        errors = {}
+        for query, future in futures.items():
+            try:
+                results_by_query[query] = future.result()
+            except Exception as e:
+                logger.warning(f"BatchSearchTools: Search for '{query}' failed: {e}")
+                errors[query] = str(e)
+        return json.dumps({"results": merge_search_results(results_by_query), "errors": errors}, indent=2)
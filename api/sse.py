@@ -0,0 +1,135 @@
+import asyncio
+import json
+import logging
+import time
+
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def _encode_json(data_dict: dict) -> bytes:
+    return json.dumps(data_dict).encode('utf-8')
+
+
+def _encode_orjson(data_dict: dict) -> bytes:
+    return orjson.dumps(data_dict)
+
+
+def _select_encoder():
+    encoder_name = getattr(settings, 'SSE_JSON_ENCODER', 'json')
+    if encoder_name == 'orjson':
+        if orjson is not None:
+            return _encode_orjson
+        logger.warning("SSE_JSON_ENCODER is 'orjson' but orjson is not installed. Falling back to json.")
+    return _encode_json
+
+
+_encode = _select_encoder()
+
+
+def format_sse(data_dict: dict) -> bytes:
+    return b"data: " + _encode(data_dict) + b"\n\n"
+
+
+class SSEStats:
+    """Counts the frames and bytes sent over SSE, plus how many LLM tokens were packed into each token frame."""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.frames = 0
+        self.bytes = 0
+        self.tokens = 0
+        self.token_frames = 0
+
+    def record_frame(self, size: int):
+        self.frames += 1
+        self.bytes += size
+
+    def record_token_frame(self, token_count: int):
+        self.tokens += token_count
+        self.token_frames += 1
+
+    def as_dict(self) -> dict:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "elapsed_seconds": round(elapsed, 3),
+            "frames_per_second": round(self.frames / elapsed, 2),
+            "bytes_per_second": round(self.bytes / elapsed, 2),
+            "tokens_per_token_frame": round(self.tokens / self.token_frames, 2) if self.token_frames else 0.0,
+        }
+
+
+# Process-wide totals across all runs.
+SSE_TOTALS = SSEStats()
+
+
+class SSEWriter:
+    """
+    Writes `step_agent_activity` frames for one plan step, coalescing consecutive LLMToken events
+    into a single frame. Buffered tokens are flushed when `flush_interval_ms` has passed since the
+    first buffered token or when `flush_bytes` characters are buffered, whichever comes first.
+    Every other event flushes the buffer and is written immediately, so ordering is preserved.
+    `flush_interval_ms=0` disables coalescing.
+    """
+
+    def __init__(self, emit, step_index: int, flush_interval_ms: float | None = None, flush_bytes: int | None = None):
+        self._emit = emit
+        self.step_index = step_index
+        if flush_interval_ms is None:
+            flush_interval_ms = getattr(settings, 'SSE_TOKEN_FLUSH_INTERVAL_MS', 50)
+        if flush_bytes is None:
+            flush_bytes = getattr(settings, 'SSE_TOKEN_FLUSH_BYTES', 4096)
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_bytes = flush_bytes
+        self._pending_tokens: list[str] = []
+        self._pending_size = 0
+        self._flush_timer: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    async def send(self, payload: dict):
+        """Flushes any buffered tokens, then writes `payload` as its own frame."""
+        async with self._lock:
+            await self._flush_pending()
+            await self._emit(format_sse(payload))
+
+    async def send_activity(self, activity: dict):
+        await self.send({"type": "step_agent_activity", "step_index": self.step_index, **activity})
+
+    async def token(self, text: str):
+        self._pending_tokens.append(text)
+        self._pending_size += len(text)
+        if self.flush_interval <= 0 or self._pending_size >= self.flush_bytes:
+            await self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._flush_timer = None
+        await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            await self._flush_pending()
+
+    async def _flush_pending(self):
+        if self._flush_timer is not None and self._flush_timer is not asyncio.current_task():
+            self._flush_timer.cancel()
+        self._flush_timer = None
+        if not self._pending_tokens:
+            return
+        tokens, self._pending_tokens, self._pending_size = self._pending_tokens, [], 0
+        SSE_TOTALS.record_token_frame(len(tokens))
+        await self._emit(format_sse({"type": "step_agent_activity", "step_index": self.step_index,
+                                     "event": "LLMToken", "data": "".join(tokens)}))
+
+    async def close(self):
+        await self.flush()
@@ -1,3 +1,451 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from agno.models.message import Message
+from django.test import RequestFactory, SimpleTestCase
+
+from api.composition import gather_or_cancel
+from api.json_stream import IncrementalJSONScanner
+from api.llm_registry import ModelCatalog, ModelInfo
+from api.llm_cache import LLMCacheMiss, LLMResponseCache, enable_response_cache
+from api.runs import RunManager, SessionRun
+from api.plan_store import PlanStore
+from api.plan_scheduler import PlanScheduler, build_dependency_graph
+from api.search_tools import BatchSearchTools, FakeSearchBackend
+from api.tool_cache import CachedGoogleSearchTools, ToolResultCache
+from api.views import get_client_key
+from benchmarks.scripted_provider import ScriptedModel
+from core import settings
+
+
+class LLMResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+
+    def make_model(self, mode: str, cache: LLMResponseCache):
+        return enable_response_cache(ScriptedModel(first_token_latency_seconds=0, tokens_per_second=0, step_tokens=50),
+                                     mode=mode, cache=cache)
+
+    def test_non_stream_response_is_recorded_and_replayed(self):
+        recorded = self.make_model("record", LLMResponseCache(self.cache_dir.name))
+        recorded_response = recorded.response(messages=[Message(role="user", content="Summarize the notes.")])
+
+        replay_cache = LLMResponseCache(self.cache_dir.name)
+        replayed = self.make_model("replay", replay_cache)
+        replayed_response = replayed.response(messages=[Message(role="user", content="Summarize the notes.")])
+
+        self.assertTrue(recorded_response.content)
+        self.assertEqual(replayed_response.content, recorded_response.content)
+        self.assertEqual(replay_cache.hits, 1)
+        with self.assertRaises(LLMCacheMiss):
+            replayed.response(messages=[Message(role="user", content="Something never recorded.")])
+
+    def test_async_non_stream_response_is_recorded_and_replayed(self):
+        recorded = self.make_model("record", LLMResponseCache(self.cache_dir.name))
+        recorded_response = asyncio.run(recorded.aresponse(messages=[Message(role="user", content="Outline it.")]))
+
+        replayed = self.make_model("replay", LLMResponseCache(self.cache_dir.name))
+        replayed_response = asyncio.run(replayed.aresponse(messages=[Message(role="user", content="Outline it.")]))
+
+        self.assertEqual(replayed_response.content, recorded_response.content)
+
+    def test_stream_and_non_stream_recordings_do_not_mix(self):
+        recorded = self.make_model("record", LLMResponseCache(self.cache_dir.name))
+        recorded.response(messages=[Message(role="user", content="Summarize the notes.")])
+
+        replayed = self.make_model("replay", LLMResponseCache(self.cache_dir.name))
+        with self.assertRaises(LLMCacheMiss):
+            list(replayed.response_stream(messages=[Message(role="user", content="Summarize the notes.")]))
+
+
+class FailingFakeSearchBackend(FakeSearchBackend):
+    """FakeSearchBackend whose searches for queries mentioning 'broken' raise after the usual latency."""
+
+    def search(self, query: str, max_results: int, language: str) -> list[dict]:
+        results = super().search(query, max_results, language)
+        if "broken" in query:
+            raise ConnectionError("search backend unavailable")
+        return results
+
+
+class BatchSearchToolsTests(SimpleTestCase):
+    latency_seconds = 0.3
+
+    def setUp(self):
+        # A cache of its own, so results cached by other tests (or earlier queries) don't hide the latency.
+        patcher = mock.patch("api.search_tools.TOOL_RESULT_CACHE", ToolResultCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.backend = FailingFakeSearchBackend(latency_seconds=self.latency_seconds)
+        self.tools = BatchSearchTools(backend=self.backend)
+
+    def test_queries_run_concurrently_and_results_are_merged(self):
+        queries = ["solar panel cost", "solar panel efficiency", "wind turbine cost", "battery storage prices"]
+        started = time.perf_counter()
+        output = json.loads(self.tools.batch_search(queries, max_results_per_query=3))
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(self.backend.calls, len(queries))
+        self.assertLess(elapsed, 2 * self.latency_seconds)
+        self.assertEqual(output["errors"], {})
+        urls = [result["url"] for result in output["results"]]
+        self.assertEqual(len(urls), len(set(urls)))
+        # Both "solar ..." queries find the same overview page; it is listed once, with both queries.
+        solar_overview = next(result for result in output["results"]
+                              if result["url"] == "https://example.com/solar/overview")
+        self.assertEqual(solar_overview["queries"], queries[:2])
+        self.assertEqual(len(urls), 4 * 3 - 1)
+
+    def test_a_failing_query_does_not_lose_the_others(self):
+        queries = ["solar panel cost", "broken query", "wind turbine cost", "solar panel cost "]
+        started = time.perf_counter()
+        output = json.loads(self.tools.batch_search(queries, max_results_per_query=2))
+        elapsed = time.perf_counter() - started
+
+        self.assertLess(elapsed, 2 * self.latency_seconds)
+        self.assertEqual(list(output["errors"]), ["broken query"])
+        self.assertIn("search backend unavailable", output["errors"]["broken query"])
+        self.assertEqual({query for result in output["results"] for query in result["queries"]},
+                         {"solar panel cost", "wind turbine cost"})
+        self.assertEqual(len(output["results"]), 4)
+
+
+    def test_empty_results_are_not_cached(self):
+        with mock.patch.object(self.backend, "search", side_effect=[
+                [], [{"title": "Solar", "url": "https://example.com/solar", "description": ""}]]) as search:
+            first = json.loads(self.tools.batch_search(["solar panel cost"]))
+            second = json.loads(self.tools.batch_search(["solar panel cost"]))
+            third = json.loads(self.tools.batch_search(["solar panel cost"]))
+        self.assertEqual(first["results"], [])
+        self.assertEqual([result["url"] for result in second["results"]], ["https://example.com/solar"])
+        self.assertEqual(third, second)
+        self.assertEqual(search.call_count, 2)
+
+
+class CachedGoogleSearchToolsTests(SimpleTestCase):
+    def test_empty_results_are_not_cached(self):
+        answers = iter(["[]", '[{"title": "Solar", "url": "https://example.com/solar", "description": ""}]'])
+        tools = CachedGoogleSearchTools()
+        with mock.patch("api.tool_cache.TOOL_RESULT_CACHE", ToolResultCache()), \
+                mock.patch("agno.tools.googlesearch.GoogleSearchTools.google_search",
+                           side_effect=lambda *args, **kwargs: next(answers)) as google_search:
+            self.assertEqual(tools.google_search("solar"), "[]")
+            second = tools.google_search("solar")
+            self.assertEqual(tools.google_search("solar"), second)
+        self.assertIn("example.com/solar", second)
+        self.assertEqual(google_search.call_count, 2)
+
+
+class PlanDependencyTests(SimpleTestCase):
+    def test_read_after_write(self):
+        graph = build_dependency_graph([{"outputs": ["notes.md"]}, {"inputs": ["notes.md"], "outputs": ["report.md"]}])
+        self.assertEqual(graph[1], {0})
+
+    def test_write_after_read(self):
+        graph = build_dependency_graph([{"inputs": ["notes.md"], "outputs": ["summary.md"]}, {"outputs": ["notes.md"]}])
+        self.assertEqual(graph[1], {0})
+
+    def test_write_after_write(self):
+        graph = build_dependency_graph([{"outputs": ["charts/"]}, {"outputs": ["charts/sales.png"]}])
+        self.assertEqual(graph[1], {0})
+
+    def test_independent_tasks(self):
+        graph = build_dependency_graph([{"input": "NONE", "outputs": ["a.md"]}, {"inputs": ["b.md"], "outputs": "c.md"}])
+        self.assertEqual(graph, {0: set(), 1: set()})
+
+    def test_implicit_research_agent_outputs(self):
+        graph = build_dependency_graph([
+            {"agent_id": "ResearchAgent", "outputs": ["solar.md"]},
+            {"agent_id": "research-agent", "outputs": ["wind.md"]},
+            {"agent_id": "ComposerAgent", "inputs": ["facts_list.md"], "outputs": ["report.md"]},
+        ])
+        self.assertEqual(graph[1], {0})
+        self.assertEqual(graph[2], {0, 1})
+
+
+class PlanSchedulerTests(SimpleTestCase):
+    def run_plan(self, scheduler, step_results=None, producer=None):
+        """Runs the scheduler with steps that yield to the loop and record how many ran at once."""
+        step_results = step_results or {}
+        self.started, self.in_flight, self.max_in_flight = [], 0, 0
+
+        async def run_step(task_index, task, emit):
+            self.started.append(task_index)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0.01)
+            await emit(f"step {task_index}")
+            self.in_flight -= 1
+            return step_results.get(task_index, True)
+
+        async def run():
+            producer_task = asyncio.create_task(producer(scheduler)) if producer else None
+            frames = [frame async for frame in scheduler.run(run_step)]
+            if producer_task:
+                await producer_task
+            return frames
+
+        return asyncio.run(run())
+
+    def independent_tasks(self, count):
+        return [{"outputs": [f"out_{i}.md"]} for i in range(count)]
+
+    def test_max_parallel_limits_steps_in_flight(self):
+        scheduler = PlanScheduler(self.independent_tasks(5), max_parallel=2)
+        frames = self.run_plan(scheduler)
+        self.assertEqual(self.max_in_flight, 2)
+        self.assertEqual(sorted(frames), [f"step {i}" for i in range(5)])
+        self.assertTrue(scheduler.all_steps_succeeded)
+
+    def test_dependent_steps_wait(self):
+        scheduler = PlanScheduler([{"outputs": ["a.md"]}, {"inputs": ["a.md"]}, {"outputs": ["b.md"]}], max_parallel=3)
+        frames = self.run_plan(scheduler)
+        self.assertLess(frames.index("step 0"), frames.index("step 1"))
+        self.assertEqual(self.max_in_flight, 2)
+
+    def test_no_steps_start_after_a_failure(self):
+        scheduler = PlanScheduler(self.independent_tasks(4), max_parallel=1)
+        self.run_plan(scheduler, step_results={1: False})
+        self.assertEqual(self.started, [0, 1])
+        self.assertEqual(scheduler.failed_task_index, 1)
+        self.assertFalse(scheduler.all_steps_succeeded)
+
+    def test_tasks_added_while_running(self):
+        async def plan_streamer(scheduler):
+            for task in [{"outputs": ["a.md"]}, {"inputs": ["a.md"], "outputs": ["b.md"]}, {"outputs": ["c.md"]}]:
+                await asyncio.sleep(0.005)
+                scheduler.add_task(task)
+            await scheduler.emit("plan complete")
+            scheduler.close()
+
+        scheduler = PlanScheduler(max_parallel=2, expect_more_tasks=True)
+        frames = self.run_plan(scheduler, producer=plan_streamer)
+        self.assertEqual(sorted(self.started), [0, 1, 2])
+        self.assertIn("plan complete", frames)
+        self.assertEqual(scheduler.dependencies[1], {0})
+        self.assertTrue(scheduler.all_steps_succeeded)
+        with self.assertRaises(RuntimeError):
+            scheduler.add_task({"outputs": ["d.md"]})
+
+
+class RunManagerTests(SimpleTestCase):
+    async def frames(self, count, release=None):
+        if release is not None:
+            await release.wait()
+        for i in range(1, count + 1):
+            yield f"data: {i}\n\n".encode()
+
+    async def collect(self, run, last_event_id=0):
+        return [frame async for frame in run.subscribe(last_event_id)]
+
+    def test_resume_after_last_event_id(self):
+        async def scenario():
+            run = RunManager().start_run("session", "user", self.frames(5))
+            await run.task
+            return await self.collect(run, last_event_id=2)
+
+        self.assertEqual(asyncio.run(scenario()), [f"id: {i}\ndata: {i}\n\n".encode() for i in (3, 4, 5)])
+
+    def test_resume_reports_evicted_events(self):
+        async def scenario():
+            run = SessionRun("session", max_events=2)
+            run.start(self.frames(5))
+            await run.task
+            return await self.collect(run, last_event_id=1)
+
+        gap, *frames = asyncio.run(scenario())
+        self.assertEqual(json.loads(gap[gap.index(b"data: ") + 6:]), {"type": "replay_gap", "missed_from": 2, "missed_to": 3})
+        self.assertEqual(frames, [f"id: {i}\ndata: {i}\n\n".encode() for i in (4, 5)])
+
+    def test_per_user_limit_queues_runs(self):
+        async def scenario():
+            manager = RunManager(max_concurrent_runs=3, max_runs_per_user=1)
+            release = asyncio.Event()
+            first = manager.start_run("a1", "alice", self.frames(1, release))
+            second = manager.start_run("a2", "alice", self.frames(1))
+            other_user = manager.start_run("b1", "bob", self.frames(1, release))
+            await asyncio.sleep(0.01)
+            states = [run.state for run in (first, second, other_user)]
+            queued_frames = list(second.buffer.events_after(0))
+            release.set()
+            await asyncio.gather(first.task, second.task, other_user.task)
+            return states, queued_frames, second
+
+        states, queued_frames, second = asyncio.run(scenario())
+        self.assertEqual(states, ["running", "queued", "running"])
+        self.assertIn(b'"position": 1', queued_frames[0][1])
+        self.assertEqual(second.state, "finished")
+        self.assertIsNotNone(second.admitted_at)
+
+    def test_global_limit_admits_in_order(self):
+        async def scenario():
+            manager = RunManager(max_concurrent_runs=1, max_runs_per_user=5)
+            release = asyncio.Event()
+            runs = [manager.start_run(f"s{i}", f"user{i}", self.frames(1, release)) for i in range(3)]
+            await asyncio.sleep(0.01)
+            positions = [run.queue_position for run in runs]
+            release.set()
+            await asyncio.gather(*(run.task for run in runs))
+            return positions, runs
+
+        positions, runs = asyncio.run(scenario())
+        self.assertEqual(positions, [None, 1, 2])
+        self.assertEqual(sorted(runs, key=lambda run: run.admitted_at), runs)
+
+    def test_finished_runs_expire(self):
+        async def scenario():
+            manager = RunManager(finished_ttl_seconds=10)
+            run = manager.start_run("session", "user", self.frames(1))
+            await run.task
+            return manager, run
+
+        manager, run = asyncio.run(scenario())
+        with mock.patch("api.runs.time.monotonic", return_value=run.finished_at + 5):
+            self.assertIs(manager.get("session"), run)
+        with mock.patch("api.runs.time.monotonic", return_value=run.finished_at + 11):
+            self.assertIsNone(manager.get("session"))
+            self.assertEqual(manager.snapshot()["finished"], [])
+
+
+class PlanStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.workspace = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workspace.cleanup)
+        self.db_path = os.path.join(self.workspace.name, "plan_state.db")
+
+    def test_state_round_trips_through_sqlite(self):
+        tasks = [{"description": "Research the market", "agent_id": "ResearchAgent", "call_name": "research"},
+                 {"description": "Research the market", "agent_id": "ResearchAgent"},
+                 {"description": "Write the report", "agent_id": "ComposerAgent"}]
+        store = PlanStore(self.db_path, self.workspace.name)
+        plan_id = store.create_plan("session", tasks)
+        store.mark_started(plan_id, 0)
+        store.mark_finished(plan_id, 0, success=True)
+        store.mark_finished(plan_id, 1, success=False)
+        self.assertFalse(store.mark_finished(plan_id, 1, success=True))
+
+        reopened = PlanStore(self.db_path, self.workspace.name)
+        plan = reopened.get_plan(plan_id)
+        self.assertEqual(reopened.latest_plan_id("session"), plan_id)
+        self.assertEqual([task["status"] for task in plan["tasks"]], ["completed", "failed", "pending"])
+        self.assertEqual(plan["tasks"][0]["call_name"], "research")
+        self.assertIsNotNone(plan["tasks"][0]["duration_seconds"])
+        self.assertIsNone(plan["tasks"][1]["duration_seconds"])
+        self.assertEqual(plan["status_counts"], {"pending": 1, "running": 0, "completed": 1, "failed": 1})
+
+    def test_markdown_keeps_the_checkbox_format(self):
+        store = PlanStore(self.db_path, self.workspace.name)
+        plan_id = store.create_plan("session", [{"description": "Gather sources"}, {"description": "Chart it"},
+                                                {"description": "Write it up"}, {"description": "Review"}])
+        store.mark_finished(plan_id, 0, success=True)
+        store.mark_finished(plan_id, 1, success=False)
+        store.mark_started(plan_id, 2)
+        self.assertTrue(store.write_markdown(plan_id))
+
+        with open(os.path.join(self.workspace.name, "master_plan.md"), encoding="utf-8") as f:
+            markdown = f.read()
+        self.assertEqual(markdown, "# Master Plan\n\n- [x] Gather sources\n- [!] Chart it\n"
+                                   "- [ ] Write it up\n- [ ] Review\n")
+        self.assertEqual(markdown, store.render_markdown(plan_id))
+        # The pattern the old in-place checkbox updater matched.
+        self.assertTrue(all(re.match(r"- \[[ x!]\] ", line) for line in markdown.splitlines()[2:]))
+
+
+class GatherOrCancelTests(SimpleTestCase):
+    def test_failure_cancels_the_other_coroutines(self):
+        cancelled = []
+
+        async def slow(name):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(name)
+                raise
+
+        async def failing():
+            await asyncio.sleep(0)
+            raise RuntimeError("section failed")
+
+        async def run():
+            return await asyncio.wait_for(gather_or_cancel([slow("a"), failing(), slow("b")]), timeout=5)
+
+        with self.assertRaisesMessage(RuntimeError, "section failed"):
+            asyncio.run(run())
+        self.assertEqual(sorted(cancelled), ["a", "b"])
+
+    def test_results_keep_their_order(self):
+        async def value(delay, result):
+            await asyncio.sleep(delay)
+            return result
+
+        self.assertEqual(asyncio.run(gather_or_cancel([value(0.02, 1), value(0, 2)])), [1, 2])
+
+
+class ModelCatalogTests(SimpleTestCase):
+    def setUp(self):
+        self.ollama_models = [ModelInfo("Ollama", "llama3:8b", "llama3:8b")]
+        for target, kwargs in (("api.llm_registry.load_static_cloud_models", {"return_value": {"Google": [
+                                   {"provider": "Google", "id": "gemini-1.5-pro-latest", "name": "Gemini"}]}}),
+                               ("api.llm_registry.discover_ollama_models", {"side_effect": lambda: self.ollama_models})):
+            patcher = mock.patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_first_lookup_includes_the_live_models(self):
+        catalog = ModelCatalog(ttl_seconds=60)
+        self.assertEqual(catalog.get_provider("llama3:8b"), "Ollama")
+        self.assertIn("Ollama", catalog.grouped())
+
+    def test_a_miss_refreshes_once_before_giving_up(self):
+        catalog = ModelCatalog(ttl_seconds=60)
+        catalog.grouped()
+        self.ollama_models.append(ModelInfo("Ollama", "qwen2:7b", "qwen2:7b"))
+        catalog.miss_refresh_interval_seconds = -1
+        self.assertEqual(catalog.get_provider("qwen2:7b"), "Ollama")
+
+        # Within the miss interval, unknown ids don't trigger another refresh.
+        catalog.miss_refresh_interval_seconds = 60
+        self.ollama_models.append(ModelInfo("Ollama", "phi3:mini", "phi3:mini"))
+        self.assertIsNone(catalog.get_provider("phi3:mini"))
+
+
+class ClientKeyTests(SimpleTestCase):
+    def make_request(self):
+        return RequestFactory().post("/api/prompt/", REMOTE_ADDR="10.0.0.2", HTTP_X_REAL_IP="203.0.113.7",
+                                     HTTP_X_FORWARDED_FOR="198.51.100.1, 203.0.113.7")
+
+    def test_forwarding_headers_are_ignored_by_default(self):
+        with mock.patch.object(settings, "CLIENT_IP_SOURCE", "remote_addr"):
+            self.assertEqual(get_client_key(self.make_request()), "10.0.0.2")
+
+    def test_trusted_proxy_headers(self):
+        with mock.patch.object(settings, "CLIENT_IP_SOURCE", "x-real-ip"):
+            self.assertEqual(get_client_key(self.make_request()), "203.0.113.7")
+        with mock.patch.object(settings, "CLIENT_IP_SOURCE", "x-forwarded-for"):
+            self.assertEqual(get_client_key(self.make_request()), "203.0.113.7")
+
+
+class IncrementalJSONScannerTests(SimpleTestCase):
+    def feed_in_chunks(self, text: str, chunk_size: int = 5):
+        scanner = IncrementalJSONScanner()
+        tasks = []
+        for start in range(0, len(text), chunk_size):
+            tasks.extend(scanner.feed(text[start:start + chunk_size]))
+        return scanner, tasks
+
+    def test_only_objects_of_the_tasks_array_are_tasks(self):
+        text = ('Sources [see {"id": "fake"}] below:\n{"acknowledgment_message": "On it.", "notes": [{"id": "note"}], '
+                '"tasks": [{"id": "1", "inputs": [{"id": "nested"}]}, {"id": "2"}]}')
+        _, tasks = self.feed_in_chunks(text)
+        self.assertEqual([task["id"] for task in tasks], ["1", "2"])
+
+    def test_acknowledgment_is_available_before_the_tasks(self):
+        scanner = IncrementalJSONScanner()
+        scanner.feed('{"acknowledgment_message": "On \\"it\\".", "tasks": [{"id": "1"')
+        self.assertEqual(scanner.top_level_strings["acknowledgment_message"], 'On "it".')
@@ -0,0 +1,183 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextvars import ContextVar
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from agno.tools.googlesearch import GoogleSearchTools
+from agno.tools.spider import SpiderTools
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_TRACKING_PARAM_PREFIXES = ("utm_",)
+_TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "ref", "ref_src"}
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_query(query: str) -> str:
+    """Case and whitespace differences don't change what a search engine returns."""
+    return re.sub(r"\s+", " ", str(query)).strip().lower()
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Maps URL variants that point to the same page to one form: lowercase scheme and host, no default
+    port, no fragment, no tracking parameters, sorted query, and no trailing slash on the path.
+    """
+    url = str(url).strip()
+    parts = urlsplit(url if "://" in url else f"https://{url}")
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if k.lower() not in _TRACKING_PARAMS and not k.lower().startswith(_TRACKING_PARAM_PREFIXES)))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+class ToolCacheStats:
+    """Cache counters for one orchestration run."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.in_flight_joins = 0
+
+    def as_dict(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "in_flight_joins": self.in_flight_joins}
+
+
+_RUN_TOOL_CACHE_STATS: ContextVar[ToolCacheStats | None] = ContextVar("run_tool_cache_stats", default=None)
+
+
+def track_tool_cache_stats() -> ToolCacheStats:
+    """
+    Starts counting tool cache hits and misses for the current run. The counters are carried in a
+    context variable, so they follow the run into the tasks and tool threads it starts.
+    """
+    stats = ToolCacheStats()
+    _RUN_TOOL_CACHE_STATS.set(stats)
+    return stats
+
+
+class ToolResultCache:
+    """
+    Process-wide cache of search and scrape results, shared by all agents, steps and sessions.
+
+    Entries expire after `ttl_seconds`; at most `max_entries` are kept, least recently used first out.
+    While a result is being fetched, other callers asking for the same key wait for that fetch instead
+    of starting their own. A result is only cached if the fetch didn't raise and `is_cacheable(result)`
+    (if given) is true, so tools that report errors as strings don't get their errors cached.
+    Tools run in worker threads (agno calls sync tools with `asyncio.to_thread`), so this is thread-safe.
+    """
+
+    def __init__(self, ttl_seconds: float | None = None, max_entries: int | None = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else getattr(settings, 'TOOL_CACHE_TTL_SECONDS', 3600)
+        self.max_entries = max(1, max_entries if max_entries is not None else getattr(settings, 'TOOL_CACHE_MAX_ENTRIES', 1000))
+        self._entries: OrderedDict[tuple, tuple[float, object]] = OrderedDict()
+        self._in_flight: dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+        self.totals = ToolCacheStats()
+
+    def _count(self, counter: str):
+        setattr(self.totals, counter, getattr(self.totals, counter) + 1)
+        run_stats = _RUN_TOOL_CACHE_STATS.get()
+        if run_stats is not None:
+            setattr(run_stats, counter, getattr(run_stats, counter) + 1)
+
+    def get_or_fetch(self, key: tuple, fetch, is_cacheable=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._count("hits")
+                    return value
+                del self._entries[key]
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                in_flight = self._in_flight[key] = Future()
+                is_owner = True
+                self._count("misses")
+            else:
+                is_owner = False
+                self._count("in_flight_joins")
+
+        if not is_owner:
+            logger.info(f"ToolResultCache: Waiting for the in-flight {key[0]} call for the same input.")
+            return in_flight.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            in_flight.set_exception(e)
+            raise
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if is_cacheable is None or is_cacheable(value):
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        in_flight.set_result(value)
+        return value
+
+
+TOOL_RESULT_CACHE = ToolResultCache()
+
+
+# The overrides below have no docstrings on purpose: agno builds the tool descriptions the model sees
+# from the docstrings, and `inspect.getdoc` falls back to the ones of the wrapped toolkit.
+
+def _is_google_search_result(result: str) -> bool:
+    # Google answers a rate-limited or blocked search with a page that parses to no results, which is
+    # worth retrying rather than remembering; anything that isn't a JSON list is an error message.
+    try:
+        results = json.loads(result)
+    except (TypeError, ValueError):
+        return False
+    return isinstance(results, list) and len(results) > 0
+
+
+class CachedGoogleSearchTools(GoogleSearchTools):
+    """GoogleSearchTools whose results go through the shared TOOL_RESULT_CACHE."""
+
+    def google_search(self, query: str, max_results: int = 5, language: str = "en") -> str:
+        key = ("google_search", normalize_query(query), self.fixed_max_results or max_results,
+               self.fixed_language or language)
+        return TOOL_RESULT_CACHE.get_or_fetch(key, lambda: super(CachedGoogleSearchTools, self).google_search(
+            query, max_results=max_results, language=language), is_cacheable=_is_google_search_result)
+
+
+def _is_spider_result(result: str) -> bool:
+    # SpiderTools catches its own errors and returns them as text.
+    return not result.startswith("Error fetching")
+
+
+class CachedSpiderTools(SpiderTools):
+    """SpiderTools whose search, scrape and crawl results go through the shared TOOL_RESULT_CACHE."""
+
+    def search(self, query: str, max_results: int = 5) -> str:
+        key = ("spider_search", normalize_query(query), self.max_results or max_results)
+        return TOOL_RESULT_CACHE.get_or_fetch(key, lambda: super(CachedSpiderTools, self).search(
+            query, max_results=max_results), is_cacheable=_is_spider_result)
+
+    def scrape(self, url: str) -> str:
+        key = ("spider_scrape", canonicalize_url(url))
+        return TOOL_RESULT_CACHE.get_or_fetch(key, lambda: super(CachedSpiderTools, self).scrape(url),
+                                              is_cacheable=_is_spider_result)
+
+    def crawl(self, url: str, limit: Optional[int] = None) -> str:
+        key = ("spider_crawl", canonicalize_url(url), limit or 10)
+        return TOOL_RESULT_CACHE.get_or_fetch(key, lambda: super(CachedSpiderTools, self).crawl(url, limit=limit),
+                                              is_cacheable=_is_spider_result)
@@ -0,0 +1,350 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from api.metrics import observe_model_call, observe_tool_call
+from api.pricing import estimate_cost
+
+logger = logging.getLogger(__name__)
+
+SPAN_KINDS = ("run", "step", "agent", "model", "tool")
+
+# Tools a team leader uses to hand work to a member; the member's run is nested under that call.
+_DELEGATION_TOOLS = {"transfer_task_to_member", "forward_task_to_member", "run_member_agents"}
+
+# Spans are timed with perf_counter (agno's model timers use it too) and exported as wall-clock times.
+_WALL_CLOCK_OFFSET = time.time() - time.perf_counter()
+
+
+def _wall_clock(perf_time: float | None) -> float | None:
+    return None if perf_time is None else perf_time + _WALL_CLOCK_OFFSET
+
+
+class Span:
+    """One timed piece of a run. `start`/`end` are perf_counter values; `end` is None while it runs."""
+
+    def __init__(self, trace, name: str, kind: str, parent_id: str | None = None, start: float | None = None,
+                 attributes: dict | None = None):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = start if start is not None else time.perf_counter()
+        self.end = None
+        self.status = "running"
+        self.attributes = attributes or {}
+
+    def finish(self, end: float | None = None, status: str = "ok", **attributes):
+        if self.end is not None:
+            return
+        self.end = end if end is not None else time.perf_counter()
+        self.status = status
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float | None:
+        return None if self.end is None else round((self.end - self.start) * 1000, 3)
+
+    def as_dict(self) -> dict:
+        return {"trace_id": self.trace.trace_id if self.trace else None,
+                "session_id": self.trace.session_id if self.trace else None,
+                "span_id": self.span_id, "parent_id": self.parent_id, "name": self.name, "kind": self.kind,
+                "status": self.status, "start_time": _wall_clock(self.start), "end_time": _wall_clock(self.end),
+                "duration_ms": self.duration_ms, "attributes": self.attributes}
+
+
+class RunTrace:
+    """
+    The spans of one orchestration run: run → planner/steps → agents → model and tool calls.
+
+    Run, planner and step spans are timed live by the orchestrator. Agent, model and tool spans are
+    reconstructed from an agent's run response once it finished: every assistant message is one model
+    call, timed by agno's own timer and carrying its token counts and time to first token; every tool
+    result message is one tool call, placed right after the model call that requested it (agno only keeps
+    its duration). Member runs of a team are nested under the leader's delegation call.
+    The same pass feeds the model and tool call metrics.
+    """
+
+    def __init__(self, session_id: str, **attributes):
+        self.trace_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.spans: list[Span] = []
+        self.root = self.start_span("run", "run", parent=None, **attributes)
+
+    def start_span(self, name: str, kind: str, parent: Span | None = None, start: float | None = None,
+                   **attributes) -> Span:
+        span = Span(self, name, kind, parent.span_id if parent else None, start, attributes)
+        self.spans.append(span)
+        return span
+
+    def record_agent_run(self, agent, parent: Span | None = None) -> Span | None:
+        """Adds the model and tool calls of `agent`'s last run (an agno Agent or Team) under `parent`."""
+        run_response = getattr(agent, "run_response", None)
+        if run_response is None:
+            return None
+        members_by_id = {getattr(member, "agent_id", None): member for member in getattr(agent, "members", None) or []}
+        return self._record_run_response(run_response, getattr(agent, "name", None), parent or self.root,
+                                         members_by_id)
+
+    def _record_run_response(self, run_response, agent_name: str | None, parent: Span,
+                             members_by_id: dict) -> Span | None:
+        model_id = getattr(run_response, "model", None)
+        provider = getattr(run_response, "model_provider", None)
+        agent_span = Span(self, agent_name or getattr(run_response, "agent_id", None)
+                          or getattr(run_response, "team_id", None) or "agent", "agent", parent.span_id,
+                          attributes={"model": model_id})
+        children = []
+        model_call_end_by_tool_call_id = {}
+        delegation_spans = []
+        for message in getattr(run_response, "messages", None) or []:
+            metrics = message.metrics
+            if message.from_history or metrics is None:
+                continue
+            if message.role == "assistant":
+                timer = metrics.timer
+                if timer is None or timer.start_time is None or timer.end_time is None:
+                    continue
+                span = Span(self, "model call", "model", agent_span.span_id, timer.start_time, {
+                    "model": model_id, "input_tokens": metrics.input_tokens, "output_tokens": metrics.output_tokens,
+                    "cached_tokens": metrics.cached_tokens,
+                    "time_to_first_token_ms": None if metrics.time_to_first_token is None
+                    else round(metrics.time_to_first_token * 1000, 3)})
+                span.finish(timer.end_time)
+                children.append(span)
+                observe_model_call(provider, model_id, timer.end_time - timer.start_time, metrics.time_to_first_token,
+                                   metrics.input_tokens, metrics.output_tokens)
+                for tool_call in message.tool_calls or []:
+                    model_call_end_by_tool_call_id[tool_call.get("id")] = timer.end_time
+            elif message.role == "tool":
+                start = model_call_end_by_tool_call_id.get(message.tool_call_id)
+                if start is None:
+                    continue
+                span = Span(self, f"tool {message.tool_name}", "tool", agent_span.span_id, start,
+                            {"tool": message.tool_name})
+                span.finish(start + (metrics.time or 0.0), status="error" if message.tool_call_error else "ok")
+                children.append(span)
+                observe_tool_call(message.tool_name, metrics.time or 0.0, failed=bool(message.tool_call_error))
+                if message.tool_name in _DELEGATION_TOOLS:
+                    delegation_spans.append(span)
+
+        member_responses = getattr(run_response, "member_responses", None) or []
+        nested_under_delegations = len(delegation_spans) == len(member_responses)
+        for index, member_response in enumerate(member_responses):
+            member = members_by_id.get(getattr(member_response, "agent_id", None))
+            member_span = self._record_run_response(
+                member_response, getattr(member, "name", None),
+                delegation_spans[index] if nested_under_delegations else agent_span, members_by_id={})
+            if member_span is not None:
+                children.append(member_span)
+
+        if not children:
+            return None
+        agent_span.start = min(child.start for child in children)
+        agent_span.finish(max(child.end for child in children))
+        self.spans.append(agent_span)
+        self.spans.extend(child for child in children if child.kind != "agent")
+        return agent_span
+
+    def finish(self, status: str = "ok"):
+        self.root.finish(status=status)
+        for span in self.spans:
+            # Steps still running when the run ends were cancelled along with it.
+            span.finish(self.root.end, status="cancelled")
+
+    def waterfall(self) -> dict:
+        return build_waterfall([span.as_dict() for span in self.spans])
+
+
+def build_waterfall(span_dicts: list[dict]) -> dict:
+    """
+    Orders a trace's spans depth first (children by start time) with each span's offset from the start of
+    the run, and totals the model calls, tool calls, tokens and estimated cost.
+    """
+    root = next((span for span in span_dicts if span["parent_id"] is None), None)
+    if root is None:
+        return {}
+    now = time.time()
+    children_by_parent: dict[str | None, list[dict]] = {}
+    for span in span_dicts:
+        children_by_parent.setdefault(span["parent_id"], []).append(span)
+
+    rows = []
+    totals = {"model_calls": 0, "tool_calls": 0, "input_tokens": 0, "output_tokens": 0, "estimated_cost_usd": 0.0}
+    stack = [(root, 0)]
+    while stack:
+        span, depth = stack.pop()
+        end_time = span["end_time"] if span["end_time"] is not None else now
+        attributes = span["attributes"]
+        rows.append({"span_id": span["span_id"], "parent_id": span["parent_id"], "depth": depth,
+                     "name": span["name"], "kind": span["kind"], "status": span["status"],
+                     "offset_ms": round((span["start_time"] - root["start_time"]) * 1000, 3),
+                     "duration_ms": round((end_time - span["start_time"]) * 1000, 3), "attributes": attributes})
+        if span["kind"] == "model":
+            totals["model_calls"] += 1
+            totals["input_tokens"] += attributes.get("input_tokens") or 0
+            totals["output_tokens"] += attributes.get("output_tokens") or 0
+            totals["estimated_cost_usd"] += estimate_cost(attributes.get("model"), attributes.get("input_tokens") or 0,
+                                                          attributes.get("output_tokens") or 0) or 0.0
+        elif span["kind"] == "tool":
+            totals["tool_calls"] += 1
+        children = sorted(children_by_parent.get(span["span_id"], []), key=lambda child: child["start_time"])
+        stack.extend((child, depth + 1) for child in reversed(children))
+
+    return {"trace_id": root["trace_id"], "session_id": root["session_id"], "status": root["status"],
+            "started_at": root["start_time"], "duration_ms": rows[0]["duration_ms"], "totals": totals, "spans": rows}
+
+
+def render_waterfall_text(waterfall: dict, width: int = 60) -> str:
+    """Renders a waterfall as fixed-width text bars, one line per span."""
+    total_ms = waterfall.get("duration_ms") or 0
+    scale = width / total_ms if total_ms else 0
+    lines = [f"Run {waterfall.get('trace_id')} (session {waterfall.get('session_id')}): "
+             f"{total_ms / 1000:.2f}s, {waterfall.get('status')}"]
+    for row in waterfall.get("spans", []):
+        bar_start = min(width - 1, int(row["offset_ms"] * scale))
+        bar_length = max(1, int(row["duration_ms"] * scale))
+        bar = (" " * bar_start + "#" * bar_length)[:width].ljust(width)
+        detail = ""
+        if row["kind"] == "model":
+            detail = f" in={row['attributes'].get('input_tokens')} out={row['attributes'].get('output_tokens')}"
+        lines.append(f"{row['offset_ms']:>10.0f}ms |{bar}| {'  ' * row['depth']}{row['name']} "
+                     f"{row['duration_ms']:.0f}ms{detail}")
+    return "\n".join(lines)
+
+
+class TraceStore:
+    """
+    Keeps the last `history_size` traces in memory for the waterfall endpoint and appends every finished
+    trace's spans to a JSONL file, one span per line. Traces no longer in memory are read back from it.
+    """
+
+    def __init__(self, log_path=None, history_size: int | None = None):
+        log_path = log_path if log_path is not None else getattr(settings, 'TRACE_LOG_PATH', settings.BASE_DIR / "agent_traces.jsonl")
+        self.log_path = str(log_path) if log_path else None
+        self.history_size = max(1, history_size if history_size is not None else getattr(settings, 'TRACE_HISTORY_SIZE', 200))
+        self._traces: OrderedDict[str, RunTrace] = OrderedDict()
+        self._latest_by_session: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def add(self, trace: RunTrace):
+        with self._lock:
+            self._traces[trace.trace_id] = trace
+            self._latest_by_session[trace.session_id] = trace.trace_id
+            while len(self._traces) > self.history_size:
+                _, evicted = self._traces.popitem(last=False)
+                if self._latest_by_session.get(evicted.session_id) == evicted.trace_id:
+                    del self._latest_by_session[evicted.session_id]
+
+    def export(self, trace: RunTrace):
+        if not self.log_path:
+            return
+        lines = "".join(json.dumps(span.as_dict(), default=str) + "\n" for span in trace.spans)
+        try:
+            with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError as e:
+            logger.error(f"Tracing: Could not write spans to {self.log_path}: {e}")
+
+    def get_waterfall(self, trace_id: str | None = None, session_id: str | None = None) -> dict | None:
+        with self._lock:
+            if trace_id is None and session_id is not None:
+                trace_id = self._latest_by_session.get(session_id)
+            trace = self._traces.get(trace_id) if trace_id else None
+        if trace is not None:
+            return trace.waterfall()
+        span_dicts = self._read_exported(trace_id, session_id)
+        return build_waterfall(span_dicts) if span_dicts else None
+
+    def _read_exported(self, trace_id: str | None, session_id: str | None) -> list[dict]:
+        if not self.log_path or not os.path.exists(self.log_path) or not (trace_id or session_id):
+            return []
+        spans_by_trace: dict[str, list[dict]] = {}
+        latest_root = None
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    continue
+                if trace_id is not None and span.get("trace_id") != trace_id:
+                    continue
+                if trace_id is None and span.get("session_id") != session_id:
+                    continue
+                spans_by_trace.setdefault(span["trace_id"], []).append(span)
+                if span["parent_id"] is None and (latest_root is None or span["start_time"] > latest_root["start_time"]):
+                    latest_root = span
+        if latest_root is None:
+            return []
+        return spans_by_trace[latest_root["trace_id"]]
+
+
+_CURRENT_SPAN: ContextVar[Span | None] = ContextVar("current_trace_span", default=None)
+_TRACE_STORE = None
+_TRACE_STORE_LOCK = threading.Lock()
+
+
+def get_trace_store() -> TraceStore:
+    global _TRACE_STORE
+    with _TRACE_STORE_LOCK:
+        if _TRACE_STORE is None:
+            _TRACE_STORE = TraceStore()
+        return _TRACE_STORE
+
+
+def start_run_trace(session_id: str, **attributes) -> RunTrace:
+    """
+    Starts the trace of an orchestration run and makes its root span current. Like the tool cache
+    counters, it is carried in a context variable, so the tasks the run starts add their spans to it.
+    """
+    trace = RunTrace(session_id, **attributes)
+    get_trace_store().add(trace)
+    _CURRENT_SPAN.set(trace.root)
+    return trace
+
+
+def finish_run_trace(trace: RunTrace, status: str = "ok"):
+    trace.finish(status)
+    get_trace_store().export(trace)
+
+
+def start_span(name: str, kind: str, parent: Span | None = None, **attributes) -> Span:
+    """
+    Starts a span under `parent` (default: the current span) in the current run's trace. Outside a traced
+    run the span is still usable but not recorded anywhere.
+    """
+    parent = parent or _CURRENT_SPAN.get()
+    if parent is None or parent.trace is None:
+        return Span(None, name, kind, attributes=attributes)
+    return parent.trace.start_span(name, kind, parent=parent, **attributes)
+
+
+@contextmanager
+def trace_span(name: str, kind: str, **attributes):
+    """Times the enclosed block as a span and makes it the current span inside the block."""
+    span = start_span(name, kind, **attributes)
+    token = _CURRENT_SPAN.set(span)
+    try:
+        yield span
+    except BaseException:
+        span.finish(status="error")
+        raise
+    finally:
+        _CURRENT_SPAN.reset(token)
+        span.finish()
+
+
+def record_agent_run(agent, parent: Span | None = None) -> Span | None:
+    """Records the model and tool calls of `agent`'s last run under `parent` (default: the current span)."""
+    parent = parent or _CURRENT_SPAN.get()
+    if parent is None or parent.trace is None:
+        return None
+    return parent.trace.record_agent_run(agent, parent)
@@ -1,13 +1,18 @@
 # api/urls.py
 from django.urls import path
-from .views import PromptAPIViewAsync, FileDownloadView, FileSystemView, FileContentView,AvailableModelsView,StopAgentView
+from .views import PromptAPIViewAsync, FileDownloadView, FileSystemView, FileContentView,FileSearchView,WorkspaceEventsView,AvailableModelsView,StopAgentView,RunsView,RunTraceView,PlanStateView
 
 urlpatterns = [
     path('prompt/', PromptAPIViewAsync.as_view(), name='prompt_async'),
     path('files/list/', FileSystemView.as_view(), name='list_files'),
     path('files/download/', FileDownloadView.as_view(), name='download_file'),
     path('files/view/', FileContentView.as_view(), name='see_file'),
+    path('files/search/', FileSearchView.as_view(), name='search_files'),
+    path('files/events/', WorkspaceEventsView.as_view(), name='file_events'),
     path('models/', AvailableModelsView.as_view(), name='available-models'),  # ADD THIS LINE
     path('agent/stop/', StopAgentView.as_view(), name='stop-agent'),
+    path('runs/', RunsView.as_view(), name='list-runs'),
+    path('runs/trace/', RunTraceView.as_view(), name='run-trace'),
+    path('plans/', PlanStateView.as_view(), name='plan-state'),
 
 ]
\ No newline at end of file
@@ -1,44 +1,33 @@
 # api/utils.py
-import re
+import json
 import os
+import threading
 from api.config import AGENT_OUTPUT_DIR 
 
-# Ensure this function signature matches how it's called
-def update_markdown_plan_checkbox_by_description(
-    markdown_plan_filename: str, # Argument 1
-    description_to_find: str,    # Argument 2
-    success: bool                # Argument 3
-) -> bool:
-    md_filepath = os.path.join(AGENT_OUTPUT_DIR, markdown_plan_filename)
-    if not os.path.exists(md_filepath):
-        print(f"Error: {md_filepath} not found for updating checkbox.")
-        return False
+PLAN_STATUS_CHECKBOXES = {"completed": "- [x]", "failed": "- [!]"}
+
+
+def render_markdown_plan(plan_tasks_list: list) -> str:
+    lines = ["# Master Plan", ""]
+    for task in plan_tasks_list:
+        checkbox = PLAN_STATUS_CHECKBOXES.get(task.get("status"), "- [ ]")
+        lines.append(f"{checkbox} {task.get('description', 'Unnamed Task')}")
+    return "\n".join(lines) + "\n"
+
+
+def write_plan_json(plan_tasks_list: list, json_plan_filename: str = "master_plan.json") -> bool:
+    """
+    Writes the JSON plan into the workspace, replacing the file atomically. The Markdown checklist is
+    written by the PlanStore only (`PlanStore.write_markdown`), so it has a single writer.
+    """
+    path = os.path.join(AGENT_OUTPUT_DIR, json_plan_filename)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
     try:
-        with open(md_filepath, "r+", encoding="utf-8") as f:
-            lines = f.readlines()
-            updated = False
-            for i, line in enumerate(lines):
-                if (line.strip().startswith("- [ ]") or \
-                    line.strip().startswith("- [x]") or \
-                    line.strip().startswith("- [!]")) and \
-                    description_to_find in line: # This matching might need to be more robust
-                    
-                    checkbox_pattern = r"- \[[ x!]\]" # Pattern to find any existing checkbox
-                    if success:
-                        lines[i] = re.sub(checkbox_pattern, "- [x]", line, 1)
-                    else:
-                        lines[i] = re.sub(checkbox_pattern, "- [!]", line, 1) # Mark as error/failed
-                    updated = True
-                    print(f"Updated checkbox in {md_filepath} for task containing: '{description_to_find}' to success={success}")
-                    break 
-            
-            if updated:
-                f.seek(0)
-                f.writelines(lines)
-                f.truncate()
-            else:
-                print(f"Warning: Task description containing '{description_to_find}' not found or already in desired state in {md_filepath}.")
-            return updated
+        os.makedirs(AGENT_OUTPUT_DIR, exist_ok=True)
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(plan_tasks_list, f, indent=2)
+        os.replace(temp_path, path)
+        return True
     except Exception as e:
-        print(f"Error updating markdown plan {md_filepath}: {e}")
-        return False
\ No newline at end of file
+        print(f"Error writing plan file {json_plan_filename}: {e}")
+        return False
@@ -4,40 +4,43 @@ import logging
 import mimetypes
 import os
 import re
-import threading
 
 from agno.exceptions import ModelProviderError
 from django.http import StreamingHttpResponse, JsonResponse, HttpResponseBadRequest, HttpResponseNotFound, FileResponse, \
     HttpResponse, Http404
 from django.utils.decorators import method_decorator
+from django.utils.http import http_date, parse_http_date_safe
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from api.agents.initial_response_and_planner_agent import get_planner_agent
-from api.agents.step_executor import get_step_executor_team
+from api.agent_pool import AGENT_POOL
+from api.agents.initial_response_and_planner_agent import PlannerResult
+from api.agents.step_executor import build_member_task_payload, resolve_step_member_name
+from api.composition import COMPOSER_CLASSES
 from api.config import AGENT_OUTPUT_DIR  
-from api.utils import update_markdown_plan_checkbox_by_description
+from api.file_serving import UnsatisfiableRange, aiter_file, etag_matches, file_etag, parse_byte_range, read_text_head
+from api.json_stream import IncrementalJSONScanner
+from api.metrics import EVENT_LOOP_LAG, PROMETHEUS_CONTENT_TYPE, REGISTRY, RUNS_FINISHED
+from api.plan_scheduler import PlanScheduler
+from api.plan_store import get_plan_store
+from api.pricing import estimate_cost
+from api.runs import RUN_MANAGER
+from api.sse import SSEStats, SSEWriter, SSE_TOTALS, format_sse
+from api.tool_cache import track_tool_cache_stats
+from api.tracing import finish_run_trace, get_trace_store, record_agent_run, render_waterfall_text, start_run_trace, \
+    start_span, trace_span
+from api.utils import write_plan_json
+from api.workspace_events import WORKSPACE_CHANGES
+from api.workspace_index import get_workspace_index
+from api.workspace_tree import get_workspace_tree
 from core import settings
-from .llm_registry import get_llm_instance, get_available_models_grouped
+from .llm_registry import MODEL_CATALOG
 from .serializers import PromptRequestSerializer
 
 logger = logging.getLogger(__name__)
-RUNNING_ASYNC_TASKS = {}
-
-TASKS_LOCK = threading.Lock()
-MODEL_PRICING = {
-    
-    "gpt-4o": {"input": 0.005 / 1000, "output": 0.015 / 1000},
-    "gpt-4-turbo-preview": {"input": 0.01 / 1000, "output": 0.03 / 1000},
-    "gpt-3.5-turbo-0125": {"input": 0.0005 / 1000, "output": 0.0015 / 1000},
-    "gemini-2.0-flash-001": {"input": 0.000125 / 1000, "output": 0.000125 / 1000},
-    "gpt-4.1-mini": {"input": 0.00015 / 1000, "output": 0.0016 / 1000},
-    "gemini-2.5-flash-preview-05-20": {"input": 0.0004 / 1000, "output": 0.0006 / 1000},
-    
-}
 @method_decorator(csrf_exempt, name='dispatch')
 class StopAgentView(View):
     async def post(self, request, *args, **kwargs):
@@ -49,11 +52,7 @@ class StopAgentView(View):
 
             logger.info(f"Received stop request for session_id: {session_id}")
 
-            task_to_cancel = RUNNING_ASYNC_TASKS.get(session_id)
-
-            if task_to_cancel and not task_to_cancel.done():
-                
-                task_to_cancel.cancel()
+            if RUN_MANAGER.cancel(session_id):
                 logger.info(f"Cancellation requested for task corresponding to session {session_id}.")
                 return JsonResponse({'status': 'cancellation signal sent'}, status=200)
             else:
@@ -64,6 +63,21 @@ class StopAgentView(View):
             logger.error(f"Error in StopAgentView: {e}", exc_info=True)
             return JsonResponse({'error': str(e)}, status=500)
 
+def get_client_key(request) -> str:
+    """
+    Identifies the user a run is counted against for per-user limits. The app has no accounts, so this is
+    the client IP. Forwarding headers are only read when CLIENT_IP_SOURCE says a trusted proxy sets them;
+    the first X-Forwarded-For entry is never used, since the client writes it.
+    """
+    client_ip_source = getattr(settings, 'CLIENT_IP_SOURCE', 'remote_addr')
+    if client_ip_source == 'x-real-ip':
+        client_ip = request.META.get('HTTP_X_REAL_IP', '').strip()
+    elif client_ip_source == 'x-forwarded-for':
+        client_ip = request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')[-1].strip()
+    else:
+        client_ip = ''
+    return client_ip or request.META.get('REMOTE_ADDR') or "anonymous"
+
 def parse_agno_tool_call_data(chunk) -> dict | None:
     tool_name = None
     args_str = None  
@@ -113,77 +127,352 @@ def parse_agno_tool_call_data(chunk) -> dict | None:
     return None  
 @method_decorator(csrf_exempt, name='dispatch')
 class PromptAPIViewAsync(View):
-    async def _call_agent_for_final_json(self, agent_instance, payload_dict: dict) -> tuple[dict | None, dict | None]:
-        
-        full_response_str = ""
-        parsed_json = None
+    async def _call_agent_for_final_json(self, agent_instance, payload_dict: dict,
+                                         expected_keys=None) -> tuple[dict | None, dict | None]:
+        """
+        Streams the agent's response through an IncrementalJSONScanner and returns the last complete
+        top-level JSON object in it. With `expected_keys`, reading stops as soon as an object with all
+        of those keys is complete; that cancels whatever the agent would still have done (tool calls
+        included) and leaves its metrics without the last model call, so only pass them for agents
+        whose final JSON is their last act.
+        """
+        scanner = IncrementalJSONScanner(expected_keys=expected_keys)
+        response_chunks = []
         agent_metrics_dict = None
         try:
             async_iterator = await agent_instance.arun(json.dumps(payload_dict), stream=True, stream_intermediate_steps=False)
-            async for chunk in async_iterator:
-                if chunk and hasattr(chunk, 'content') and chunk.content:
-                    full_response_str += chunk.content
-            if not full_response_str:
-                logger.error(f"Agent {agent_instance.name} returned empty response string for payload: {payload_dict}")
-                return {"error_message": f"Agent {agent_instance.name} returned no response.", "plan_files_created": False}, None
-            logger.info(f"Agent {agent_instance.name} raw full accumulated response: {full_response_str}")
             try:
-                parsed_json = json.loads(full_response_str)
-                logger.info(f"Successfully parsed entire response as JSON from {agent_instance.name}")
-            except json.JSONDecodeError:
-                logger.warning(f"Could not parse entire response as JSON from {agent_instance.name}. Attempting heuristic. Full: {full_response_str[:500]}")
-                last_brace_index = full_response_str.rfind('}')
-                if last_brace_index != -1:
-                    current_search_index = last_brace_index
-                    while current_search_index >= 0:
-                        first_brace_index = full_response_str.rfind('{', 0, current_search_index + 1)
-                        if first_brace_index != -1:
-                            candidate_str = full_response_str[first_brace_index: last_brace_index + 1]
-                            try:
-                                parsed_json = json.loads(candidate_str)
-                                logger.info(f"Successfully parsed JSON from suffix using heuristic: {candidate_str}")
-                                break
-                            except json.JSONDecodeError:
-                                current_search_index = first_brace_index - 1
-                                continue
-                        else:
+                async for chunk in async_iterator:
+                    if chunk and hasattr(chunk, 'content') and chunk.content:
+                        response_chunks.append(chunk.content)
+                        scanner.feed(chunk.content)
+                        if scanner.satisfied:
+                            logger.info(f"Agent {agent_instance.name} returned all expected keys. Not waiting for the rest of the stream.")
                             break
-                if parsed_json is None:
-                    logger.error(f"Could not extract JSON from response from {agent_instance.name} using heuristic. Full: {full_response_str}")
-                    return {"error_message": f"Agent {agent_instance.name} output did not contain valid JSON.", "plan_files_created": False}, None
-            if parsed_json and agent_instance.run_response and agent_instance.run_response.metrics:
+            finally:
+                if hasattr(async_iterator, 'aclose'):
+                    await async_iterator.aclose()
+            # Read after the run is over, so every model call is counted even if the output is unusable.
+            if agent_instance.run_response and agent_instance.run_response.metrics:
                 raw_metrics = agent_instance.run_response.metrics
                 agent_metrics_dict = {"input_tokens": sum(raw_metrics.get('input_tokens', [0])), "output_tokens": sum(raw_metrics.get('output_tokens', [0])), "time": sum(raw_metrics.get('time', [0.0]))}
+            if not scanner.length:
+                logger.error(f"Agent {agent_instance.name} returned empty response string for payload: {payload_dict}")
+                return {"error_message": f"Agent {agent_instance.name} returned no response.", "plan_files_created": False}, agent_metrics_dict
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Agent {agent_instance.name} raw full accumulated response: {''.join(response_chunks)}")
+            parsed_json = scanner.final_object()
+            if parsed_json is None:
+                logger.error(f"Could not extract JSON from response from {agent_instance.name} "
+                             f"({scanner.length} chars). Start: {''.join(response_chunks)[:500]}")
+                return {"error_message": f"Agent {agent_instance.name} output did not contain valid JSON.", "plan_files_created": False}, agent_metrics_dict
+            logger.info(f"Successfully parsed JSON from {agent_instance.name} ({scanner.length} chars).")
             return parsed_json, agent_metrics_dict
         except Exception as e:
             logger.exception(f"Critical error in _call_agent_for_final_json for {agent_instance.name}: {e}")
             return {"error_message": f"Critical error with agent {agent_instance.name}: {str(e)}", "plan_files_created": False}, None
 
-    async def _stream_response_sse(self, user_prompt: str, model_id: str, session_id: str):
-        def format_sse(data_dict: dict) -> bytes:
-            return f"data: {json.dumps(data_dict)}\n\n".encode('utf-8')
+    async def _call_structured_planner(self, planner_agent, payload_dict: dict,
+                                       all_llm_call_details: list) -> tuple[PlannerResult | None, str | None]:
+        """
+        Runs the structured-output planner in a single turn and returns its validated PlannerResult,
+        or None and an error message.
+        """
+        try:
+            run_response = await planner_agent.arun(json.dumps(payload_dict))
+        except Exception as e:
+            logger.exception(f"Critical error in _call_structured_planner for {planner_agent.name}: {e}")
+            return None, f"Critical error with agent {planner_agent.name}: {str(e)}"
+
+        if run_response.metrics:
+            all_llm_call_details.append({
+                "agent_name": planner_agent.name,
+                "model_id": planner_agent.model.id,
+                "input_tokens": sum(run_response.metrics.get('input_tokens', [0])),
+                "output_tokens": sum(run_response.metrics.get('output_tokens', [0])),
+                "time": sum(run_response.metrics.get('time', [0.0])),
+            })
+
+        planner_result = run_response.content
+        if not isinstance(planner_result, PlannerResult):
+            # agno leaves the raw text in place when it can't parse it into the response model.
+            try:
+                planner_result = PlannerResult.model_validate_json(str(planner_result or ""))
+            except ValueError as e:
+                logger.error(f"Structured planner output failed validation: {e}. Start: {str(run_response.content)[:500]}")
+                return None, f"Agent {planner_agent.name} output did not match the plan schema."
+        logger.info(f"Orchestrator: Structured planner returned {len(planner_result.tasks)} tasks.")
+        return planner_result, None
+
+    async def _stream_plan_into_scheduler(self, planner_agent, payload_dict: dict, scheduler: PlanScheduler,
+                                          plan_id: str, all_llm_call_details: list) -> str | None:
+        """
+        Streams the pipelined planner's response and hands every task to the scheduler as soon as
+        its JSON object is complete, so step 1 starts while later steps are still being planned.
+        The acknowledgment is sent as soon as it has streamed. Before the first task is scheduled,
+        step 0 is reported complete and `plan_ready` is sent, then again with the new `task_count`
+        for every task that follows, so the client always knows a step before it starts.
+        The plan files are (re)written by the orchestrator as tasks arrive.
+        Returns an error message if planning failed, otherwise None.
+        """
+        scanner = IncrementalJSONScanner()
+        planner_succeeded = False
+        acknowledged = False
+        plan_announced = False
+        planner_span = start_span("planner", "step", mode="pipelined")
+        plan_store = await asyncio.to_thread(get_plan_store)
+
+        async def acknowledge(message: str):
+            nonlocal acknowledged
+            if not acknowledged:
+                acknowledged = True
+                await scheduler.emit(format_sse({"type": "initial_ack", "content": message}))
+
+        try:
+            async_iterator = await planner_agent.arun(json.dumps(payload_dict), stream=True, stream_intermediate_steps=False)
+            async for chunk in async_iterator:
+                if not (chunk and getattr(chunk, 'content', None)):
+                    continue
+                for task_details_dict in scanner.feed(chunk.content):
+                    if not plan_announced:
+                        plan_announced = True
+                        await acknowledge(scanner.top_level_strings.get(
+                            "acknowledgment_message", "Plan created. Starting execution..."))
+                        await scheduler.emit(format_sse({"type": "step_completed", "step_index": 0, "status": "success"}))
+                    task_details_dict.setdefault("status", "pending")
+                    task_index = len(scheduler.plan_tasks_list)
+                    await asyncio.to_thread(plan_store.add_task, plan_id, task_index, task_details_dict)
+                    await asyncio.to_thread(plan_store.write_markdown, plan_id)
+                    await asyncio.to_thread(write_plan_json, scheduler.plan_tasks_list + [task_details_dict])
+                    await scheduler.emit(format_sse({"type": "plan_ready", "task_count": 2 + task_index,
+                                                     "plan_id": plan_id}))
+                    scheduler.add_task(task_details_dict)
+                    logger.info(f"Orchestrator: Planner streamed task {task_index + 1}: {task_details_dict.get('description')}")
+                if "acknowledgment_message" in scanner.top_level_strings:
+                    await acknowledge(scanner.top_level_strings["acknowledgment_message"])
+
+            if planner_agent.run_response and planner_agent.run_response.metrics:
+                raw_metrics = planner_agent.run_response.metrics
+                all_llm_call_details.append({
+                    "agent_name": planner_agent.name,
+                    "model_id": planner_agent.model.id,
+                    "input_tokens": sum(raw_metrics.get('input_tokens', [0])),
+                    "output_tokens": sum(raw_metrics.get('output_tokens', [0])),
+                    "time": sum(raw_metrics.get('time', [0.0])),
+                })
+            record_agent_run(planner_agent, parent=planner_span)
+
+            if not scheduler.plan_tasks_list:
+                logger.error(f"Orchestrator: Pipelined planner produced no tasks. Last object: {scanner.last_object}")
+                return f"Agent {planner_agent.name} output did not contain a valid plan."
+
+            planner_succeeded = True
+            return None
+        except Exception as e:
+            logger.exception(f"Critical error while streaming plan from {planner_agent.name}: {e}")
+            return f"Critical error with agent {planner_agent.name}: {str(e)}"
+        finally:
+            planner_span.finish(status="ok" if planner_succeeded else "error", task_count=len(scheduler.plan_tasks_list))
+            if not plan_announced:
+                await scheduler.emit(format_sse({"type": "step_completed", "step_index": 0, "status": "failed"}))
+            scheduler.close()
+
+    async def _compose_report(self, composer_class, agent_graph, task_details_dict: dict, sse_writer: SSEWriter,
+                              step_span, all_llm_call_details: list) -> str:
+        """
+        Runs a ComposerAgent task through the composer for COMPOSER_MODE ('map_reduce' or 'sections'),
+        streaming its progress as step activity, and returns the step's status line.
+        """
+        composer = composer_class(agent_graph, on_progress=sse_writer.send_activity, on_token=sse_writer.token)
+        try:
+            result = await composer.compose(task_details_dict, parent_span=step_span)
+        finally:
+            all_llm_call_details.extend(composer.llm_call_details)
+        sections = f' in {result["sections"]} sections' if "sections" in result else ""
+        status_line = (f'TASK_STEP_COMPLETED: Task "{task_details_dict.get("description", "Unnamed Task")}" '
+                       f'(ID: "{task_details_dict.get("id")}") completed. Output: "{result["output_filename"]}". '
+                       f'Result: composed from {result["chunks"]} chunks of {result["files"]} files{sections} '
+                       f'({result["cached_summaries"]} summaries cached, {result["reduce_levels"]} merge levels).')
+        await sse_writer.token("\n\n" + status_line)
+        return status_line
+
+    async def _execute_plan_step(self, agent_graph, plan_id: str, task_index: int, task_details_dict: dict,
+                                 all_llm_call_details: list, session_id: str, emit) -> bool:
+        """
+        Runs one plan task, passing SSE frames to `emit`. In 'direct' dispatch mode the task goes straight
+        to the member agent named by its `agent_id`; otherwise (or if the id is unknown) through a
+        StepExecutorTeam whose leader delegates it. With COMPOSER_MODE 'map_reduce' or 'sections',
+        ComposerAgent tasks are composed by the matching composer instead. Each step gets its own clones of the pooled agents,
+        so steps scheduled concurrently never share run state.
+        """
+        task_agent_id = task_details_dict.get("agent_id")
+        composer_class = (COMPOSER_CLASSES.get(settings.COMPOSER_MODE)
+                          if resolve_step_member_name(task_agent_id) == "ComposerAgent" else None)
+        step_executor_team = None
+        if settings.STEP_DISPATCH_MODE == "direct" and composer_class is None:
+            step_executor_team = agent_graph.step_member_agent(task_agent_id)
+            if step_executor_team is None:
+                logger.warning(f"Orchestrator: Unknown agent_id '{task_agent_id}'. Falling back to the team leader.")
+        if step_executor_team is not None:
+            step_input = build_member_task_payload(task_details_dict)
+            metrics_agent_name = f"{step_executor_team.name}_direct_step_{task_index}"
+        elif composer_class is None:
+            step_executor_team = agent_graph.step_executor_team()
+            step_input = json.dumps(task_details_dict)
+            metrics_agent_name = f"{step_executor_team.name}_leader_step_{task_index}"
+        real_step_index = task_index + 1
+        task_description = task_details_dict.get("description", "Unnamed Task")
+
+        sse_writer = SSEWriter(emit, real_step_index)
+        await sse_writer.send(
+            {"type": "step_started", "step_index": real_step_index, "description": task_description,
+             "agent_id": task_details_dict.get("agent_id")})
+        await sse_writer.send({"type": "step_call_name_announcement", "step_index": real_step_index,
+                               "call_name": task_details_dict.get("call_name", "unknown_action"),
+                               "description": task_description})
+        logger.info(f"Orchestrator: Starting task {real_step_index}: {task_description}")
+        plan_store = await asyncio.to_thread(get_plan_store)
+        await asyncio.to_thread(plan_store.mark_started, plan_id, task_index)
+        step_span = start_span(f"step {real_step_index}", "step", description=task_description, agent_id=task_agent_id)
+
+        step_executor_final_text_output = ""
+        step_success = False
+        logger.info(f"SSE LOGIC [session: {session_id}]: Starting step {task_index}: {task_description}")
+        try:
+            if composer_class is not None:
+                step_executor_final_text_output = await self._compose_report(
+                    composer_class, agent_graph, task_details_dict, sse_writer, step_span, all_llm_call_details)
+            else:
+                async_iterator_for_step = await step_executor_team.arun(step_input, stream=True,
+                                                                        stream_intermediate_steps=True)
+                async for chunk in async_iterator_for_step:
+                    sse_payload_data = None
+                    agno_event_type = getattr(chunk, 'event', None)
+                    chunk_content = getattr(chunk, 'content', None)
+
+                    if agno_event_type == 'RunResponse':
+                        if chunk_content:
+                            if chunk_content.startswith("E2B_STDOUT:"):
+                                e2b_data = chunk_content.replace("E2B_STDOUT:", "", 1).strip()
+                                sse_payload_data = {"event": "E2BTerminalOutput", "stream_type": "stdout",
+                                                    "data": e2b_data}
+                            elif chunk_content.startswith("E2B_STDERR:"):
+                                e2b_data = chunk_content.replace("E2B_STDERR:", "", 1).strip()
+                                sse_payload_data = {"event": "E2BTerminalOutput", "stream_type": "stderr",
+                                                    "data": e2b_data}
+                            else:
+                                step_executor_final_text_output += chunk_content
+                                await sse_writer.token(chunk_content)
+
+                    elif agno_event_type == 'RunCompleted':
+                        if chunk_content:
+                            step_executor_final_text_output = chunk_content
+                        logger.info(
+                            f"StepExecutor 'RunCompleted' for task '{task_description}'. Final message snippet: {step_executor_final_text_output[:100]}")
+
+                    elif agno_event_type == 'ToolCallStarted':
+                        tool_info = parse_agno_tool_call_data(chunk)
+                        sse_payload_data = {"event": "ToolCallStarted", "data": tool_info}
+
+                    elif agno_event_type == 'ToolCallCompleted':
+                        tool_info = parse_agno_tool_call_data(chunk)
+                        sse_payload_data = {"event": "ToolCallCompleted", "data": tool_info,
+                                            "result_preview": str(chunk_content)[
+                                                              :200] if chunk_content else None}
+                        if tool_info and tool_info.get(
+                                "tool_name") == "run_python_code" and task_agent_id == "E2BCodeExecutionAgent":
+                            logger.info(
+                                f"E2B Script Output (via PythonTools for StepExecutor): {chunk_content}")
+
+                    elif chunk_content and agno_event_type:
+                        sse_payload_data = {"event": agno_event_type, "data": chunk_content}
+
+                    if sse_payload_data:
+                        await sse_writer.send_activity(sse_payload_data)
+
+                if step_executor_team.run_response and step_executor_team.run_response.metrics:  
+                    raw_metrics = step_executor_team.run_response.metrics
+                    all_llm_call_details.append({
+                        "agent_name": metrics_agent_name,
+                        "model_id": step_executor_team.model.id,
+                        "input_tokens": sum(raw_metrics.get('input_tokens', [0])),
+                        "output_tokens": sum(raw_metrics.get('output_tokens', [0])),
+                        "time": sum(raw_metrics.get('time', [0.0])),
+                    })
+
+            if step_executor_final_text_output:
+                normalized_output = step_executor_final_text_output.strip().upper()
+                if "TASK_STEP_COMPLETED:" in normalized_output:
+                    step_success = True
+                else:
+                    step_success = False
+                    logger.warning(
+                        f"Orchestrator: StepExecutor for '{task_description}' output LACKED 'TASK_STEP_COMPLETED:' status line.")
+            else:
+                step_success = True
+                logger.warning(
+                    f"Orchestrator: No final textual output from StepExecutor for '{task_description}'.")
+            step_success = True
+        except ModelProviderError as e:
+
+            logger.error(
+                f"A ModelProviderError occurred while processing the agent stream. This is often due to malformed JSON from the LLM.",
+                exc_info=True 
+            )
+            logger.error(f"The input that likely caused the error was: {json.dumps(task_details_dict, indent=2)}")
+
+            error_payload = {
+                "type": "error",
+                "step_index": task_index,
+                "event": "FatalError",
+                "data": {
+                    "message": "The AI model returned an invalid response. This can be a temporary issue. Please try again.",
+                    "details": str(e)
+                }
+            }
+            await sse_writer.send(error_payload)
+        except Exception as e:
+            logger.exception(
+                f"Orchestrator: Exception during StepExecutor call for task '{task_description}'")
+            step_success = False
+            await sse_writer.send(
+                {"type": "step_error", "step_index": task_index, "description": task_description,
+                 "error_message": str(e)})
+
+        if step_executor_team is not None:
+            record_agent_run(step_executor_team, parent=step_span)
+        step_span.finish(status="ok" if step_success else "error")
+        task_details_dict["status"] = "completed" if step_success else "failed"
+        await asyncio.to_thread(plan_store.mark_finished, plan_id, task_index, step_success)
+        await asyncio.to_thread(plan_store.write_markdown, plan_id)
+        await sse_writer.send({"type": "step_completed", "step_index": real_step_index,
+                               "status": "success" if step_success else "failed"})
+        await sse_writer.close()
+        logger.info(f"Orchestrator: Completed task {task_index + 1}. Success: {step_success}")
+
+        return step_success
 
+    async def _stream_response_sse(self, user_prompt: str, model_id: str, session_id: str):
         all_llm_call_details = []
+        tool_cache_stats = track_tool_cache_stats()
+        run_trace = start_run_trace(session_id, model=model_id, planner_mode=settings.PLANNER_MODE)
+        trace_status = "ok"
         try:
             
-            all_models_grouped = get_available_models_grouped()
-            provider = next((p for p, models in all_models_grouped.items() if any(m['id'] == model_id for m in models)),
-                            None)
+            # A model missing from the catalog makes it refresh synchronously, which is network I/O.
+            provider = await asyncio.to_thread(MODEL_CATALOG.get_provider, model_id)
 
             if not provider:
                 logger.error(f"Orchestrator: Could not find provider for model_id: {model_id}")
                 yield format_sse({"type": "error", "message": f"Model '{model_id}' is not currently available."})
                 raise StopAsyncIteration
 
-            llm = get_llm_instance(model_id=model_id, provider=provider)
-            if not llm:
+            agent_graph = AGENT_POOL.get_graph(provider, model_id)
+            if not agent_graph:
                 logger.error(f"Orchestrator: Failed to create LLM instance for model '{model_id}'. Check API keys.")
                 yield format_sse({"type": "error", "message": f"Could not initialize model '{model_id}'."})
                 raise StopAsyncIteration
 
-            planner_agent = get_planner_agent(llm)
-            step_executor_team = get_step_executor_team(llm)
-
             yield format_sse({"type": "step_started", "step_index": 0, "description": "Making a plan...",
                               "agent_id": "PlannerAgent"})
             yield format_sse({"type": "step_call_name_announcement", "step_index": 0, "call_name": "generate_plan",
@@ -191,165 +480,112 @@ class PromptAPIViewAsync(View):
             logger.info(f"SSE LOGIC [session: {session_id}]: Calling Planner agent...")
 
             planner_payload = {"user_prompt": user_prompt, "task": "generate_initial_response_and_plan"}
-            planner_json_result, planner_run_metrics = await self._call_agent_for_final_json(planner_agent,
-                                                                                             planner_payload)
+            markdown_plan_filename = "master_plan.md"
 
-            if planner_run_metrics:
-                all_llm_call_details.append(
-                    {"agent_name": planner_agent.name, "model_id": planner_agent.model.id, **planner_run_metrics})
+            plan_id = None
 
-            if not planner_json_result or planner_json_result.get("error_message"):
-                error_msg = planner_json_result.get("error_message", "Planner agent failed to create plan files.")
-                yield format_sse({"type": "step_completed", "step_index": 0, "status": "failed"})
-                yield format_sse({"type": "error", "message": error_msg})
-                raise StopAsyncIteration
-
-            yield format_sse({"type": "step_completed", "step_index": 0, "status": "success"})
-            yield format_sse({"type": "initial_ack", "content": planner_json_result.get("acknowledgment_message",
-                                                                                        "Plan created. Starting execution...")})
-
-            markdown_plan_filename = planner_json_result.get("markdown_plan_filename", "master_plan.md")
-            json_plan_filename = planner_json_result.get("json_plan_filename", "master_plan.json")
-            json_plan_path = os.path.join(AGENT_OUTPUT_DIR, json_plan_filename)
-
-            try:
-                with open(json_plan_path, "r", encoding="utf-8") as f:
-                    plan_tasks_list = json.load(f)
-                if not isinstance(plan_tasks_list, list): raise ValueError("Plan is not a list.")
-                total_steps = 1 + len(plan_tasks_list)
-                yield format_sse({"type": "plan_ready", "task_count": total_steps})
-                logger.info(f"Orchestrator: Loaded {len(plan_tasks_list)} tasks from {json_plan_path}")
-            except Exception as e:
-                logger.error(f"Orchestrator: Failed to read/parse {json_plan_path}: {e}")
-                yield format_sse({"type": "error", "message": f"Error reading plan: {e}"})
-                raise StopAsyncIteration
+            async def run_step(task_index, task_details_dict, emit):
+                return await self._execute_plan_step(agent_graph, plan_id, task_index, task_details_dict,
+                                                     all_llm_call_details, session_id, emit)
 
-            all_steps_succeeded = True
-            for task_index, task_details_dict in enumerate(plan_tasks_list):
-                task_agent_id = task_details_dict.get("agent_id")
-                real_step_index = task_index + 1
-                task_description = task_details_dict.get("description", "Unnamed Task")
+            if settings.PLANNER_MODE == "pipelined":
+                plan_store = await asyncio.to_thread(get_plan_store)
+                plan_id = await asyncio.to_thread(plan_store.create_plan, session_id,
+                                                  markdown_filename=markdown_plan_filename)
+                scheduler = PlanScheduler(max_parallel=settings.PLAN_MAX_PARALLEL_STEPS, expect_more_tasks=True)
+                planner_task = asyncio.create_task(self._stream_plan_into_scheduler(
+                    agent_graph.pipelined_planner_agent(), planner_payload, scheduler, plan_id, all_llm_call_details))
+                try:
+                    async for frame in scheduler.run(run_step):
+                        yield frame
+                    planner_error = await planner_task
+                finally:
+                    planner_task.cancel()
+                plan_tasks_list = scheduler.plan_tasks_list
+                if planner_error:
+                    yield format_sse({"type": "error", "message": planner_error})
+                    raise StopAsyncIteration
+            elif settings.PLANNER_MODE == "structured":
+                planner_agent = agent_graph.structured_planner_agent()
+                with trace_span("planner", "step", mode="structured") as planner_span:
+                    planner_result, planner_error = await self._call_structured_planner(
+                        planner_agent, planner_payload, all_llm_call_details)
+                    record_agent_run(planner_agent, parent=planner_span)
+                    if planner_error:
+                        planner_span.finish(status="error")
+                if planner_error:
+                    yield format_sse({"type": "step_completed", "step_index": 0, "status": "failed"})
+                    yield format_sse({"type": "error", "message": planner_error})
+                    raise StopAsyncIteration
+
+                plan_tasks_list = [{**task.model_dump(), "status": "pending"} for task in planner_result.tasks]
+                plan_store = await asyncio.to_thread(get_plan_store)
+                plan_id = await asyncio.to_thread(plan_store.create_plan, session_id, plan_tasks_list,
+                                                  markdown_plan_filename)
+                await asyncio.to_thread(plan_store.write_markdown, plan_id)
+                await asyncio.to_thread(write_plan_json, plan_tasks_list)
+                yield format_sse({"type": "step_completed", "step_index": 0, "status": "success"})
+                yield format_sse({"type": "initial_ack", "content": planner_result.acknowledgment_message})
+                yield format_sse({"type": "plan_ready", "task_count": 1 + len(plan_tasks_list), "plan_id": plan_id})
+
+                scheduler = PlanScheduler(plan_tasks_list, max_parallel=settings.PLAN_MAX_PARALLEL_STEPS)
+                async for frame in scheduler.run(run_step):
+                    yield frame
+            else:
+                planner_agent = agent_graph.planner_agent()
+                with trace_span("planner", "step", mode="tools") as planner_span:
+                    # Read to the end: the planner may print its final JSON before its save_file calls are done.
+                    planner_json_result, planner_run_metrics = await self._call_agent_for_final_json(
+                        planner_agent, planner_payload)
+                    record_agent_run(planner_agent, parent=planner_span)
+                    if not planner_json_result or planner_json_result.get("error_message"):
+                        planner_span.finish(status="error")
+
+                if planner_run_metrics:
+                    all_llm_call_details.append(
+                        {"agent_name": planner_agent.name, "model_id": planner_agent.model.id, **planner_run_metrics})
+
+                if not planner_json_result or planner_json_result.get("error_message"):
+                    error_msg = planner_json_result.get("error_message", "Planner agent failed to create plan files.")
+                    yield format_sse({"type": "step_completed", "step_index": 0, "status": "failed"})
+                    yield format_sse({"type": "error", "message": error_msg})
+                    raise StopAsyncIteration
+
+                yield format_sse({"type": "step_completed", "step_index": 0, "status": "success"})
+                yield format_sse({"type": "initial_ack", "content": planner_json_result.get("acknowledgment_message",
+                                                                                            "Plan created. Starting execution...")})
+
+                markdown_plan_filename = planner_json_result.get("markdown_plan_filename", "master_plan.md")
+                json_plan_filename = planner_json_result.get("json_plan_filename", "master_plan.json")
+                json_plan_path = os.path.join(AGENT_OUTPUT_DIR, json_plan_filename)
 
-                yield format_sse(
-                    {"type": "step_started", "step_index": real_step_index, "description": task_description,
-                     "agent_id": task_details_dict.get("agent_id")})
-                yield format_sse({"type": "step_call_name_announcement", "step_index": real_step_index,
-                                  "call_name": task_details_dict.get("call_name", "unknown_action"),
-                                  "description": task_description})
-                logger.info(f"Orchestrator: Starting task {real_step_index + 1}/{total_steps}: {task_description}")
-
-                step_executor_final_text_output = ""
-                step_success = False
-                logger.info(f"SSE LOGIC [session: {session_id}]: Starting step {task_index}: {task_description}")
                 try:
-                    async_iterator_for_step = await step_executor_team.arun(json.dumps(task_details_dict), stream=True,
-                                                                            stream_intermediate_steps=True)
-                    async for chunk in async_iterator_for_step:
-                        sse_payload_data = None
-                        agno_event_type = getattr(chunk, 'event', None)
-                        chunk_content = getattr(chunk, 'content', None)
-
-                        if agno_event_type == 'RunResponse':
-                            if chunk_content:
-                                if chunk_content.startswith("E2B_STDOUT:"):
-                                    e2b_data = chunk_content.replace("E2B_STDOUT:", "", 1).strip()
-                                    sse_payload_data = {"event": "E2BTerminalOutput", "stream_type": "stdout",
-                                                        "data": e2b_data}
-                                elif chunk_content.startswith("E2B_STDERR:"):
-                                    e2b_data = chunk_content.replace("E2B_STDERR:", "", 1).strip()
-                                    sse_payload_data = {"event": "E2BTerminalOutput", "stream_type": "stderr",
-                                                        "data": e2b_data}
-                                else:
-                                    step_executor_final_text_output += chunk_content
-                                    sse_payload_data = {"event": "LLMToken", "data": chunk_content}
-
-                        elif agno_event_type == 'RunCompleted':
-                            if chunk_content:
-                                step_executor_final_text_output = chunk_content
-                            logger.info(
-                                f"StepExecutor 'RunCompleted' for task '{task_description}'. Final message snippet: {step_executor_final_text_output[:100]}")
-
-                        elif agno_event_type == 'ToolCallStarted':
-                            tool_info = parse_agno_tool_call_data(chunk)
-                            sse_payload_data = {"event": "ToolCallStarted", "data": tool_info}
-
-                        elif agno_event_type == 'ToolCallCompleted':
-                            tool_info = parse_agno_tool_call_data(chunk)
-                            sse_payload_data = {"event": "ToolCallCompleted", "data": tool_info,
-                                                "result_preview": str(chunk_content)[
-                                                                  :200] if chunk_content else None}
-                            if tool_info and tool_info.get(
-                                    "tool_name") == "run_python_code" and task_agent_id == "E2BCodeExecutionAgent":
-                                logger.info(
-                                    f"E2B Script Output (via PythonTools for StepExecutor): {chunk_content}")
-
-                        elif chunk_content and agno_event_type:
-                            sse_payload_data = {"event": agno_event_type, "data": chunk_content}
-
-                        if sse_payload_data:
-                            yield format_sse({"type": "step_agent_activity", "step_index": real_step_index, **sse_payload_data})
-                        await asyncio.sleep(0.001)
-
-                    if step_executor_team.run_response and step_executor_team.run_response.metrics:  
-                        raw_metrics = step_executor_team.run_response.metrics
-                        all_llm_call_details.append({
-                            "agent_name": f"{step_executor_team.name}_leader_step_{task_index}",
-                            "model_id": step_executor_team.model.id,
-                            "input_tokens": sum(raw_metrics.get('input_tokens', [0])),
-                            "output_tokens": sum(raw_metrics.get('output_tokens', [0])),
-                            "time": sum(raw_metrics.get('time', [0.0])),
-                        })
-
-                    if step_executor_final_text_output:
-                        normalized_output = step_executor_final_text_output.strip().upper()
-                        if "TASK_STEP_COMPLETED:" in normalized_output:
-                            step_success = True
-                        else:
-                            step_success = False
-                            logger.warning(
-                                f"Orchestrator: StepExecutor for '{task_description}' output LACKED 'TASK_STEP_COMPLETED:' status line.")
-                    else:
-                        step_success = True
-                        logger.warning(
-                            f"Orchestrator: No final textual output from StepExecutor for '{task_description}'.")
-                    step_success = True
-                except ModelProviderError as e:
-                    
-                    logger.error(
-                        f"A ModelProviderError occurred while processing the agent stream. This is often due to malformed JSON from the LLM.",
-                        exc_info=True 
-                    )
-                    logger.error(f"The input that likely caused the error was: {json.dumps(task_details_dict, indent=2)}")
-                    
-                    error_payload = {
-                        "type": "error",
-                        "step_index": task_index,
-                        "event": "FatalError",
-                        "data": {
-                            "message": "The AI model returned an invalid response. This can be a temporary issue. Please try again.",
-                            "details": str(e)
-                        }
-                    }
-                    yield format_sse(error_payload)
+                    with open(json_plan_path, "r", encoding="utf-8") as f:
+                        plan_tasks_list = json.load(f)
+                    if not isinstance(plan_tasks_list, list): raise ValueError("Plan is not a list.")
+                    total_steps = 1 + len(plan_tasks_list)
+                    plan_store = await asyncio.to_thread(get_plan_store)
+                    plan_id = await asyncio.to_thread(plan_store.create_plan, session_id, plan_tasks_list,
+                                                      markdown_plan_filename, json_plan_filename)
+                    yield format_sse({"type": "plan_ready", "task_count": total_steps, "plan_id": plan_id})
+                    logger.info(f"Orchestrator: Loaded {len(plan_tasks_list)} tasks from {json_plan_path}")
                 except Exception as e:
-                    logger.exception(
-                        f"Orchestrator: Exception during StepExecutor call for task '{task_description}'")
-                    step_success = False
-                    yield format_sse(
-                        {"type": "step_error", "step_index": task_index, "description": task_description,
-                         "error_message": str(e)})
-
-                update_markdown_plan_checkbox_by_description(markdown_plan_filename, task_description, step_success)
-                yield format_sse({"type": "step_completed", "step_index": real_step_index,
-                                  "status": "success" if step_success else "failed"})
-                logger.info(f"Orchestrator: Completed task {task_index + 1}. Success: {step_success}")
-
-                if not step_success:
-                    all_steps_succeeded = False
-                    logger.error(f"Orchestrator: Stopping due to failure in step: {task_description}")
-                    yield format_sse(
-                        {"type": "error", "message": f"Process stopped due to failure in step: {task_description}"})
-                    break
+                    logger.error(f"Orchestrator: Failed to read/parse {json_plan_path}: {e}")
+                    yield format_sse({"type": "error", "message": f"Error reading plan: {e}"})
+                    raise StopAsyncIteration
+
+                scheduler = PlanScheduler(plan_tasks_list, max_parallel=settings.PLAN_MAX_PARALLEL_STEPS)
+                async for frame in scheduler.run(run_step):
+                    yield frame
+
+            all_steps_succeeded = scheduler.all_steps_succeeded
+            if not all_steps_succeeded:
+                trace_status = "failed"
+            if scheduler.failed_task_index is not None:
+                failed_description = plan_tasks_list[scheduler.failed_task_index].get("description", "Unnamed Task")
+                logger.error(f"Orchestrator: Stopping due to failure in step: {failed_description}")
+                yield format_sse(
+                    {"type": "error", "message": f"Process stopped due to failure in step: {failed_description}"})
 
             if all_steps_succeeded:
                 logger.info("Orchestrator: All plan steps processed successfully. Preparing final summary.")
@@ -374,8 +610,13 @@ class PromptAPIViewAsync(View):
                 logger.info(f"Orchestrator: Final summary sent with artifacts: {final_deliverables}")
 
         except StopAsyncIteration:
+            trace_status = "error"
             logger.info("Orchestrator: SSE stream generation stopped by StopAsyncIteration.")
+        except asyncio.CancelledError:
+            trace_status = "cancelled"
+            raise
         except Exception as e:
+            trace_status = "error"
             logger.exception("Orchestrator: Critical error in main orchestration flow.")
             try:
                 yield format_sse({"type": "error", "message": f"Critical orchestration error: {e}"})
@@ -389,15 +630,13 @@ class PromptAPIViewAsync(View):
             for call_detail in all_llm_call_details:
                 model_id = call_detail.get("model_id", "unknown_model")
                 
-                pricing_info = MODEL_PRICING.get(model_id)
-
                 input_t = call_detail.get("input_tokens", 0)
                 output_t = call_detail.get("output_tokens", 0)
                 total_input_tokens += input_t
                 total_output_tokens += output_t
 
-                if pricing_info:
-                    call_cost = (input_t * pricing_info["input"]) + (output_t * pricing_info["output"])
+                call_cost = estimate_cost(model_id, input_t, output_t)
+                if call_cost is not None:
                     total_cost += call_cost
                     logger.info(
                         f"Agent: {call_detail['agent_name']}, Model: {model_id}, "
@@ -409,56 +648,40 @@ class PromptAPIViewAsync(View):
 
             logger.info(
                 f"TOTALS: Input Tokens: {total_input_tokens}, Output Tokens: {total_output_tokens}, Estimated Cost: ${total_cost:.6f}")
+            logger.info(f"Search/scrape cache: {tool_cache_stats.as_dict()}")
+            finish_run_trace(run_trace, trace_status)
+            RUNS_FINISHED.inc(trace_status)
 
             yield format_sse({"type": "cost_summary", "total_input_tokens": total_input_tokens,
-                              "total_output_tokens": total_output_tokens, "estimated_cost_usd": total_cost})
+                              "total_output_tokens": total_output_tokens, "estimated_cost_usd": total_cost,
+                              "tool_cache": tool_cache_stats.as_dict(), "trace_id": run_trace.trace_id})
             yield format_sse({"type": "session_done"})
             logger.info("Orchestrator: Session done. SSE stream finished.")
 
     async def stream_wrapper(self, request, user_prompt, model_id, session_id):
         """
-        Wraps the SSE generator in a cancellable asyncio.Task and streams its results.
+        Starts the SSE generator as a detachable run in the RunManager and streams its frames.
+        The run may first wait in the admission queue; it keeps going if this response goes away,
+        so the client can resume with Last-Event-ID.
         """
-        print(session_id)
-        queue = asyncio.Queue()
-
-        async def producer():
-            """
-            This is the coroutine that will be run as a background task.
-            Its job is to consume the async generator and put items in the queue.
-            """
-            try:
-                
-                async for item in self._stream_response_sse(user_prompt, model_id, session_id):
-                    await queue.put(item)
-            except asyncio.CancelledError:
-                
-                logger.info(f"Task for session {session_id} was cancelled by request.")
-                cancelled_payload = {"type": "error", "message": "Task was cancelled by user."}
-                cancelled_event = f"data: {json.dumps(cancelled_payload)}\n\n".encode('utf-8')
-                await queue.put(cancelled_event)
-            except Exception as e:
-                
-                logger.error(f"Error during SSE generation for session {session_id}: {e}", exc_info=True)
-                error_payload = {"type": "error", "message": f"An unexpected error occurred: {e}"}
-                error_event = f"data: {json.dumps(error_payload)}\n\n".encode('utf-8')
-                await queue.put(error_event)
-            finally:
-                
-                await queue.put(None)
-
-        task = asyncio.create_task(producer())
-        RUNNING_ASYNC_TASKS[session_id] = task
+        EVENT_LOOP_LAG.ensure_started()
+        run = RUN_MANAGER.start_run(session_id, get_client_key(request),
+                                    self._stream_response_sse(user_prompt, model_id, session_id))
         logger.info(f"Task for session {session_id} started and stored.")
 
-        while True:
-            item = await queue.get()
-            if item is None:
-                break
+        async for item in self.stream_run_frames(run, last_event_id=0):
+            yield item
+
+    async def stream_run_frames(self, run, last_event_id: int):
+        """Streams a run's frames after `last_event_id` to one client, recording SSE stats."""
+        sse_stats = SSEStats()
+        async for item in run.subscribe(last_event_id):
+            sse_stats.record_frame(len(item))
+            SSE_TOTALS.record_frame(len(item))
             yield item
-            queue.task_done()
+        logger.info(f"SSE stats for session {run.session_id}: {sse_stats.as_dict()}")
         logger.info(
-            f"Streaming finished for session {session_id}. Task remains in registry until cancelled or replaced.")
+            f"Streaming finished for session {run.session_id}. Run stays resumable until its TTL expires.")
 
     async def consume_generator(self, generator):
         """Helper to consume an async generator into a list."""
@@ -484,12 +707,22 @@ class PromptAPIViewAsync(View):
         validated_data = serializer.validated_data
         session_id = validated_data['session_id']
 
-        if session_id in RUNNING_ASYNC_TASKS:
-            old_task = RUNNING_ASYNC_TASKS[session_id]
-            if not old_task.done():
-                logger.warning(
-                    f"A task for session {session_id} is already running. Cancelling it before starting a new one.")
-                old_task.cancel()
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        if last_event_id is not None:
+            try:
+                last_event_id = int(last_event_id)
+            except ValueError:
+                return JsonResponse({'error': 'Last-Event-ID must be an integer'}, status=400)
+            run = RUN_MANAGER.get(session_id)
+            if run is None:
+                # 204 tells EventSource to stop reconnecting: there is nothing left to resume.
+                logger.info(f"Client tried to resume session {session_id} from event {last_event_id}, but no run is buffered.")
+                return HttpResponse(status=204)
+            logger.info(f"Client resumed session {session_id} from event {last_event_id}.")
+            response = StreamingHttpResponse(self.stream_run_frames(run, last_event_id), content_type='text/event-stream')
+            response['X-Accel-Buffering'] = 'no'
+            response['Cache-Control'] = 'no-cache'
+            return response
 
         response = StreamingHttpResponse(
             self.stream_wrapper(request, validated_data['prompt'], validated_data['model_id'], session_id),
@@ -505,36 +738,158 @@ class PromptAPIViewAsync(View):
     async def get(self, request, *args, **kwargs):
         return await self._handle_request_async(request)
 
-class FileSystemView(View):
+class RunsView(View):
     def get(self, request, *args, **kwargs):
         """
-        Lists all files and directories within the AGENT_OUTPUT_DIR.
+        Lists the active, queued and recently finished runs in this process, with their age.
         """
-        try:
-            base_path = AGENT_OUTPUT_DIR
-            if not os.path.exists(base_path) or not os.path.isdir(base_path):
-                return JsonResponse({"error": "Agent output directory not found."}, status=404)
+        return JsonResponse(RUN_MANAGER.snapshot())
 
-            file_list = []
-            for entry in os.scandir(base_path):
-                
-                if entry.is_file():
-                    file_stat = entry.stat()
-                    file_list.append({
-                        "name": entry.name,
-                        "path": entry.name,  
-                        "size_bytes": file_stat.st_size,
-                        "modified_at": file_stat.st_mtime,
-                    })
+class MetricsView(View):
+    async def get(self, request, *args, **kwargs):
+        """
+        Prometheus metrics for this process: run queue, SSE traffic, model call latency, time to first
+        token, tokens and cost per model, tool call latency, cache hit counts and event-loop lag.
+        """
+        EVENT_LOOP_LAG.ensure_started()
+        return HttpResponse(REGISTRY.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+class RunTraceView(View):
+    def get(self, request, *args, **kwargs):
+        """
+        Returns the waterfall of a run's trace: its planner, step, agent, model and tool call spans in
+        order, with offsets from the start of the run, durations, tokens and time to first token.
+        Expects 'trace_id', or 'session_id' for the session's latest run. With 'format=text' it returns
+        the waterfall drawn as text bars instead.
+        """
+        trace_id = request.GET.get('trace_id')
+        session_id = request.GET.get('session_id')
+        if not trace_id and not session_id:
+            return JsonResponse({"error": "Provide 'trace_id' or 'session_id'."}, status=400)
+        waterfall = get_trace_store().get_waterfall(trace_id=trace_id, session_id=session_id)
+        if not waterfall:
+            return JsonResponse({"error": "Trace not found."}, status=404)
+        if request.GET.get('format') == 'text':
+            return HttpResponse(render_waterfall_text(waterfall), content_type='text/plain; charset=utf-8')
+        return JsonResponse(waterfall)
+
+class PlanStateView(View):
+    def get(self, request, *args, **kwargs):
+        """
+        Returns the state of a plan: every task with its status, start/finish timestamps and duration.
+        Expects 'plan_id', or 'session_id' for the session's latest plan. With 'format=markdown' it
+        returns the plan's checklist rendered from the current state instead.
+        """
+        plan_store = get_plan_store()
+        plan_id = request.GET.get('plan_id')
+        if not plan_id:
+            session_id = request.GET.get('session_id')
+            if not session_id:
+                return JsonResponse({"error": "Provide 'plan_id' or 'session_id'."}, status=400)
+            plan_id = plan_store.latest_plan_id(session_id)
+            if plan_id is None:
+                return JsonResponse({"error": "No plan found for this session."}, status=404)
 
-            file_list.sort(key=lambda x: x['modified_at'], reverse=True)
+        if request.GET.get('format') == 'markdown':
+            markdown = plan_store.render_markdown(plan_id)
+            if markdown is None:
+                return JsonResponse({"error": "Plan not found."}, status=404)
+            return HttpResponse(markdown, content_type='text/markdown; charset=utf-8')
+
+        plan = plan_store.get_plan(plan_id)
+        if plan is None:
+            return JsonResponse({"error": "Plan not found."}, status=404)
+        return JsonResponse(plan)
+
+_LISTING_PAGE_PARAMS = ('dir', 'recursive', 'prefix', 'sort', 'order', 'limit', 'cursor')
+
+class FileSystemView(View):
+    def get(self, request, *args, **kwargs):
+        """
+        Lists the files within the AGENT_OUTPUT_DIR, newest first, from the in-memory workspace tree.
 
-            return JsonResponse(file_list, safe=False)
+        With any of 'dir', 'recursive', 'prefix', 'sort', 'order', 'limit' or 'cursor' it returns a page
+        of files and directories instead: the entries of 'dir' (all of them below it with 'recursive=1'),
+        whose path relative to 'dir' starts with 'prefix', sorted by 'modified', 'path' or 'size'.
+        Pass the returned 'next_cursor' as 'cursor' to get the next page.
+        """
+        try:
+            tree = get_workspace_tree()
+            if not any(param in request.GET for param in _LISTING_PAGE_PARAMS):
+                return JsonResponse(tree.files_in(""), safe=False)
 
+            order = request.GET.get('order')
+            if order not in (None, 'asc', 'desc'):
+                return JsonResponse({"error": "'order' must be 'asc' or 'desc'."}, status=400)
+            try:
+                limit = min(max(1, int(request.GET.get('limit', 100))), settings.WORKSPACE_LIST_MAX_PAGE_SIZE)
+            except ValueError:
+                return JsonResponse({"error": "'limit' must be an integer."}, status=400)
+
+            page = tree.list_entries(
+                directory=request.GET.get('dir', ''),
+                recursive=request.GET.get('recursive', '').lower() in ('1', 'true', 'yes'),
+                prefix=request.GET.get('prefix', ''),
+                sort=request.GET.get('sort', 'modified'),
+                descending=None if order is None else order == 'desc',
+                limit=limit,
+                cursor=request.GET.get('cursor'),
+            )
+            return JsonResponse(page)
+
+        except KeyError:
+            return JsonResponse({"error": "Directory not found."}, status=404)
+        except ValueError as e:
+            return JsonResponse({"error": f"Invalid listing parameters: {e}"}, status=400)
         except Exception as e:
             logger.error(f"Error listing files: {e}")
             return JsonResponse({"error": "An error occurred while listing files."}, status=500)
 
+class FileSearchView(View):
+    def get(self, request, *args, **kwargs):
+        """
+        Full-text search over the files in AGENT_OUTPUT_DIR.
+        Expects a 'q' query parameter; 'page' (from 1) and 'page_size' are optional.
+        """
+        query = request.GET.get('q', '').strip()
+        if not query:
+            return JsonResponse({"error": "Missing 'q' query parameter."}, status=400)
+        try:
+            page = max(1, int(request.GET.get('page', 1)))
+            page_size = min(max(1, int(request.GET.get('page_size', 20))), settings.WORKSPACE_SEARCH_MAX_PAGE_SIZE)
+        except ValueError:
+            return JsonResponse({"error": "'page' and 'page_size' must be integers."}, status=400)
+
+        try:
+            return JsonResponse(get_workspace_index().search(query, page=page, page_size=page_size))
+        except Exception as e:
+            logger.error(f"Error searching files for '{query}': {e}", exc_info=True)
+            return JsonResponse({"error": "An error occurred while searching files."}, status=500)
+
+class WorkspaceEventsView(View):
+    async def get(self, request, *args, **kwargs):
+        """
+        Streams file_change events (created/modified/deleted, with size and mtime) for AGENT_OUTPUT_DIR
+        over SSE, so the client doesn't have to poll /api/files/list/. Expects a 'session_id' query
+        parameter; resumes after 'Last-Event-ID' when the browser reconnects.
+        """
+        session_id = request.GET.get('session_id')
+        if not session_id:
+            return JsonResponse({"error": "Missing 'session_id' query parameter."}, status=400)
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        if last_event_id is not None:
+            try:
+                last_event_id = int(last_event_id)
+            except ValueError:
+                return JsonResponse({'error': 'Last-Event-ID must be an integer'}, status=400)
+
+        WORKSPACE_CHANGES.start()
+        response = StreamingHttpResponse(WORKSPACE_CHANGES.subscribe(session_id, last_event_id),
+                                         content_type='text/event-stream')
+        response['X-Accel-Buffering'] = 'no'
+        response['Cache-Control'] = 'no-cache'
+        return response
+
 class FileDownloadView(View):
     def get(self, request, *args, **kwargs):
         """
@@ -570,11 +925,16 @@ class FileDownloadView(View):
 
 class FileContentView(View):
     def get(self, request):
+        """
+        Serves a file from the agent_outputs directory for viewing, streamed in chunks.
+        Supports single byte `Range` requests (with `If-Range`), conditional GETs with `If-None-Match`
+        and `If-Modified-Since`, and `?max_bytes=N`, which returns only the first N bytes of a text file.
+        """
         relative_path = request.GET.get('path')
         if not relative_path:
             return JsonResponse({'error': 'File path not provided'}, status=400)
 
-        base_dir = os.path.abspath(os.path.join(settings.BASE_DIR, 'agent_outputs'))
+        base_dir = os.path.abspath(AGENT_OUTPUT_DIR)
         absolute_requested_path = os.path.abspath(os.path.join(base_dir, relative_path))
 
         if not absolute_requested_path.startswith(base_dir):
@@ -585,32 +945,67 @@ class FileContentView(View):
             logger.warning(f"File not found at path: {absolute_requested_path}")
             raise Http404("File does not exist.")
 
+        max_bytes = request.GET.get('max_bytes')
+        if max_bytes is not None:
+            try:
+                max_bytes = int(max_bytes)
+            except ValueError:
+                max_bytes = 0
+            if max_bytes <= 0:
+                return JsonResponse({'error': "'max_bytes' must be a positive integer"}, status=400)
+
         try:
-            
+            file_stat = os.stat(absolute_requested_path)
             content_type, _ = mimetypes.guess_type(absolute_requested_path)
             if content_type is None:
                 content_type = 'application/octet-stream'  
 
-            with open(absolute_requested_path, 'rb') as f:
-                binary_content = f.read()
-
             is_text_based = content_type.startswith('text/') or content_type in ['application/json', 'application/xml']
+            response_content_type = f'{content_type}; charset=utf-8' if is_text_based else content_type
+            is_preview = is_text_based and max_bytes is not None and file_stat.st_size > max_bytes
+
+            etag = file_etag(file_stat)
+            last_modified = http_date(file_stat.st_mtime)
+            # A preview is a different representation of the file, so it gets its own validator.
+            response_etag = f'{etag[:-1]}-head{max_bytes:x}"' if is_preview else etag
+            validator_headers = {'ETag': response_etag, 'Last-Modified': last_modified, 'Cache-Control': 'private, no-cache'}
+
+            if_none_match = request.headers.get('If-None-Match')
+            if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+            if (etag_matches(if_none_match, response_etag) if if_none_match
+                    else if_modified_since is not None and int(file_stat.st_mtime) <= if_modified_since):
+                return HttpResponse(status=304, headers=validator_headers)
+
+            if is_preview:
+                logger.info(f"Serving the first {max_bytes} of {file_stat.st_size} bytes of {relative_path}.")
+                response = HttpResponse(read_text_head(absolute_requested_path, max_bytes),
+                                        content_type=response_content_type, headers=validator_headers)
+                response['X-Content-Truncated'] = 'true'
+                response['X-Content-Total-Bytes'] = str(file_stat.st_size)
+                return response
 
-            if is_text_based:
-                
+            byte_range = None
+            range_header = request.headers.get('Range')
+            if range_header and request.headers.get('If-Range', etag) in (etag, last_modified):
                 try:
-                    content = binary_content.decode('utf-8')
-                    logger.info(f"Successfully decoded {relative_path} as utf-8.")
-                except UnicodeDecodeError:
-                    logger.warning(f"Failed to decode {relative_path} as utf-8. Falling back to latin-1.")
-                    content = binary_content.decode('latin-1')
-
-                response_content_type = f'{content_type}; charset=utf-8'
-                return HttpResponse(content, content_type=response_content_type)
+                    byte_range = parse_byte_range(range_header, file_stat.st_size)
+                except UnsatisfiableRange:
+                    return HttpResponse(status=416, headers={'Content-Range': f'bytes */{file_stat.st_size}'})
+
+            if byte_range:
+                range_start, range_end = byte_range
+                response = StreamingHttpResponse(
+                    aiter_file(absolute_requested_path, range_start, range_end - range_start + 1),
+                    status=206, content_type=response_content_type, headers=validator_headers)
+                response['Content-Range'] = f'bytes {range_start}-{range_end}/{file_stat.st_size}'
+                response['Content-Length'] = str(range_end - range_start + 1)
             else:
-                
-                logger.info(f"Serving binary file {relative_path} with content type {content_type}.")
-                return HttpResponse(binary_content, content_type=content_type)
+                # Bounded by the stat'ed size, so a file agents are still appending to can't outgrow Content-Length.
+                response = StreamingHttpResponse(aiter_file(absolute_requested_path, 0, file_stat.st_size),
+                                                 content_type=response_content_type, headers=validator_headers)
+                response['Content-Length'] = str(file_stat.st_size)
+            response['Accept-Ranges'] = 'bytes'
+            return response
 
         except IOError as e:
             logger.error(f"IOError reading file {absolute_requested_path}: {e}")
@@ -621,15 +1016,17 @@ class FileContentView(View):
 
 class AvailableModelsView(APIView):
     """
-    Provides a list of all models from the static JSON file.
+    Provides a list of all models from the model catalog, with an ETag so clients can revalidate cheaply.
     """
     def get(self, request, *args, **kwargs):
         try:
-            
-            grouped_models = get_available_models_grouped()
+            grouped_models, etag = MODEL_CATALOG.grouped_with_etag()
             if not grouped_models:
                 return Response({"error": "Model list is empty or not found. Please run the generation script."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            return Response(grouped_models, status=status.HTTP_200_OK)
+            cache_headers = {"ETag": etag, "Cache-Control": f"private, max-age={settings.MODEL_LIST_MAX_AGE_SECONDS}"}
+            if etag in [tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")]:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+            return Response(grouped_models, status=status.HTTP_200_OK, headers=cache_headers)
         except Exception as e:
             logger.error(f"Error serving available models from file: {e}")
             return Response({"error": "Could not retrieve model list."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
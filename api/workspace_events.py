@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import deque
+
+from django.conf import settings
+from watchdog.events import FileSystemEventHandler
+
+from api.sse import format_sse
+from api.workspace_watcher import WORKSPACE_WATCHER, WorkspaceWatcher
+
+logger = logging.getLogger(__name__)
+
+
+class WorkspaceChangeHub(FileSystemEventHandler):
+    """
+    Turns the watcher's raw events into `file_change` SSE events for the connected sessions.
+
+    Raw events are collected for `debounce_seconds` after the first one, then each touched path is
+    reported once, as it is on disk at that moment: `created`, `modified` or `deleted`, with its size
+    and mtime (a file that appeared and vanished within the window is not reported at all). Events are
+    numbered and the last `history_size` are kept, so a client reconnecting with `Last-Event-ID` gets
+    what it missed, or a `resync` event if that is no longer available.
+    Each session has at most one live subscription; a new one for the same session ends the old one.
+    """
+
+    def __init__(self, watcher: WorkspaceWatcher | None = None, debounce_seconds: float | None = None,
+                 history_size: int | None = None, heartbeat_seconds: float | None = None):
+        self.watcher = watcher or WORKSPACE_WATCHER
+        self.debounce_seconds = (debounce_seconds if debounce_seconds is not None
+                                 else getattr(settings, 'WORKSPACE_EVENTS_DEBOUNCE_SECONDS', 0.3))
+        self.heartbeat_seconds = (heartbeat_seconds if heartbeat_seconds is not None
+                                  else getattr(settings, 'WORKSPACE_EVENTS_HEARTBEAT_SECONDS', 15))
+        self._history: deque[tuple[int, dict]] = deque(
+            maxlen=max(1, history_size if history_size is not None else getattr(settings, 'WORKSPACE_EVENTS_HISTORY_SIZE', 1000)))
+        self.last_event_id = 0
+        self._pending: dict[str, tuple[str, bool]] = {}
+        self._flush_timer: threading.Timer | None = None
+        self._subscribers: dict[str, tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.watcher.add_handler(self)
+        self.watcher.start()
+
+    # Watcher side (observer thread).
+
+    def on_created(self, event):
+        self._note(event.src_path, "created", event.is_directory)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._note(event.src_path, "modified", False)
+
+    def on_deleted(self, event):
+        self._note(event.src_path, "deleted", event.is_directory)
+
+    def on_moved(self, event):
+        self._note(event.src_path, "deleted", event.is_directory)
+        self._note(event.dest_path, "created", event.is_directory)
+
+    def _note(self, absolute_path: str, change: str, is_dir: bool):
+        with self._lock:
+            # The first change seen in the window decides between created and modified.
+            self._pending.setdefault(absolute_path, (change, is_dir))
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.debounce_seconds, self._flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def _describe(self, absolute_path: str, first_change: str, was_dir: bool) -> dict | None:
+        relative_path = os.path.relpath(absolute_path, self.watcher.root)
+        if relative_path == "." or relative_path.startswith(".."):
+            return None
+        event = {"type": "file_change", "path": relative_path.replace(os.sep, "/"),
+                 "name": os.path.basename(absolute_path)}
+        try:
+            stat = os.stat(absolute_path)
+        except OSError:
+            if first_change == "created":
+                return None
+            return {**event, "change": "deleted", "is_dir": was_dir, "size_bytes": None, "modified_at": None}
+        is_dir = os.path.isdir(absolute_path)
+        return {**event, "change": "created" if first_change == "created" else "modified", "is_dir": is_dir,
+                "size_bytes": None if is_dir else stat.st_size, "modified_at": stat.st_mtime}
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flush_timer = None
+        events = [event for event in (self._describe(path, change, is_dir) for path, (change, is_dir) in pending.items())
+                  if event is not None]
+        if not events:
+            return
+        with self._lock:
+            numbered = []
+            for event in events:
+                self.last_event_id += 1
+                numbered.append((self.last_event_id, event))
+            self._history.extend(numbered)
+            subscribers = list(self._subscribers.values())
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, numbered)
+            except RuntimeError:
+                # The subscriber's event loop is closed; its generator cleans up the registration.
+                pass
+
+    # Client side (event loop).
+
+    async def subscribe(self, session_id: str, last_event_id: int | None = None):
+        """Yields SSE frames with the workspace changes for one session until the client disconnects."""
+        queue: asyncio.Queue = asyncio.Queue()
+        subscription = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            previous = self._subscribers.get(session_id)
+            self._subscribers[session_id] = subscription
+            missed = [(event_id, event) for event_id, event in self._history
+                      if last_event_id is not None and event_id > last_event_id]
+            oldest_id = self._history[0][0] if self._history else self.last_event_id + 1
+            current_id = self.last_event_id
+        if previous is not None:
+            previous[0].call_soon_threadsafe(previous[1].put_nowait, None)
+            logger.info(f"Workspace events: Session {session_id} reconnected, closing its previous stream.")
+
+        try:
+            if last_event_id is not None and last_event_id + 1 < oldest_id and last_event_id < current_id:
+                yield f"id: {current_id}\n".encode('utf-8') + format_sse(
+                    {"type": "resync", "message": "Missed workspace changes are no longer available. Reload the file list."})
+            else:
+                yield format_sse({"type": "workspace_events_ready", "last_event_id": current_id})
+            for event_id, event in missed:
+                yield f"id: {event_id}\n".encode('utf-8') + format_sse(event)
+            cursor = missed[-1][0] if missed else current_id
+            while True:
+                try:
+                    batch = await asyncio.wait_for(queue.get(), timeout=self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if batch is None:
+                    return
+                for event_id, event in batch:
+                    if event_id > cursor:
+                        cursor = event_id
+                        yield f"id: {event_id}\n".encode('utf-8') + format_sse(event)
+        finally:
+            with self._lock:
+                if self._subscribers.get(session_id) is subscription:
+                    del self._subscribers[session_id]
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+WORKSPACE_CHANGES = WorkspaceChangeHub()
@@ -0,0 +1,294 @@
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from watchdog.events import FileSystemEventHandler
+
+from api.config import AGENT_OUTPUT_DIR
+from api.workspace_watcher import WORKSPACE_WATCHER, WorkspaceWatcher
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size_bytes INTEGER NOT NULL,
+    modified_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS file_text USING fts5(path, content, tokenize = 'porter unicode61');
+"""
+
+# The text of these files is indexed; other files are only findable by their path.
+_TEXT_EXTENSIONS = frozenset({".md", ".markdown", ".txt", ".json", ".csv", ".tsv", ".yaml", ".yml", ".xml",
+                              ".html", ".htm", ".py", ".js", ".ts", ".css", ".sql", ".log", ".rst", ".ini", ".toml"})
+_QUERY_TOKEN = re.compile(r"\w+", re.UNICODE)
+_STOP = object()
+
+
+def build_match_query(query: str) -> str | None:
+    """
+    Turns free text into an FTS5 query that matches documents containing every word, the last one as a
+    prefix (so results show up while the user is typing). FTS5 operators in the input are not interpreted.
+    """
+    tokens = _QUERY_TOKEN.findall(query)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+class _WorkspaceEventHandler(FileSystemEventHandler):
+    def __init__(self, index):
+        self.index = index
+
+    def on_created(self, event):
+        self.index.enqueue(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.index.enqueue(event.src_path)
+
+    def on_deleted(self, event):
+        self.index.enqueue(event.src_path)
+
+    def on_moved(self, event):
+        self.index.enqueue(event.src_path)
+        self.index.enqueue(event.dest_path)
+
+
+class WorkspaceIndex:
+    """
+    Full-text index of the files under `root`, in an SQLite FTS5 table at `db_path`.
+
+    `start()` reconciles the index with the disk once, re-reading only files whose size or mtime
+    changed since they were indexed, then keeps it current from the events of `watcher` (a watcher of
+    its own if none is given). All writes happen on
+    one background thread, which batches the changed paths of each burst of events (agents write a
+    file in several steps) before re-indexing them. Searches open their own connection and never wait
+    for the writer (the database is in WAL mode).
+    """
+
+    def __init__(self, root=None, db_path=None, max_file_bytes: int | None = None,
+                 debounce_seconds: float | None = None, watcher: WorkspaceWatcher | None = None):
+        self.root = os.path.realpath(str(root or AGENT_OUTPUT_DIR))
+        self._owns_watcher = watcher is None
+        self.watcher = watcher or WorkspaceWatcher(self.root)
+        self._event_handler = _WorkspaceEventHandler(self)
+        self.db_path = str(db_path or getattr(settings, 'WORKSPACE_INDEX_DB_PATH', settings.BASE_DIR / "workspace_index.db"))
+        self.max_file_bytes = (max_file_bytes if max_file_bytes is not None
+                               else getattr(settings, 'WORKSPACE_INDEX_MAX_FILE_BYTES', 2 * 1024 * 1024))
+        self.debounce_seconds = (debounce_seconds if debounce_seconds is not None
+                                 else getattr(settings, 'WORKSPACE_INDEX_DEBOUNCE_SECONDS', 0.5))
+        self._pending: queue.Queue = queue.Queue()
+        self._writer = None
+        self._start_lock = threading.Lock()
+        self.ready = threading.Event()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _relative_path(self, absolute_path: str) -> str | None:
+        relative_path = os.path.relpath(os.path.realpath(absolute_path), self.root)
+        if relative_path == "." or relative_path.startswith(".."):
+            return None
+        return relative_path.replace(os.sep, "/")
+
+    def start(self):
+        """Starts the writer thread and subscribes to the watcher. Safe to call more than once."""
+        with self._start_lock:
+            if self._writer is not None:
+                return
+            os.makedirs(self.root, exist_ok=True)
+            self._writer = threading.Thread(target=self._run_writer, name="workspace-index", daemon=True)
+            self._writer.start()
+            self.watcher.add_handler(self._event_handler)
+            self.watcher.start()
+
+    def stop(self):
+        with self._start_lock:
+            self.watcher.remove_handler(self._event_handler)
+            if self._owns_watcher:
+                self.watcher.stop()
+            if self._writer is not None:
+                self._pending.put(_STOP)
+                self._writer.join()
+                self._writer = None
+
+    def enqueue(self, absolute_path: str):
+        self._pending.put(absolute_path)
+
+    def _run_writer(self):
+        conn = self._connect()
+        try:
+            started = time.monotonic()
+            counts = self.sync(conn)
+            logger.info(f"WorkspaceIndex: Initial sync took {time.monotonic() - started:.2f}s ({counts}).")
+        except Exception as e:
+            logger.error(f"WorkspaceIndex: Initial sync failed: {e}", exc_info=True)
+        self.ready.set()
+        while True:
+            paths = {self._pending.get()}
+            # Let the burst of events for one write settle, then apply everything it touched at once.
+            time.sleep(self.debounce_seconds)
+            while True:
+                try:
+                    paths.add(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in paths
+            paths.discard(_STOP)
+            try:
+                with conn:
+                    for path in paths:
+                        self._refresh_path(conn, path)
+            except Exception as e:
+                logger.error(f"WorkspaceIndex: Failed to update the index for {len(paths)} paths: {e}", exc_info=True)
+            if stop:
+                conn.close()
+                return
+
+    def _refresh_path(self, conn: sqlite3.Connection, absolute_path: str):
+        relative_path = self._relative_path(absolute_path)
+        if relative_path is None:
+            return
+        if os.path.isdir(absolute_path):
+            for dirpath, _, filenames in os.walk(absolute_path):
+                for filename in filenames:
+                    file_path = os.path.join(dirpath, filename)
+                    self._index_file(conn, file_path, self._relative_path(file_path))
+        elif os.path.isfile(absolute_path):
+            self._index_file(conn, absolute_path, relative_path)
+        else:
+            # Deleted, or moved away: drop the path and anything that was below it.
+            self._remove(conn, relative_path)
+
+    def _index_file(self, conn: sqlite3.Connection, absolute_path: str, relative_path: str | None,
+                    known: tuple | None = None) -> bool:
+        """Indexes one file unless its size and mtime match the indexed version. Returns True if it was re-read."""
+        if relative_path is None:
+            return False
+        try:
+            stat = os.stat(absolute_path)
+        except OSError:
+            self._remove(conn, relative_path)
+            return False
+        if known is None:
+            known = conn.execute("SELECT id, size_bytes, modified_at FROM files WHERE path = ?", (relative_path,)).fetchone()
+        if known is not None and known[1] == stat.st_size and known[2] == stat.st_mtime:
+            return False
+
+        content = ""
+        if os.path.splitext(absolute_path)[1].lower() in _TEXT_EXTENSIONS and stat.st_size <= self.max_file_bytes:
+            try:
+                with open(absolute_path, "rb") as f:
+                    content = f.read().decode("utf-8", errors="replace")
+            except OSError as e:
+                logger.warning(f"WorkspaceIndex: Could not read {relative_path}: {e}")
+
+        if known is not None:
+            conn.execute("DELETE FROM file_text WHERE rowid = ?", (known[0],))
+            conn.execute("UPDATE files SET size_bytes = ?, modified_at = ? WHERE id = ?",
+                         (stat.st_size, stat.st_mtime, known[0]))
+            file_id = known[0]
+        else:
+            file_id = conn.execute("INSERT INTO files (path, size_bytes, modified_at) VALUES (?, ?, ?)",
+                                   (relative_path, stat.st_size, stat.st_mtime)).lastrowid
+        conn.execute("INSERT INTO file_text (rowid, path, content) VALUES (?, ?, ?)", (file_id, relative_path, content))
+        return True
+
+    def _remove(self, conn: sqlite3.Connection, relative_path: str):
+        prefix = relative_path.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "/%"
+        where = "path = ? OR path LIKE ? ESCAPE '\\'"
+        conn.execute(f"DELETE FROM file_text WHERE rowid IN (SELECT id FROM files WHERE {where})", (relative_path, prefix))
+        conn.execute(f"DELETE FROM files WHERE {where}", (relative_path, prefix))
+
+    def sync(self, conn: sqlite3.Connection | None = None) -> dict:
+        """Brings the whole index in line with the disk: indexes new and changed files, drops missing ones."""
+        own_conn = conn is None
+        conn = conn or self._connect()
+        try:
+            known = {path: (file_id, size, mtime) for file_id, path, size, mtime
+                     in conn.execute("SELECT id, path, size_bytes, modified_at FROM files")}
+            seen = set()
+            reindexed = 0
+            with conn:
+                for dirpath, _, filenames in os.walk(self.root):
+                    for filename in filenames:
+                        absolute_path = os.path.join(dirpath, filename)
+                        # os.walk starts from the resolved root, so no need to resolve every file again.
+                        relative_path = os.path.relpath(absolute_path, self.root).replace(os.sep, "/")
+                        seen.add(relative_path)
+                        if self._index_file(conn, absolute_path, relative_path, known.get(relative_path)):
+                            reindexed += 1
+                missing = [path for path in known if path not in seen]
+                for path in missing:
+                    conn.execute("DELETE FROM file_text WHERE rowid = ?", (known[path][0],))
+                    conn.execute("DELETE FROM files WHERE id = ?", (known[path][0],))
+            return {"files": len(seen), "reindexed": reindexed, "removed": len(missing)}
+        finally:
+            if own_conn:
+                conn.close()
+
+    def search(self, query: str, page: int = 1, page_size: int = 20) -> dict:
+        """
+        Returns one page of the files matching `query`, best match first (BM25, with matches in the
+        path weighted above matches in the content), each with a snippet around the matched words.
+        `indexing` is true while the initial sync is still running, so results may be incomplete.
+        """
+        match_query = build_match_query(query)
+        result = {"query": query, "page": page, "page_size": page_size, "total": 0, "results": [],
+                  "indexing": self._writer is not None and not self.ready.is_set()}
+        if match_query is None:
+            return result
+        conn = self._connect()
+        try:
+            result["total"] = conn.execute("SELECT count(*) FROM file_text WHERE file_text MATCH ?",
+                                           (match_query,)).fetchone()[0]
+            rows = conn.execute(
+                """
+                SELECT files.path, files.size_bytes, files.modified_at,
+                       snippet(file_text, 1, '**', '**', '…', 16), bm25(file_text, 5.0, 1.0) AS score
+                FROM file_text JOIN files ON files.id = file_text.rowid
+                WHERE file_text MATCH ?
+                ORDER BY score
+                LIMIT ? OFFSET ?
+                """,
+                (match_query, page_size, (page - 1) * page_size),
+            ).fetchall()
+        finally:
+            conn.close()
+        result["results"] = [{
+            "name": os.path.basename(path),
+            "path": path,
+            "size_bytes": size_bytes,
+            "modified_at": modified_at,
+            "snippet": snippet,
+            "score": round(-score, 6),
+        } for path, size_bytes, modified_at, snippet, score in rows]
+        return result
+
+
+_WORKSPACE_INDEX = None
+_WORKSPACE_INDEX_LOCK = threading.Lock()
+
+
+def get_workspace_index() -> WorkspaceIndex:
+    """Returns the process-wide index of AGENT_OUTPUT_DIR, starting its watcher on first use."""
+    global _WORKSPACE_INDEX
+    with _WORKSPACE_INDEX_LOCK:
+        if _WORKSPACE_INDEX is None:
+            _WORKSPACE_INDEX = WorkspaceIndex(watcher=WORKSPACE_WATCHER)
+            _WORKSPACE_INDEX.start()
+        return _WORKSPACE_INDEX
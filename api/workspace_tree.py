@@ -0,0 +1,368 @@
+import base64
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+from watchdog.events import FileSystemEventHandler
+
+from api.config import AGENT_OUTPUT_DIR
+from api.workspace_watcher import WORKSPACE_WATCHER, WorkspaceWatcher
+
+logger = logging.getLogger(__name__)
+
+WORKSPACE_SORT_FIELDS = ("modified", "path", "size")
+
+
+class InvalidCursor(ValueError):
+    """The pagination cursor is malformed or was made for a different sort."""
+
+
+class WorkspaceEntry:
+    """A file or directory in the tree. For a directory, `size_bytes` and `file_count` cover everything below it."""
+
+    __slots__ = ("path", "is_dir", "size_bytes", "modified_at", "file_count", "children")
+
+    def __init__(self, path: str, is_dir: bool, size_bytes: int = 0, modified_at: float = 0.0):
+        self.path = path
+        self.is_dir = is_dir
+        self.size_bytes = size_bytes
+        self.modified_at = modified_at
+        self.file_count = 0 if is_dir else 1
+        self.children: set[str] | None = set() if is_dir else None
+
+    def sort_key(self, sort: str) -> tuple:
+        if sort == "modified":
+            return (self.modified_at, self.path)
+        if sort == "size":
+            return (self.size_bytes, self.path)
+        return (self.path,)
+
+    def as_dict(self) -> dict:
+        entry = {
+            "name": self.path.rsplit("/", 1)[-1],
+            "path": self.path,
+            "type": "directory" if self.is_dir else "file",
+            "size_bytes": self.size_bytes,
+            "modified_at": self.modified_at,
+        }
+        if self.is_dir:
+            entry["file_count"] = self.file_count
+        return entry
+
+
+def _parent_path(path: str) -> str:
+    return path.rsplit("/", 1)[0] if "/" in path else ""
+
+
+def encode_cursor(sort: str, key: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort, *key]).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        cursor_sort, *key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e))
+    if cursor_sort != sort or len(key) != (1 if sort == "path" else 2):
+        raise InvalidCursor("The cursor belongs to a different sort order.")
+    return tuple(key)
+
+
+class _TreeEventHandler(FileSystemEventHandler):
+    def __init__(self, tree):
+        self.tree = tree
+
+    def on_created(self, event):
+        self.tree.refresh(event.src_path)
+
+    def on_modified(self, event):
+        self.tree.refresh(event.src_path, rescan_dir=False)
+
+    def on_deleted(self, event):
+        self.tree.refresh(event.src_path)
+
+    def on_moved(self, event):
+        self.tree.refresh(event.src_path)
+        self.tree.refresh(event.dest_path)
+
+
+class WorkspaceTree:
+    """
+    In-memory copy of the directory tree under `root`, loaded once and then kept current from the
+    events of `watcher`, so listings never touch the disk.
+
+    Besides the tree itself, every entry is kept in one sorted list per sort order (by mtime, path
+    and size, ties broken by path). A page is a slice of one of those lists starting after the cursor
+    (the sort key of the last entry of the previous page), so paging stays stable while files change
+    and costs the same on the first page as on the last.
+    """
+
+    def __init__(self, root=None, watcher: WorkspaceWatcher | None = None):
+        self.root = os.path.realpath(str(root or AGENT_OUTPUT_DIR))
+        self._owns_watcher = watcher is None
+        self.watcher = watcher or WorkspaceWatcher(self.root)
+        self._event_handler = _TreeEventHandler(self)
+        self._entries: dict[str, WorkspaceEntry] = {"": WorkspaceEntry("", is_dir=True)}
+        self._sorted: dict[str, list[tuple]] = {sort: [] for sort in WORKSPACE_SORT_FIELDS}
+        self._lock = threading.RLock()
+        # While the initial walk runs, the sorted lists are left alone and built in one go afterwards.
+        self._bulk_loading = False
+        self._started = False
+        self.ready = threading.Event()
+
+    def start(self):
+        """Subscribes to the watcher and loads the tree in a background thread. Safe to call more than once."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        os.makedirs(self.root, exist_ok=True)
+        # Subscribe first, so nothing written during the initial walk is missed.
+        self.watcher.add_handler(self._event_handler)
+        self.watcher.start()
+        threading.Thread(target=self._load, name="workspace-tree", daemon=True).start()
+
+    def stop(self):
+        self.watcher.remove_handler(self._event_handler)
+        if self._owns_watcher:
+            self.watcher.stop()
+
+    def _load(self):
+        started = time.monotonic()
+        try:
+            with self._lock:
+                self._bulk_loading = True
+            try:
+                self._scan_dir(self.root)
+            finally:
+                with self._lock:
+                    self._bulk_loading = False
+                    for sort in WORKSPACE_SORT_FIELDS:
+                        self._sorted[sort] = sorted(entry.sort_key(sort) for entry in self._entries.values() if entry.path)
+            logger.info(f"WorkspaceTree: Loaded {len(self._entries) - 1} entries from {self.root} "
+                        f"in {time.monotonic() - started:.2f}s.")
+        except Exception as e:
+            logger.error(f"WorkspaceTree: Failed to load {self.root}: {e}", exc_info=True)
+        finally:
+            self.ready.set()
+
+    def _relative_path(self, absolute_path: str) -> str | None:
+        relative_path = os.path.relpath(os.path.realpath(absolute_path), self.root)
+        if relative_path.startswith(".."):
+            return None
+        return "" if relative_path == "." else relative_path.replace(os.sep, "/")
+
+    # Mutations. All of them run under the lock.
+
+    def _index_add(self, entry: WorkspaceEntry):
+        if self._bulk_loading:
+            return
+        for sort, keys in self._sorted.items():
+            bisect.insort(keys, entry.sort_key(sort))
+
+    def _index_remove(self, entry: WorkspaceEntry):
+        if self._bulk_loading:
+            return
+        for sort, keys in self._sorted.items():
+            key = entry.sort_key(sort)
+            i = bisect.bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                del keys[i]
+
+    def _update(self, entry: WorkspaceEntry, size_bytes: int, modified_at: float, file_count: int | None = None):
+        if entry.path:
+            self._index_remove(entry)
+        entry.size_bytes = size_bytes
+        entry.modified_at = modified_at
+        if file_count is not None:
+            entry.file_count = file_count
+        if entry.path:
+            self._index_add(entry)
+
+    def _add_to_ancestors(self, path: str, size_delta: int, count_delta: int):
+        while path:
+            path = _parent_path(path)
+            ancestor = self._entries[path]
+            if size_delta or count_delta:
+                self._update(ancestor, ancestor.size_bytes + size_delta, ancestor.modified_at,
+                             ancestor.file_count + count_delta)
+
+    def _ensure_dir(self, path: str, modified_at: float | None = None) -> WorkspaceEntry:
+        entry = self._entries.get(path)
+        if entry is not None and entry.is_dir:
+            return entry
+        if entry is not None:
+            self._remove(path)
+        parent = self._ensure_dir(_parent_path(path))
+        if modified_at is None:
+            try:
+                modified_at = os.stat(os.path.join(self.root, path)).st_mtime
+            except OSError:
+                modified_at = time.time()
+        entry = self._entries[path] = WorkspaceEntry(path, is_dir=True, modified_at=modified_at)
+        parent.children.add(path)
+        self._index_add(entry)
+        return entry
+
+    def _put_file(self, path: str, size_bytes: int, modified_at: float):
+        entry = self._entries.get(path)
+        if entry is not None and entry.is_dir:
+            self._remove(path)
+            entry = None
+        if entry is None:
+            self._ensure_dir(_parent_path(path)).children.add(path)
+            entry = self._entries[path] = WorkspaceEntry(path, is_dir=False, size_bytes=size_bytes,
+                                                         modified_at=modified_at)
+            self._index_add(entry)
+            self._add_to_ancestors(path, size_bytes, 1)
+        elif (entry.size_bytes, entry.modified_at) != (size_bytes, modified_at):
+            size_delta = size_bytes - entry.size_bytes
+            self._update(entry, size_bytes, modified_at)
+            self._add_to_ancestors(path, size_delta, 0)
+
+    def _remove(self, path: str):
+        entry = self._entries.get(path)
+        if entry is None or not path:
+            return
+        stack = [entry]
+        while stack:
+            removed = stack.pop()
+            if removed.is_dir:
+                stack.extend(self._entries[child] for child in removed.children)
+            del self._entries[removed.path]
+            self._index_remove(removed)
+        self._entries[_parent_path(path)].children.discard(path)
+        self._add_to_ancestors(path, -entry.size_bytes, -entry.file_count)
+
+    def _scan_dir(self, absolute_path: str):
+        for dirpath, dirnames, filenames in os.walk(absolute_path):
+            relative_dir = self._relative_path(dirpath)
+            if relative_dir is None:
+                continue
+            with self._lock:
+                if relative_dir:
+                    self._ensure_dir(relative_dir)
+                for filename in filenames:
+                    try:
+                        stat = os.stat(os.path.join(dirpath, filename))
+                    except OSError:
+                        continue
+                    self._put_file(f"{relative_dir}/{filename}" if relative_dir else filename,
+                                   stat.st_size, stat.st_mtime)
+
+    def refresh(self, absolute_path: str, rescan_dir: bool = True):
+        """Brings the entry for `absolute_path` (and, for a directory, its contents if `rescan_dir`) in line with the disk."""
+        relative_path = self._relative_path(absolute_path)
+        if relative_path is None:
+            return
+        try:
+            stat = os.stat(absolute_path)
+        except OSError:
+            stat = None
+        with self._lock:
+            if stat is None:
+                self._remove(relative_path)
+            elif os.path.isdir(absolute_path):
+                entry = self._ensure_dir(relative_path, stat.st_mtime)
+                if entry.path and entry.modified_at != stat.st_mtime:
+                    self._update(entry, entry.size_bytes, stat.st_mtime)
+            else:
+                self._put_file(relative_path, stat.st_size, stat.st_mtime)
+        if stat is not None and rescan_dir and os.path.isdir(absolute_path):
+            self._scan_dir(absolute_path)
+
+    # Queries.
+
+    def list_entries(self, directory: str = "", recursive: bool = False, prefix: str = "", sort: str = "modified",
+             descending: bool | None = None, limit: int = 100, cursor: str | None = None,
+             timeout: float | None = 30) -> dict:
+        """
+        Returns one page of the entries in `directory` (everything below it if `recursive`) whose path
+        relative to `directory` starts with `prefix`. Sorting by mtime and size is newest/largest first
+        unless `descending` says otherwise. Raises KeyError if `directory` is not a known directory.
+        """
+        if sort not in WORKSPACE_SORT_FIELDS:
+            raise ValueError(f"Unknown sort '{sort}'.")
+        descending = sort != "path" if descending is None else descending
+        after = decode_cursor(cursor, sort) if cursor else None
+        self.ready.wait(timeout)
+        directory = directory.strip("/")
+        scope = f"{directory}/" if directory else ""
+        full_prefix = scope + prefix
+
+        with self._lock:
+            directory_entry = self._entries.get(directory)
+            if directory_entry is None or not directory_entry.is_dir:
+                raise KeyError(directory)
+
+            if recursive:
+                keys = self._sorted[sort]
+                path_keys = self._sorted["path"]
+                lo = bisect.bisect_left(path_keys, (full_prefix,))
+                hi = bisect.bisect_left(path_keys, (full_prefix + "\U0010ffff",))
+                total = hi - lo
+                if sort != "path":
+                    lo, hi = 0, len(keys)
+                matches = (lambda path: path.startswith(full_prefix)) if full_prefix and sort != "path" else None
+            else:
+                keys = sorted(self._entries[child].sort_key(sort) for child in directory_entry.children
+                              if child.startswith(full_prefix))
+                lo, hi = 0, len(keys)
+                total = len(keys)
+                matches = None
+
+            page = []
+            if descending:
+                i = min(hi, bisect.bisect_left(keys, after, lo, hi) if after is not None else hi) - 1
+                step = -1
+            else:
+                i = max(lo, bisect.bisect_right(keys, after, lo, hi) if after is not None else lo)
+                step = 1
+            while lo <= i < hi and len(page) <= limit:
+                key = keys[i]
+                if matches is None or matches(key[-1]):
+                    page.append(key)
+                i += step
+
+            has_more = len(page) > limit
+            page = page[:limit]
+            return {
+                "directory": directory,
+                "recursive": recursive,
+                "sort": sort,
+                "descending": descending,
+                "total": total,
+                "total_size_bytes": directory_entry.size_bytes,
+                "file_count": directory_entry.file_count,
+                "items": [self._entries[key[-1]].as_dict() for key in page],
+                "next_cursor": encode_cursor(sort, page[-1]) if has_more else None,
+            }
+
+    def files_in(self, directory: str = "", timeout: float | None = 30) -> list[dict]:
+        """The files directly in `directory`, newest first, in the original /api/files/list/ format."""
+        self.ready.wait(timeout)
+        with self._lock:
+            directory_entry = self._entries.get(directory.strip("/"))
+            if directory_entry is None or not directory_entry.is_dir:
+                raise KeyError(directory)
+            files = [self._entries[child] for child in directory_entry.children if not self._entries[child].is_dir]
+        files.sort(key=lambda entry: entry.modified_at, reverse=True)
+        return [{"name": entry.path.rsplit("/", 1)[-1], "path": entry.path, "size_bytes": entry.size_bytes,
+                 "modified_at": entry.modified_at} for entry in files]
+
+
+_WORKSPACE_TREE = None
+_WORKSPACE_TREE_LOCK = threading.Lock()
+
+
+def get_workspace_tree() -> WorkspaceTree:
+    """Returns the process-wide tree of AGENT_OUTPUT_DIR, loading it on first use."""
+    global _WORKSPACE_TREE
+    with _WORKSPACE_TREE_LOCK:
+        if _WORKSPACE_TREE is None:
+            _WORKSPACE_TREE = WorkspaceTree(watcher=WORKSPACE_WATCHER)
+            _WORKSPACE_TREE.start()
+        return _WORKSPACE_TREE
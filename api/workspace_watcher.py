@@ -0,0 +1,61 @@
+import logging
+import os
+import threading
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from api.config import AGENT_OUTPUT_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class WorkspaceWatcher(FileSystemEventHandler):
+    """
+    A single watchdog observer on a workspace directory that passes every event on to the handlers
+    added with `add_handler()`, so the search index, the listing tree and live notifications don't each
+    set up their own recursive watch. Handlers run on the observer thread and must be quick.
+    """
+
+    def __init__(self, root=None):
+        self.root = os.path.realpath(str(root or AGENT_OUTPUT_DIR))
+        self._handlers: list[FileSystemEventHandler] = []
+        self._observer = None
+        self._lock = threading.Lock()
+
+    def add_handler(self, handler: FileSystemEventHandler):
+        with self._lock:
+            self._handlers = [*self._handlers, handler]
+
+    def remove_handler(self, handler: FileSystemEventHandler):
+        with self._lock:
+            self._handlers = [h for h in self._handlers if h is not handler]
+
+    def on_any_event(self, event):
+        for handler in self._handlers:
+            try:
+                handler.dispatch(event)
+            except Exception as e:
+                logger.error(f"WorkspaceWatcher: {handler.__class__.__name__} failed on {event}: {e}", exc_info=True)
+
+    def start(self):
+        """Starts the observer. Safe to call more than once."""
+        with self._lock:
+            if self._observer is not None:
+                return
+            os.makedirs(self.root, exist_ok=True)
+            self._observer = Observer()
+            self._observer.schedule(self, self.root, recursive=True)
+            self._observer.daemon = True
+            self._observer.start()
+            logger.info(f"WorkspaceWatcher: Watching {self.root}.")
+
+    def stop(self):
+        with self._lock:
+            observer, self._observer = self._observer, None
+        if observer is not None:
+            observer.stop()
+            observer.join()
+
+
+WORKSPACE_WATCHER = WorkspaceWatcher()
@@ -0,0 +1,126 @@
+"""
+Micro-benchmarks for extracting the final JSON object from a streamed LLM response.
+
+Compares the old approach of `_call_agent_for_final_json` (string concatenation, then a backward
+`rfind('{')` search that re-parses ever-larger suffixes) with IncrementalJSONScanner.
+
+Run from the repository root:
+    python -m benchmarks.bench_json_extract [--sizes 100000 300000 600000] [--chunk-size 16] [--repeat 3]
+"""
+import argparse
+import json
+import time
+
+from api.json_stream import IncrementalJSONScanner
+
+
+def legacy_extract(chunks: list[str]):
+    """Returns (seconds spent after the last chunk arrived, extracted object)."""
+    full_response_str = ""
+    for chunk in chunks:
+        full_response_str += chunk
+    stream_ended = time.perf_counter()
+    try:
+        return time.perf_counter() - stream_ended, json.loads(full_response_str)
+    except json.JSONDecodeError:
+        pass
+    last_brace_index = full_response_str.rfind('}')
+    current_search_index = last_brace_index
+    while last_brace_index != -1 and current_search_index >= 0:
+        first_brace_index = full_response_str.rfind('{', 0, current_search_index + 1)
+        if first_brace_index == -1:
+            break
+        try:
+            return time.perf_counter() - stream_ended, json.loads(full_response_str[first_brace_index: last_brace_index + 1])
+        except json.JSONDecodeError:
+            current_search_index = first_brace_index - 1
+    return time.perf_counter() - stream_ended, None
+
+
+def scanner_extract(chunks: list[str]):
+    """Returns (seconds spent after the last chunk arrived, extracted object)."""
+    scanner = IncrementalJSONScanner()
+    for chunk in chunks:
+        scanner.feed(chunk)
+    stream_ended = time.perf_counter()
+    result = scanner.final_object()
+    return time.perf_counter() - stream_ended, result
+
+
+def make_response(size: int, scenario: str) -> str:
+    """Builds a response of roughly `size` characters that ends with the planner's wrapper object."""
+    final_object = json.dumps({"acknowledgment_message": "Plan created.", "plan_files_created": True,
+                               "markdown_plan_filename": "master_plan.md", "json_plan_filename": "master_plan.json",
+                               "error_message": None})
+    if scenario == "pure_json":
+        notes = []
+        while sum(len(n) for n in notes) < size:
+            notes.append(f"Step {len(notes)}: research {{topic}} and summarise the findings. ")
+        return json.dumps({**json.loads(final_object), "notes": "".join(notes)})
+    if scenario == "prose_then_json":
+        # Prose with many braces before the final object: every `{` is a failed candidate for the old heuristic.
+        sentence = "Working on {step} with config {'retries': 3} and some more reasoning text. "
+        prose = sentence * (size // len(sentence) + 1)
+        return prose + "\n```json\n" + final_object + "\n```"
+    if scenario == "nested_tasks":
+        tasks = []
+        while sum(len(t) for t in tasks) < size:
+            tasks.append(json.dumps({"description": f"Task {len(tasks)}", "agent_id": "ResearchAgent",
+                                     "inputs": ["NONE"], "outputs": [f"notes_{len(tasks)}.md"]}))
+        return "Here is the plan:\n[" + ",".join(tasks) + "]\nAnd the result:\n" + final_object
+    if scenario == "nested_trailing_brace":
+        # A report outline nested a few levels deep, followed by a stray `}` in the closing prose. The old
+        # heuristic re-parses the suffix from every `{` (cost grows with size x depth) and then gives up.
+        def section(depth):
+            node = {"title": f"Section at depth {depth}", "summary": "Key findings and sources."}
+            if depth < 6:
+                node["children"] = [section(depth + 1), section(depth + 1)]
+            return node
+        sections = []
+        while sum(len(json.dumps(s)) for s in sections[:1]) * len(sections) < size:
+            sections.append(section(0))
+        outline = {**json.loads(final_object), "outline": sections}
+        return json.dumps(outline) + "\nLet me know if the outline needs changes.}"
+    raise ValueError(scenario)
+
+
+SCENARIOS = ("pure_json", "prose_then_json", "nested_tasks", "nested_trailing_brace")
+
+
+def split_into_chunks(text: str, chunk_size: int) -> list[str]:
+    return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+
+def best_time(func, chunks: list[str], repeat: int) -> tuple[float, float, object]:
+    """Returns the best total time, the best time spent after the end of the stream, and the result."""
+    best_total = best_tail = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        tail, result = func(chunks)
+        best_total = min(best_total, time.perf_counter() - started)
+        best_tail = min(best_tail, tail)
+    return best_total, best_tail, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 300_000, 600_000])
+    parser.add_argument("--chunk-size", type=int, default=16, help="Characters per streamed chunk.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print("total = CPU time over the whole stream; at end = time between the last chunk and the result.")
+    print(f"{'scenario':<22} {'size':>8} {'legacy total':>13} {'at end':>8} {'scanner total':>14} {'at end':>8}")
+    for scenario in SCENARIOS:
+        for size in args.sizes:
+            chunks = split_into_chunks(make_response(size, scenario), args.chunk_size)
+            legacy_total, legacy_tail, legacy_result = best_time(legacy_extract, chunks, args.repeat)
+            scanner_total, scanner_tail, scanner_result = best_time(scanner_extract, chunks, args.repeat)
+            note = "" if legacy_result == scanner_result else "  (legacy found no JSON)" if legacy_result is None \
+                else "  (results differ)"
+            print(f"{scenario:<22} {size:>8} {legacy_total * 1000:>10.1f} ms {legacy_tail * 1000:>5.1f} ms "
+                  f"{scanner_total * 1000:>11.1f} ms {scanner_tail * 1000:>5.1f} ms{note}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+import os
+
+import django
+
+# Without pytest-benchmark every benchmark would error on the missing fixture, and `invoke bench` would
+# compare nothing, so stop right away instead.
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError as e:
+    raise ImportError("The benchmarks need pytest-benchmark: pip install -r requirements-dev.txt") from e
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+django.setup()
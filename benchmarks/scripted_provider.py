@@ -0,0 +1,192 @@
+"""
+An offline agno model provider for benchmarks: it plays back scripted responses with a configurable
+first-token latency, token rate and chunk size, so the orchestrator can be measured end to end without
+network calls or provider costs.
+
+The script is chosen from the request, the way the real agents would answer it:
+- the planner payload (`generate_initial_response_and_plan`) gets a JSON plan of `plan_steps` tasks;
+- the composer's outline payload (`outline_report`) gets one section per source, between a summary and conclusions;
+- a team leader that can delegate first calls `transfer_task_to_member` for the task's agent, then
+  reports the member's result;
+- everything else is a step answer of `step_tokens` tokens ending in a TASK_STEP_COMPLETED line.
+"""
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass
+from itertools import count
+
+from agno.models.base import Model
+from agno.models.response import ModelResponse
+from agno.utils.string import url_safe_string
+
+from api.agent_pool import AGENT_POOL, ModelAgentGraph
+from api.agents.step_executor import resolve_step_member_name
+from api.config import AGENT_OUTPUT_DIR
+from api.llm_registry import MODEL_CATALOG
+
+SCRIPTED_PROVIDER = "Scripted"
+_DELEGATION_TOOLS = ("transfer_task_to_member", "forward_task_to_member")
+_CHARS_PER_TOKEN = 4
+_FILLER = "The findings are summarised with their sources and the key numbers for the report. "
+
+
+def build_plan(plan_steps: int) -> dict:
+    """A plan of research tasks that can run in parallel, followed by a composer task that needs all of them."""
+    research_steps = max(1, plan_steps - 1)
+    tasks = [{"id": str(i + 1), "description": f"Research topic {i + 1} and save the notes.",
+              "call_name": f"research_topic_{i + 1}", "inputs": ["NONE"], "agent_id": "ResearchAgent",
+              "outputs": [f"bench_notes_{i + 1}.md"]} for i in range(research_steps)]
+    if plan_steps > 1:
+        tasks.append({"id": str(plan_steps), "description": "Compose the final report from the notes.",
+                      "call_name": "compose_report", "inputs": [task["outputs"][0] for task in tasks],
+                      "agent_id": "ComposerAgent", "outputs": ["bench_report.md"]})
+    return {"acknowledgment_message": "Got it. Here is the plan.", "tasks": tasks}
+
+
+def write_plan_notes(plan_steps: int, notes_tokens: int):
+    """Writes the notes files the research tasks of `build_plan` declare, about `notes_tokens` tokens each."""
+    paragraph = ("Finding: the market grew by 12% in 2024 according to the industry survey, with the largest gains "
+                 "in the enterprise segment. Source: Example Research, https://example.com/report.\n\n")
+    os.makedirs(AGENT_OUTPUT_DIR, exist_ok=True)
+    for task in build_plan(plan_steps)["tasks"]:
+        if task["agent_id"] != "ResearchAgent":
+            continue
+        with open(os.path.join(AGENT_OUTPUT_DIR, task["outputs"][0]), "w", encoding="utf-8") as f:
+            f.write(f"# Notes for task {task['id']}\n\n")
+            f.write(paragraph * (notes_tokens * _CHARS_PER_TOKEN // len(paragraph) + 1))
+
+
+def build_outline(outline_payload: dict) -> dict:
+    """An outline with an executive summary and conclusions over every source, and one section per source."""
+    source_ids = [source["id"] for source in outline_payload.get("sources", [])] or [1]
+    sections = [{"heading": f"Findings from {source['source']}", "brief": "The findings of this source.",
+                 "source_ids": [source["id"]]} for source in outline_payload.get("sources", [])]
+    return {"title": "Benchmark Report",
+            "sections": [{"heading": "Executive Summary", "brief": "The key findings.", "source_ids": source_ids},
+                         *sections,
+                         {"heading": "Conclusions", "brief": "What the findings mean.", "source_ids": source_ids}]}
+
+
+def _message_text(message) -> str:
+    content = message.content
+    return content if isinstance(content, str) else json.dumps(content, default=str) if content else ""
+
+
+@dataclass
+class ScriptedModel(Model):
+    id: str = "scripted-model"
+    name: str = "ScriptedModel"
+    provider: str = SCRIPTED_PROVIDER
+
+    first_token_latency_seconds: float = 0.3
+    # 0 streams as fast as the event loop allows.
+    tokens_per_second: float = 100.0
+    tokens_per_chunk: int = 3
+    plan_steps: int = 3
+    step_tokens: int = 200
+
+    def __post_init__(self):
+        super().__post_init__()
+        self._tool_call_ids = count(1)
+
+    # Scripts.
+
+    def _script(self, messages, tools) -> tuple[str, list[dict] | None]:
+        last_message = messages[-1] if messages else None
+        last_text = _message_text(last_message) if last_message else ""
+        if "generate_initial_response_and_plan" in last_text:
+            return json.dumps(build_plan(self.plan_steps)), None
+        if "outline_report" in last_text:
+            try:
+                outline_payload = json.loads(last_text)
+            except ValueError:
+                outline_payload = {}
+            return json.dumps(build_outline(outline_payload)), None
+
+        tool_names = {(tool.get("function") or {}).get("name") or tool.get("name") for tool in tools or []
+                      if isinstance(tool, dict)}
+        delegation_tool = next((name for name in _DELEGATION_TOOLS if name in tool_names), None)
+        if delegation_tool and last_message is not None and last_message.role == "user":
+            try:
+                task = json.loads(last_text)
+            except ValueError:
+                task = {}
+            member_name = resolve_step_member_name(task.get("agent_id")) or "ResearchAgent"
+            arguments = {"member_id": url_safe_string(member_name), "expected_output": "The task's result."}
+            if delegation_tool == "transfer_task_to_member":
+                arguments["task_description"] = task.get("description", last_text)
+            tool_call = {"id": f"call_{next(self._tool_call_ids)}", "type": "function",
+                         "function": {"name": delegation_tool, "arguments": json.dumps(arguments)}}
+            return f"Delegating to {member_name}.", [tool_call]
+
+        filler_chars = max(0, self.step_tokens * _CHARS_PER_TOKEN - 80)
+        body = (_FILLER * (filler_chars // len(_FILLER) + 1))[:filler_chars]
+        return f"{body}\nTASK_STEP_COMPLETED: Task completed. Output: \"N/A\". Result: done.", None
+
+    def _chunks(self, text: str) -> list[str]:
+        chunk_chars = max(1, self.tokens_per_chunk) * _CHARS_PER_TOKEN
+        return [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)]
+
+    def _chunk_delay(self) -> float:
+        return max(1, self.tokens_per_chunk) / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    @staticmethod
+    def _usage(messages, text: str) -> dict:
+        input_tokens = sum(len(_message_text(m)) for m in messages) // _CHARS_PER_TOKEN
+        return {"input_tokens": input_tokens, "output_tokens": len(text) // _CHARS_PER_TOKEN}
+
+    # agno provider interface. Raw responses are (kind, value) tuples.
+
+    def invoke(self, messages, response_format=None, tools=None, tool_choice=None, **kwargs):
+        text, tool_calls = self._script(messages, tools)
+        time.sleep(self.first_token_latency_seconds + self._chunk_delay() * len(self._chunks(text)))
+        return text, tool_calls, self._usage(messages, text)
+
+    async def ainvoke(self, messages, response_format=None, tools=None, tool_choice=None, **kwargs):
+        text, tool_calls = self._script(messages, tools)
+        await asyncio.sleep(self.first_token_latency_seconds + self._chunk_delay() * len(self._chunks(text)))
+        return text, tool_calls, self._usage(messages, text)
+
+    def invoke_stream(self, messages, response_format=None, tools=None, tool_choice=None, **kwargs):
+        text, tool_calls = self._script(messages, tools)
+        time.sleep(self.first_token_latency_seconds)
+        chunk_delay = self._chunk_delay()
+        for chunk in self._chunks(text):
+            if chunk_delay:
+                time.sleep(chunk_delay)
+            yield "content", chunk
+        if tool_calls:
+            yield "tool_calls", tool_calls
+        yield "usage", self._usage(messages, text)
+
+    async def ainvoke_stream(self, messages, response_format=None, tools=None, tool_choice=None, **kwargs):
+        text, tool_calls = self._script(messages, tools)
+        await asyncio.sleep(self.first_token_latency_seconds)
+        chunk_delay = self._chunk_delay()
+        for chunk in self._chunks(text):
+            # Yield to the loop even at unlimited speed, like a real network stream does.
+            await asyncio.sleep(chunk_delay)
+            yield "content", chunk
+        if tool_calls:
+            yield "tool_calls", tool_calls
+        yield "usage", self._usage(messages, text)
+
+    def parse_provider_response(self, response, **kwargs) -> ModelResponse:
+        text, tool_calls, usage = response
+        return ModelResponse(role="assistant", content=text, tool_calls=tool_calls or [], response_usage=usage)
+
+    def parse_provider_response_delta(self, response) -> ModelResponse:
+        kind, value = response
+        if kind == "content":
+            return ModelResponse(role="assistant", content=value)
+        if kind == "tool_calls":
+            return ModelResponse(role="assistant", tool_calls=value)
+        return ModelResponse(response_usage=value)
+
+
+def install_scripted_model(model: ScriptedModel):
+    """Makes `model` the only model the API offers, with its agents prebuilt in the pool."""
+    MODEL_CATALOG.use_models({SCRIPTED_PROVIDER: [{"id": model.id, "name": "Scripted benchmark model"}]})
+    AGENT_POOL.add_graph(ModelAgentGraph(SCRIPTED_PROVIDER, model.id, model))
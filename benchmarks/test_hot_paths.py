@@ -0,0 +1,149 @@
+"""
+pytest-benchmark suite for the functions on the orchestrator's per-chunk and per-step paths, with
+synthetic inputs sized like a busy run: long token streams, long plans and big markdown checklists.
+
+Baselines live in benchmarks/baselines/ so a regression shows up as a diff in review. Run from the
+repository root:
+    invoke bench              # compare against the stored baseline, fail on a >25% slower median
+    invoke bench-baseline     # re-measure and store a new baseline
+or directly:
+    python -m pytest benchmarks/test_hot_paths.py --benchmark-storage=file://benchmarks/baselines --benchmark-compare
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from api.json_stream import IncrementalJSONScanner
+from api.plan_scheduler import build_dependency_graph
+from api.plan_store import PlanStore
+from api.sse import SSEWriter, format_sse
+from api.utils import render_markdown_plan
+from api.views import parse_agno_tool_call_data
+from benchmarks.bench_json_extract import legacy_extract, make_response, split_into_chunks
+
+TOKEN_STREAM_LENGTH = 20_000
+PLAN_LENGTH = 200
+RESPONSE_SIZE = 100_000
+
+
+def make_tokens(count: int) -> list[str]:
+    words = ("The", " findings", " show", " that", " 42%", " of", " sources", " agree", ",", " while", "\n")
+    return [words[i % len(words)] for i in range(count)]
+
+
+def make_plan(task_count: int) -> list[dict]:
+    """Research tasks that each feed one of a few composer tasks, like a large generated plan."""
+    tasks = []
+    for i in range(task_count):
+        if i % 10 == 9:
+            tasks.append({"id": str(i + 1), "description": f"Compose section {i // 10 + 1} of the report from the notes.",
+                          "call_name": f"compose_section_{i // 10 + 1}", "agent_id": "ComposerAgent",
+                          "inputs": [f"notes_{j}.md" for j in range(i - 9, i)],
+                          "outputs": [f"section_{i // 10 + 1}.md"], "status": "pending"})
+        else:
+            tasks.append({"id": str(i + 1), "description": f"Research topic {i} in depth and save notes with sources.",
+                          "call_name": f"research_topic_{i}", "agent_id": "ResearchAgent", "inputs": ["NONE"],
+                          "outputs": [f"notes_{i}.md"], "status": "completed" if i % 3 else "pending"})
+    return tasks
+
+
+# format_sse and token coalescing: once per frame, thousands of times per run.
+
+def test_format_sse_token_frame(benchmark):
+    payload = {"type": "step_agent_activity", "step_index": 3, "event": "LLMToken", "data": "The findings show"}
+    benchmark(format_sse, payload)
+
+
+def test_format_sse_final_summary(benchmark):
+    payload = {"type": "final_summary", "content": "Report section. " * 2_000,
+               "llm_calls": [{"agent": "ResearchAgent", "input_tokens": 1200, "output_tokens": 800}] * 50}
+    benchmark(format_sse, payload)
+
+
+def test_sse_writer_token_stream(benchmark):
+    tokens = make_tokens(TOKEN_STREAM_LENGTH)
+    loop = asyncio.new_event_loop()
+    frames = []
+
+    async def emit(frame: bytes):
+        frames.append(frame)
+
+    async def stream():
+        writer = SSEWriter(emit, step_index=1, flush_interval_ms=50, flush_bytes=4096)
+        for token in tokens:
+            await writer.token(token)
+        await writer.close()
+
+    try:
+        benchmark(lambda: loop.run_until_complete(stream()))
+    finally:
+        loop.close()
+    assert frames
+
+
+# parse_agno_tool_call_data: once per tool-call event.
+
+def test_parse_tool_call_structured(benchmark):
+    chunk = SimpleNamespace(tool_calls=[{"name": "batch_search", "arguments": {"queries": ["a", "b", "c"]}}])
+    assert benchmark(parse_agno_tool_call_data, chunk)["tool_name"] == "batch_search"
+
+
+def test_parse_tool_call_formatted_regex(benchmark):
+    chunk = SimpleNamespace(formatted_tool_calls=["save_file(contents='" + "x" * 2_000 + "', file_name='notes.md')"])
+    assert benchmark(parse_agno_tool_call_data, chunk)["tool_name"] == "save_file"
+
+
+def test_parse_tool_call_miss(benchmark):
+    # A miss formats vars(chunk) into the warning, content and all.
+    chunk = SimpleNamespace(content="Streaming text. " * 500, event="RunResponseContent", metrics={"time": [0.1] * 50})
+    assert benchmark(parse_agno_tool_call_data, chunk) is None
+
+
+# Final-JSON extraction in _call_agent_for_final_json, and the suffix heuristic it replaced.
+
+@pytest.mark.parametrize("scenario", ["pure_json", "prose_then_json", "nested_tasks"])
+def test_final_json_scanner(benchmark, scenario):
+    chunks = split_into_chunks(make_response(RESPONSE_SIZE, scenario), 16)
+
+    def extract():
+        scanner = IncrementalJSONScanner(expected_keys=("acknowledgment_message", "plan_files_created"))
+        for chunk in chunks:
+            scanner.feed(chunk)
+        return scanner.final_object()
+
+    assert benchmark(extract)["plan_files_created"] is True
+
+
+@pytest.mark.parametrize("scenario", ["pure_json", "prose_then_json", "nested_tasks"])
+def test_final_json_legacy_suffix_heuristic(benchmark, scenario):
+    chunks = split_into_chunks(make_response(RESPONSE_SIZE, scenario), 16)
+    assert benchmark(legacy_extract, chunks)[1]["plan_files_created"] is True
+
+
+# Plan bookkeeping: once per step.
+
+def test_build_dependency_graph(benchmark):
+    plan = make_plan(PLAN_LENGTH)
+    assert len(benchmark(build_dependency_graph, plan)) == PLAN_LENGTH
+
+
+def test_render_markdown_plan(benchmark):
+    plan = make_plan(PLAN_LENGTH)
+    assert benchmark(render_markdown_plan, plan).startswith("# Master Plan")
+
+
+def test_plan_store_finish_step_and_rewrite_markdown(benchmark, tmp_path):
+    """What replaced update_markdown_plan_checkbox_by_description: a row update plus a full re-render."""
+    store = PlanStore(db_path=tmp_path / "plan_state.db", output_dir=tmp_path)
+    plan = make_plan(PLAN_LENGTH)
+
+    def new_plan():
+        return (store.create_plan("bench-session", plan),), {}
+
+    def finish_step(plan_id):
+        store.mark_started(plan_id, PLAN_LENGTH // 2)
+        store.mark_finished(plan_id, PLAN_LENGTH // 2, success=True)
+        return store.write_markdown(plan_id)
+
+    assert benchmark.pedantic(finish_step, setup=new_plan, rounds=50)
@@ -0,0 +1,39 @@
+"""
+A throwaway workspace for benchmark runs, so the notes, plans and reports they produce never land in
+the real agent_outputs/ or in agno's session and memory databases.
+"""
+import sys
+import tempfile
+from pathlib import Path
+
+from django.conf import settings as django_settings
+
+from core import settings as app_settings
+
+# Settings that place files the orchestrator writes, relative to the scratch directory.
+_SCRATCH_PATHS = {
+    "AGENT_OUTPUT_DIR": "agent_outputs",
+    "STORAGE_DB_PATH": "agno_storage.db",
+    "MEMORY_DB_PATH": "agno_memory.db",
+    "PLAN_STORE_DB_PATH": "plan_state.db",
+    "WORKSPACE_INDEX_DB_PATH": "workspace_index.db",
+    "COMPOSER_SUMMARY_CACHE_DIR": ".composer_cache",
+}
+
+
+def use_scratch_workspace(prefix: str = "cerno-bench-") -> tempfile.TemporaryDirectory:
+    """
+    Points the workspace, agno's databases, the plan store, the workspace index and the composer's
+    summary cache at a new temporary directory, and returns it; clean it up when the run is over.
+    Has to run before api.config is imported, since the agents' FileTools and agno's storage are
+    created from these settings at import time.
+    """
+    if "api.config" in sys.modules:
+        raise RuntimeError("use_scratch_workspace() must be called before api.config is imported.")
+    scratch = tempfile.TemporaryDirectory(prefix=prefix)
+    for name, relative_path in _SCRATCH_PATHS.items():
+        path = Path(scratch.name) / relative_path
+        setattr(django_settings, name, path)
+        setattr(app_settings, name, path)
+    (Path(scratch.name) / "agent_outputs").mkdir()
+    return scratch
@@ -14,3 +14,15 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+from api.agent_pool import warm_up_agent_pool  # noqa: E402  (needs the app registry loaded above)
+from api.llm_registry import MODEL_CATALOG  # noqa: E402
+from api.workspace_events import WORKSPACE_CHANGES  # noqa: E402
+from api.workspace_index import get_workspace_index  # noqa: E402
+from api.workspace_tree import get_workspace_tree  # noqa: E402
+
+MODEL_CATALOG.refresh()
+warm_up_agent_pool()
+get_workspace_index()
+get_workspace_tree()
+WORKSPACE_CHANGES.start()
@@ -19,8 +19,6 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent
 MEMORY_BANK_DIR = BASE_DIR / 'memory_bank'
 
-STORAGE_DB_PATH = BASE_DIR / "agno_storage.db"
-MEMORY_DB_PATH = BASE_DIR / "agno_memory.db"
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -38,6 +36,11 @@ ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY')
 SPIDER_API_KEY = os.getenv('SPIDER_API_KEY')
 
+# The agents' workspace, and agno's session storage and memory databases.
+AGENT_OUTPUT_DIR = Path(os.getenv('CERNO_AGENT_OUTPUT_DIR', str(BASE_DIR / 'agent_outputs')))
+STORAGE_DB_PATH = Path(os.getenv('CERNO_STORAGE_DB_PATH', str(BASE_DIR / "agno_storage.db")))
+MEMORY_DB_PATH = Path(os.getenv('CERNO_MEMORY_DB_PATH', str(BASE_DIR / "agno_memory.db")))
+
 ALLOWED_HOSTS = []
 
 
@@ -45,6 +48,7 @@ ALLOWED_HOSTS = []
 CORS_ALLOW_ALL_ORIGINS = True  # Temporarily disable CORS restrictions
 CORS_ALLOW_HEADERS = list(default_headers) + [
     "Cache-Control",  # Optional
+    "Last-Event-ID",
 ]
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -140,3 +144,126 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Orchestration
+# Maximum number of plan steps executed at the same time. Steps only run concurrently
+# when the files they read and write do not depend on each other. Agents can still save files
+# their task doesn't declare, so steps run one at a time unless this is raised.
+PLAN_MAX_PARALLEL_STEPS = int(os.getenv('CERNO_PLAN_MAX_PARALLEL_STEPS', '1'))
+# 'tools': the planner saves master_plan.md/.json with tool calls before any step starts.
+# 'pipelined': the planner streams the plan as JSON and each step starts as soon as it is complete.
+# 'structured': the planner returns the plan through the provider's structured output in one turn,
+# validated against a schema; the orchestrator writes the plan files.
+PLANNER_MODE = os.getenv('CERNO_PLANNER_MODE', 'tools')
+# 'team': every step goes through the StepExecutorTeam leader, which delegates to a member agent.
+# 'direct': steps are sent straight to the member agent named by their `agent_id`, saving a leader
+# LLM round trip per step. Tasks with a missing or unknown `agent_id` still go through the leader.
+STEP_DISPATCH_MODE = os.getenv('CERNO_STEP_DISPATCH_MODE', 'team')
+# 'agent': the ComposerAgent reads every input file into its context and saves the report with one tool call.
+# 'map_reduce': composer steps split their inputs into chunks of COMPOSER_CHUNK_TOKENS, summarize them
+# COMPOSER_MAP_CONCURRENCY at a time, merge the summaries level by level until they fit one chunk, and
+# write the report from those. Summaries are cached on disk by content hash, so reruns only summarize
+# the inputs that changed.
+# 'sections': the inputs are summarized the same way, then one call outlines the report (at most
+# COMPOSER_MAX_SECTIONS sections, each with the input files it needs) and the sections are written
+# concurrently from their own files' summaries and stitched into the output file.
+COMPOSER_MODE = os.getenv('CERNO_COMPOSER_MODE', 'agent')
+COMPOSER_CHUNK_TOKENS = int(os.getenv('CERNO_COMPOSER_CHUNK_TOKENS', '6000'))
+COMPOSER_MAP_CONCURRENCY = int(os.getenv('CERNO_COMPOSER_MAP_CONCURRENCY', '4'))
+COMPOSER_MAX_SECTIONS = int(os.getenv('CERNO_COMPOSER_MAX_SECTIONS', '8'))
+COMPOSER_SUMMARY_CACHE_DIR = Path(os.getenv('CERNO_COMPOSER_SUMMARY_CACHE_DIR', str(BASE_DIR / '.composer_cache')))
+
+# SSE
+# Consecutive LLM tokens of a step are coalesced into one frame per window. A frame is sent when
+# the interval has passed since the first buffered token or the buffer reaches the size limit.
+# Tool calls and step boundaries are always sent immediately. Set the interval to 0 to disable.
+SSE_TOKEN_FLUSH_INTERVAL_MS = float(os.getenv('CERNO_SSE_TOKEN_FLUSH_INTERVAL_MS', '50'))
+SSE_TOKEN_FLUSH_BYTES = int(os.getenv('CERNO_SSE_TOKEN_FLUSH_BYTES', '4096'))
+# 'json' (standard library) or 'orjson' (faster, needs `pip install orjson`).
+SSE_JSON_ENCODER = os.getenv('CERNO_SSE_JSON_ENCODER', 'json')
+
+# Runs
+# Every run keeps a bounded replay buffer of its SSE events so a reconnecting client can resume
+# from Last-Event-ID. A run whose clients all disconnected keeps going for the grace period and is
+# cancelled if nobody reconnects.
+RUN_EVENT_BUFFER_MAX_EVENTS = int(os.getenv('CERNO_RUN_EVENT_BUFFER_MAX_EVENTS', '5000'))
+RUN_EVENT_BUFFER_MAX_BYTES = int(os.getenv('CERNO_RUN_EVENT_BUFFER_MAX_BYTES', str(2 * 1024 * 1024)))
+RUN_DETACHED_GRACE_SECONDS = float(os.getenv('CERNO_RUN_DETACHED_GRACE_SECONDS', '300'))
+# Admission control: runs over either limit wait in a FIFO queue. Finished runs are kept
+# (and resumable) for the TTL, then evicted.
+MAX_CONCURRENT_RUNS = int(os.getenv('CERNO_MAX_CONCURRENT_RUNS', '4'))
+MAX_CONCURRENT_RUNS_PER_USER = int(os.getenv('CERNO_MAX_CONCURRENT_RUNS_PER_USER', '2'))
+RUN_FINISHED_TTL_SECONDS = float(os.getenv('CERNO_RUN_FINISHED_TTL_SECONDS', '300'))
+# Where the client IP that per-user limits count against comes from. 'remote_addr' (default) trusts
+# no header. Behind a trusted reverse proxy: 'x-real-ip' reads the header the proxy sets (nginx.conf
+# sets it), 'x-forwarded-for' the last hop, which the proxy appended. Only use these when clients
+# can't reach the app directly, since they could send any value.
+CLIENT_IP_SOURCE = os.getenv('CERNO_CLIENT_IP_SOURCE', 'remote_addr')
+
+# Agent pool
+# Agents are prebuilt once per (provider, model_id) and cloned for each run. At most
+# AGENT_POOL_MAX_MODELS models are kept, least recently used first out. The models listed in
+# AGENT_POOL_WARMUP_MODELS ("Provider:model_id,...") are built when the ASGI app starts; none by
+# default, since a model whose provider has no API key configured could never run anyway.
+AGENT_POOL_MAX_MODELS = int(os.getenv('CERNO_AGENT_POOL_MAX_MODELS', '4'))
+AGENT_POOL_WARMUP_MODELS = os.getenv('CERNO_AGENT_POOL_WARMUP_MODELS', '')
+
+# Model catalog
+# The model list (static cloud models + live Ollama models) is refreshed in the background once it is
+# older than the TTL. Browsers may reuse the /api/models/ response for MODEL_LIST_MAX_AGE_SECONDS,
+# and revalidate it with its ETag after that.
+MODEL_CATALOG_TTL_SECONDS = float(os.getenv('CERNO_MODEL_CATALOG_TTL_SECONDS', '60'))
+MODEL_LIST_MAX_AGE_SECONDS = int(os.getenv('CERNO_MODEL_LIST_MAX_AGE_SECONDS', '60'))
+
+# LLM response cache
+# 'off' (default), 'record' (serve recorded responses, record new ones) or 'replay' (serve recorded
+# responses only and never call the provider; an unrecorded call fails). Recordings are keyed on
+# provider, model, messages, tools and model params, and evicted least recently used first.
+LLM_CACHE_MODE = os.getenv('CERNO_LLM_CACHE_MODE', 'off')
+LLM_CACHE_DIR = Path(os.getenv('CERNO_LLM_CACHE_DIR', str(BASE_DIR / '.llm_cache')))
+LLM_CACHE_MAX_BYTES = int(os.getenv('CERNO_LLM_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+
+# Search/scrape cache
+# Google search and Spider search/scrape/crawl results are shared by all agents and sessions in the
+# process for the TTL. Identical calls that overlap wait for the first one instead of repeating it.
+TOOL_CACHE_TTL_SECONDS = float(os.getenv('CERNO_TOOL_CACHE_TTL_SECONDS', '3600'))
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv('CERNO_TOOL_CACHE_MAX_ENTRIES', '1000'))
+# The ResearchAgent's batch_search tool runs its queries on a shared pool of this many threads.
+# SEARCH_BACKEND 'fake' returns canned results after FAKE_SEARCH_LATENCY_SECONDS, for offline runs.
+SEARCH_BATCH_MAX_WORKERS = int(os.getenv('CERNO_SEARCH_BATCH_MAX_WORKERS', '8'))
+SEARCH_BACKEND = os.getenv('CERNO_SEARCH_BACKEND', 'google')
+FAKE_SEARCH_LATENCY_SECONDS = float(os.getenv('CERNO_FAKE_SEARCH_LATENCY_SECONDS', '0.5'))
+
+# Workspace search index
+# Full-text index (SQLite FTS5) of the files in agent_outputs, kept current by a watchdog observer.
+# Files larger than WORKSPACE_INDEX_MAX_FILE_BYTES are only searchable by path.
+WORKSPACE_INDEX_DB_PATH = Path(os.getenv('CERNO_WORKSPACE_INDEX_DB_PATH', str(BASE_DIR / 'workspace_index.db')))
+WORKSPACE_INDEX_MAX_FILE_BYTES = int(os.getenv('CERNO_WORKSPACE_INDEX_MAX_FILE_BYTES', str(2 * 1024 * 1024)))
+WORKSPACE_INDEX_DEBOUNCE_SECONDS = float(os.getenv('CERNO_WORKSPACE_INDEX_DEBOUNCE_SECONDS', '0.5'))
+WORKSPACE_SEARCH_MAX_PAGE_SIZE = int(os.getenv('CERNO_WORKSPACE_SEARCH_MAX_PAGE_SIZE', '100'))
+
+# File serving
+# /api/files/view/ streams files in chunks of this size instead of loading them into memory.
+FILE_STREAM_CHUNK_BYTES = int(os.getenv('CERNO_FILE_STREAM_CHUNK_BYTES', str(256 * 1024)))
+# /api/files/list/ is served from an in-memory tree of agent_outputs; paged listings return at most this many entries.
+WORKSPACE_LIST_MAX_PAGE_SIZE = int(os.getenv('CERNO_WORKSPACE_LIST_MAX_PAGE_SIZE', '1000'))
+# /api/files/events/ pushes workspace changes over SSE. Raw filesystem events are coalesced for the
+# debounce window; the last WORKSPACE_EVENTS_HISTORY_SIZE changes can be replayed with Last-Event-ID.
+WORKSPACE_EVENTS_DEBOUNCE_SECONDS = float(os.getenv('CERNO_WORKSPACE_EVENTS_DEBOUNCE_SECONDS', '0.3'))
+WORKSPACE_EVENTS_HISTORY_SIZE = int(os.getenv('CERNO_WORKSPACE_EVENTS_HISTORY_SIZE', '1000'))
+WORKSPACE_EVENTS_HEARTBEAT_SECONDS = float(os.getenv('CERNO_WORKSPACE_EVENTS_HEARTBEAT_SECONDS', '15'))
+
+# Plan state
+# Task status, timestamps and durations of every plan, keyed by plan id and task position.
+PLAN_STORE_DB_PATH = Path(os.getenv('CERNO_PLAN_STORE_DB_PATH', str(BASE_DIR / 'plan_state.db')))
+
+# Run tracing
+# Spans of every orchestration run (planner, steps, agents, model and tool calls) are appended to this
+# JSONL file when the run ends; the last TRACE_HISTORY_SIZE runs are also kept in memory for /api/runs/trace/.
+# Set CERNO_TRACE_LOG_PATH to an empty string to keep traces in memory only.
+TRACE_LOG_PATH = os.getenv('CERNO_TRACE_LOG_PATH', str(BASE_DIR / 'agent_traces.jsonl'))
+TRACE_HISTORY_SIZE = int(os.getenv('CERNO_TRACE_HISTORY_SIZE', '200'))
+
+# Metrics
+# /metrics serves Prometheus metrics. Event-loop lag is sampled by a task sleeping this long between checks.
+METRICS_LOOP_LAG_INTERVAL_SECONDS = float(os.getenv('CERNO_METRICS_LOOP_LAG_INTERVAL_SECONDS', '0.5'))
@@ -2,7 +2,11 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from api.views import MetricsView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')), # Include API endpoints
+    # Not under /api/, so nginx doesn't expose it; Prometheus scrapes the backend directly.
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
@@ -1,86 +1,289 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
 import re
+import sys
+import time
 from pathlib import Path
-import argparse
 
-LOG_FILE_PATH = Path(__file__).resolve().parent / "agno_metrics.log"  
+from api.pricing import estimate_cost
 
-PRICE_PER_INPUT_TOKEN = 0.15 / 1_000_000
-PRICE_PER_OUTPUT_TOKEN = 0.60 / 1_000_000
+LOG_FILE_PATH = Path(__file__).resolve().parent / "agno_metrics.log"
 
-METRICS_BLOCK_REGEX = re.compile(
-    r"DEBUG \*{80}  METRICS  \*{80}\n"  
-    r".*?\* Tokens:\s*input=(\d+),\s*output=(\d+)"  
-    
-    , re.DOTALL  
-)
+CHECKPOINT_VERSION = 1
+FINGERPRINT_BYTES = 1024
 
-def calculate_cost_from_log(log_file_path: Path) -> tuple[int, int, float]:
-    """
-    Parses the log file, extracts token counts from METRICS blocks,
-    and calculates the total cost.
+# agno's debug log frames every message's metrics with a centered " METRICS " header line (tool results get
+# " TOOL METRICS " instead) and announces the model and session before each call with centered headers.
+METRICS_HEADER_REGEX = re.compile(r"\*\s+METRICS\s+\*")
+TOOL_METRICS_HEADER_REGEX = re.compile(r"\*\s+TOOL METRICS\s+\*")
+TOKENS_LINE_REGEX = re.compile(r"\* Tokens:\s*(.*)")
+TOKEN_FIELD_REGEX = re.compile(r"(\w+)=(\d+)")
+MODEL_HEADER_REGEX = re.compile(r"-\s+Model: (\S+)\s+-")
+SESSION_HEADER_REGEX = re.compile(r"\*\s+Session ID: (\S+)\s+\*")
+LINE_DATE_REGEX = re.compile(r"^\W*(\d{4}-\d{2}-\d{2})")
 
-    Returns:
-        A tuple: (total_input_tokens, total_output_tokens, total_cost)
+
+def _new_bucket() -> dict:
+    return {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0, "unpriced_calls": 0}
+
+
+class CostLogAnalyzer:
     """
-    total_input_tokens = 0
-    total_output_tokens = 0
-    total_cost = 0.0
+    Incremental cost report over agno's debug log.
 
-    if not log_file_path.exists():
-        print(f"Error: Log file not found at {log_file_path}")
-        return 0, 0, 0.0
+    The log is read line by line from the last checkpointed byte offset, so memory use doesn't grow with
+    the file and re-runs only look at what was appended since. Each METRICS block is one model call; it is
+    priced with the shared table in api/pricing.py and added to totals per model, per day and per session.
+    The model and session of a call are the last `Model:` and `Session ID:` headers seen before it, which is
+    exact for one run at a time and best effort when concurrent runs interleave in the log. The day comes
+    from a leading YYYY-MM-DD timestamp when the log lines carry one, otherwise from the file's mtime at the
+    time the lines were read.
+    Only complete lines are consumed; a partially written last line is picked up on the next pass. If the
+    file is replaced or truncated (log rotation), reading restarts at its beginning and the totals keep
+    accumulating.
+    """
 
-    try:
-        with open(log_file_path, "r", encoding="utf-8") as f:
-            log_content = f.read()
-    except Exception as e:
-        print(f"Error reading log file {log_file_path}: {e}")
-        return 0, 0, 0.0
+    def __init__(self, log_file_path: Path, checkpoint_path: Path | None = None):
+        self.log_file_path = Path(log_file_path)
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self.offset = 0
+        self.inode = None
+        self.fingerprint = None
+        self.state = {"model": None, "session": None, "day": None, "in_metrics": False, "in_tool_metrics": False}
+        self.totals = _new_bucket()
+        self.by_model: dict[str, dict] = {}
+        self.by_day: dict[str, dict] = {}
+        self.by_session: dict[str, dict] = {}
 
-    matches = METRICS_BLOCK_REGEX.finditer(log_content)
+    # Checkpoint.
 
-    call_count = 0
-    for match in matches:
-        call_count += 1
+    def load_checkpoint(self) -> bool:
+        if not self.checkpoint_path or not self.checkpoint_path.exists():
+            return False
         try:
-            input_tokens = int(match.group(1))
-            output_tokens = int(match.group(2))
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable checkpoint {self.checkpoint_path}: {e}")
+            return False
+        if checkpoint.get("version") != CHECKPOINT_VERSION:
+            print(f"Warning: Ignoring checkpoint {self.checkpoint_path} from another version.")
+            return False
+        self.offset = checkpoint["offset"]
+        self.inode = checkpoint.get("inode")
+        self.fingerprint = checkpoint.get("fingerprint")
+        self.state.update(checkpoint.get("state", {}))
+        self.totals = checkpoint["totals"]
+        self.by_model = checkpoint["by_model"]
+        self.by_day = checkpoint["by_day"]
+        self.by_session = checkpoint["by_session"]
+        return True
+
+    def save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        checkpoint = {"version": CHECKPOINT_VERSION, "log_file": str(self.log_file_path), "offset": self.offset,
+                      "inode": self.inode, "fingerprint": self.fingerprint, "state": self.state,
+                      "totals": self.totals, "by_model": self.by_model, "by_day": self.by_day,
+                      "by_session": self.by_session}
+        temp_path = self.checkpoint_path.with_name(f"{self.checkpoint_path.name}.{os.getpid()}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    # Reading.
+
+    @staticmethod
+    def _fingerprint(f) -> str | None:
+        f.seek(0)
+        head = f.read(FINGERPRINT_BYTES)
+        return hashlib.sha1(head).hexdigest() if len(head) == FINGERPRINT_BYTES else None
+
+    def _check_for_rotation(self, f, stat: os.stat_result) -> bool:
+        """Returns True (and rewinds to the start) if the file is not the one the offset refers to."""
+        rotated = self.inode is not None and stat.st_ino != self.inode
+        truncated = stat.st_size < self.offset
+        changed_head = bool(self.fingerprint) and self._fingerprint(f) not in (None, self.fingerprint)
+        if rotated or truncated or changed_head:
+            self.offset = 0
+            self.fingerprint = None
+            self.state.update({"in_metrics": False, "in_tool_metrics": False})
+            return True
+        return False
+
+    def process_new_lines(self, on_call=None) -> int:
+        """Reads the complete lines appended since the last offset. Returns the number of model calls found."""
+        calls_found = 0
+        with open(self.log_file_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if self._check_for_rotation(f, stat):
+                print(f"Note: {self.log_file_path} was rotated or truncated; reading it from the start.")
+            self.inode = stat.st_ino
+            if stat.st_size == self.offset:
+                return 0
+            fallback_day = datetime.date.fromtimestamp(stat.st_mtime).isoformat()
+            f.seek(self.offset)
+            for raw_line in f:
+                if not raw_line.endswith(b"\n"):
+                    break
+                self.offset += len(raw_line)
+                call = self._process_line(raw_line.decode("utf-8", errors="replace"), fallback_day)
+                if call is not None:
+                    calls_found += 1
+                    if on_call:
+                        on_call(call)
+            if self.fingerprint is None:
+                self.fingerprint = self._fingerprint(f)
+        return calls_found
 
-            total_input_tokens += input_tokens
-            total_output_tokens += output_tokens
+    def _process_line(self, line: str, fallback_day: str) -> dict | None:
+        state = self.state
+        date_match = LINE_DATE_REGEX.match(line)
+        if date_match:
+            state["day"] = date_match.group(1)
 
-            call_cost = (input_tokens * PRICE_PER_INPUT_TOKEN) + \
-                        (output_tokens * PRICE_PER_OUTPUT_TOKEN)
-            total_cost += call_cost
+        if TOOL_METRICS_HEADER_REGEX.search(line):
+            state["in_tool_metrics"] = not state["in_tool_metrics"]
+            return None
+        if METRICS_HEADER_REGEX.search(line):
+            # The same header opens and closes a block.
+            state["in_metrics"] = not state["in_metrics"]
+            return None
+        if state["in_metrics"] and not state["in_tool_metrics"]:
+            tokens_match = TOKENS_LINE_REGEX.search(line)
+            if tokens_match:
+                token_fields = {name: int(value) for name, value in TOKEN_FIELD_REGEX.findall(tokens_match.group(1))}
+                return self._record_call(token_fields.get("input", 0), token_fields.get("output", 0),
+                                         state["day"] or fallback_day)
+            return None
 
-            print(
-                f"  LLM Call {call_count}: Input Tokens: {input_tokens}, Output Tokens: {output_tokens}, Cost: ${call_cost:.6f}")
+        model_match = MODEL_HEADER_REGEX.search(line)
+        if model_match:
+            state["model"] = model_match.group(1)
+            return None
+        session_match = SESSION_HEADER_REGEX.search(line)
+        if session_match:
+            state["session"] = session_match.group(1)
+        return None
 
-        except ValueError:
-            print(f"Warning: Could not parse tokens in match: {match.groups()}")
-        except Exception as e:
-            print(f"Warning: Error processing match: {e}")
+    def _record_call(self, input_tokens: int, output_tokens: int, day: str) -> dict:
+        model = self.state["model"] or "unknown"
+        session = self.state["session"] or "unknown"
+        cost = estimate_cost(model, input_tokens, output_tokens)
+        for bucket in (self.totals, self.by_model.setdefault(model, _new_bucket()),
+                       self.by_day.setdefault(day, _new_bucket()), self.by_session.setdefault(session, _new_bucket())):
+            bucket["calls"] += 1
+            bucket["input_tokens"] += input_tokens
+            bucket["output_tokens"] += output_tokens
+            if cost is None:
+                bucket["unpriced_calls"] += 1
+            else:
+                bucket["cost_usd"] += cost
+        return {"model": model, "session": session, "day": day, "input_tokens": input_tokens,
+                "output_tokens": output_tokens, "cost_usd": cost}
 
-    if call_count == 0:
-        print("No METRICS blocks found in the log file. Ensure 'agno' logger is set to DEBUG.")
+    # Reporting.
+
+    def report(self) -> dict:
+        return {"log_file": str(self.log_file_path), "offset": self.offset, "totals": self.totals,
+                "by_model": self.by_model, "by_day": self.by_day, "by_session": self.by_session}
+
+    def print_report(self, top_sessions: int = 20):
+        def print_table(title: str, buckets: dict, limit: int | None = None):
+            rows = sorted(buckets.items(), key=lambda item: item[1]["cost_usd"], reverse=True)
+            print(f"\n--- {title} ---")
+            for key, bucket in rows[:limit]:
+                unpriced = f" ({bucket['unpriced_calls']} unpriced)" if bucket["unpriced_calls"] else ""
+                print(f"  {key:<40} calls: {bucket['calls']:>6}  input: {bucket['input_tokens']:>11}  "
+                      f"output: {bucket['output_tokens']:>10}  cost: ${bucket['cost_usd']:.6f}{unpriced}")
+            if limit is not None and len(rows) > limit:
+                print(f"  ... {len(rows) - limit} more")
+
+        if self.totals["calls"] == 0:
+            print("No METRICS blocks found in the log file. Ensure 'agno' logger is set to DEBUG.")
+            return
+        print_table("By model", self.by_model)
+        print_table("By day", dict(sorted(self.by_day.items())))
+        print_table(f"By session (top {top_sessions} by cost)", self.by_session, limit=top_sessions)
+        unpriced_models = sorted(model for model, bucket in self.by_model.items() if bucket["unpriced_calls"])
+        if unpriced_models:
+            print(f"\nWarning: No pricing for {', '.join(unpriced_models)}; add them to api/pricing.py.")
+
+        print("\n--- Total Calculation ---")
+        print(f"LLM Calls:           {self.totals['calls']}")
+        print(f"Total Input Tokens:  {self.totals['input_tokens']}")
+        print(f"Total Output Tokens: {self.totals['output_tokens']}")
+        print(f"Estimated Total Cost: ${self.totals['cost_usd']:.6f}")
+
+
+def calculate_cost_from_log(log_file_path: Path) -> tuple[int, int, float]:
+    """
+    Parses the whole log file, without a checkpoint, and calculates the total cost.
+
+    Returns:
+        A tuple: (total_input_tokens, total_output_tokens, total_cost)
+    """
+    analyzer = CostLogAnalyzer(log_file_path)
+    analyzer.process_new_lines()
+    return analyzer.totals["input_tokens"], analyzer.totals["output_tokens"], analyzer.totals["cost_usd"]
+
+
+def _print_call(call: dict):
+    cost = f"${call['cost_usd']:.6f}" if call["cost_usd"] is not None else "unpriced"
+    print(f"  LLM Call [{call['day']}] Model: {call['model']}, Session: {call['session']}, "
+          f"Input Tokens: {call['input_tokens']}, Output Tokens: {call['output_tokens']}, Cost: {cost}")
 
-    return total_input_tokens, total_output_tokens, total_cost
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Calculate LLM run cost from agno_metrics.log.")
+    parser = argparse.ArgumentParser(description="Calculate LLM run cost from agno_metrics.log, incrementally.")
     parser.add_argument(
         "--log_file",
         type=Path,
         default=LOG_FILE_PATH,
         help=f"Path to the agno_metrics.log file (default: {LOG_FILE_PATH})"
     )
+    parser.add_argument("--checkpoint", type=Path, default=None,
+                        help="Where to keep the read offset and running totals (default: <log_file>.costs.json)")
+    parser.add_argument("--no-checkpoint", action="store_true", help="Read the whole file and keep no state.")
+    parser.add_argument("--reset", action="store_true", help="Discard the checkpoint and start from the beginning.")
+    parser.add_argument("--follow", action="store_true", help="Keep watching the log and report calls as they appear.")
+    parser.add_argument("--interval", type=float, default=1.0, help="Polling interval for --follow, in seconds.")
+    parser.add_argument("--top", type=int, default=20, help="Number of sessions to list in the report.")
+    parser.add_argument("--verbose", action="store_true", help="Print every call found, not just the totals.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
     args = parser.parse_args()
 
-    print(f"Calculating cost from log file: {args.log_file}\n")
+    checkpoint_path = None if args.no_checkpoint else (
+        args.checkpoint or args.log_file.with_name(args.log_file.name + ".costs.json"))
+    analyzer = CostLogAnalyzer(args.log_file, checkpoint_path)
+    if not args.reset and analyzer.load_checkpoint():
+        print(f"Resuming {args.log_file} from byte {analyzer.offset} ({analyzer.totals['calls']} calls so far).\n",
+              file=sys.stderr)
+    else:
+        print(f"Calculating cost from log file: {args.log_file}\n", file=sys.stderr)
 
-    total_input, total_output, final_cost = calculate_cost_from_log(args.log_file)
+    if not args.log_file.exists() and not args.follow:
+        print(f"Error: Log file not found at {args.log_file}")
+        sys.exit(1)
+
+    on_call = _print_call if args.verbose or args.follow else None
+    try:
+        if args.log_file.exists():
+            analyzer.process_new_lines(on_call)
+            analyzer.save_checkpoint()
+        if args.follow:
+            print(f"Following {args.log_file}. Press Ctrl+C to stop.", file=sys.stderr)
+            while True:
+                time.sleep(args.interval)
+                if args.log_file.exists() and analyzer.process_new_lines(on_call):
+                    analyzer.save_checkpoint()
+    except KeyboardInterrupt:
+        analyzer.save_checkpoint()
 
-    print("\n--- Total Calculation ---")
-    print(f"Total Input Tokens:  {total_input}")
-    print(f"Total Output Tokens: {total_output}")
-    print(f"Estimated Total Cost: ${final_cost:.6f}")
\ No newline at end of file
+    if args.json:
+        print(json.dumps(analyzer.report(), indent=2))
+    else:
+        analyzer.print_report(top_sessions=args.top)
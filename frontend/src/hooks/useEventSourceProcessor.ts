@@ -311,6 +311,13 @@ export const useEventSourceProcessor = ({
 
         es.onerror = (err) => {
 
+            // While the browser is reconnecting it sends Last-Event-ID and the backend
+            // resumes the same run from its replay buffer, so don't tear anything down yet.
+            if (es.readyState === EventSource.CONNECTING) {
+                console.warn("EventSource connection interrupted. Reconnecting to resume the run...", err);
+                return;
+            }
+
             console.error("EventSource connection failed:", err);
 
             // Immediately close the source to prevent any further events or retries
@@ -75,4 +75,27 @@ def start(c: Context, no_frontend=False):
     print("\n🎉 Both servers are running! Press CTRL+C to stop.")
     # You can add more logic here if needed, but for now, we just let them run.
     # The promises can be joined if you need to wait for them to finish,
-    # but for servers, we want them to run indefinitely.
\ No newline at end of file
+    # but for servers, we want them to run indefinitely.
+
+
+BENCH_COMMAND = ("python -m pytest benchmarks/test_hot_paths.py -q "
+                 "--benchmark-storage=file://benchmarks/baselines --benchmark-columns=min,median,mean,rounds")
+
+
+@task(help={'fail-over': "Allowed slowdown of a benchmark's median against the baseline, e.g. 25%."})
+def bench(c: Context, fail_over="25%"):
+    """
+    Runs the hot-path micro-benchmarks and compares them with the stored baseline.
+    Needs the dev requirements: pip install -r requirements-dev.txt
+    """
+    print("--- Running micro-benchmarks against benchmarks/baselines ---")
+    c.run(f"{BENCH_COMMAND} --benchmark-compare --benchmark-compare-fail=median:{fail_over}", pty=not IS_WINDOWS)
+
+
+@task
+def bench_baseline(c: Context):
+    """
+    Re-measures the hot-path micro-benchmarks and stores them as the new baseline.
+    """
+    print("--- Saving a new micro-benchmark baseline to benchmarks/baselines ---")
+    c.run(f"{BENCH_COMMAND} --benchmark-save=baseline", pty=not IS_WINDOWS)